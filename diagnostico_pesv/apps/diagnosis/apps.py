@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DiagnosisConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.diagnosis"
+
+    def ready(self):
+        # Registra las senales que mantienen el resumen de puntajes
+        from . import signals  # noqa: F401
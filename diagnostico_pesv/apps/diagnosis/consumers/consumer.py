@@ -1,5 +1,48 @@
+import asyncio
 import json
+import logging
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import DatabaseError, transaction
+from apps.diagnosis.models import Compliance, Diagnosis, Diagnosis_Questions
+from apps.diagnosis.scoring import ScoringEngine
+from apps.diagnosis.services import DiagnosisService
+
+logger = logging.getLogger(__name__)
+
+
+def _is_id(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def _is_text(value) -> bool:
+    return value is None or isinstance(value, str)
+
+
+def _valid_answer(answer) -> bool:
+    """Forma de una respuesta de pregunta, igual a la de save_answers."""
+    return (
+        isinstance(answer, dict)
+        and _is_id(answer.get("question"))
+        and _is_id(answer.get("compliance"))
+        and isinstance(answer.get("obtained_value"), (int, float))
+        and not isinstance(answer.get("obtained_value"), bool)
+        and isinstance(answer.get("is_articuled"), bool)
+        and _is_text(answer.get("observation"))
+        and _is_text(answer.get("verify_document"))
+    )
+
+
+def _valid_requirement(answer) -> bool:
+    """Forma de una respuesta de requisito, igual a la de save_answers."""
+    return (
+        isinstance(answer, dict)
+        and _is_id(answer.get("requirement"))
+        and _is_id(answer.get("compliance"))
+        and isinstance(answer.get("observation"), str)
+    )
 
 
 class DiagnosisConsumer(AsyncWebsocketConsumer):
@@ -38,3 +81,206 @@ class DiagnosisConsumer(AsyncWebsocketConsumer):
                 }
             )
         )
+
+
+class DiagnosisAutosaveConsumer(AsyncWebsocketConsumer):
+    """
+    Autoguardado de las respuestas de un diagnostico.
+
+    Recibe cambios sueltos y los agrupa durante AUTOSAVE_WINDOW_SECONDS (por
+    pregunta gana la ultima respuesta); luego los escribe en un solo guardado
+    y avisa a todos los conectados al diagnostico con la nueva version de
+    datos y el resumen de puntajes.
+
+    Mensajes: {"type": "answers", "answers": [...], "requirements": [...]}
+    con el mismo formato de save_answers, y {"type": "flush"} para guardar
+    sin esperar. Las respuestas con formato no valido o con pregunta o
+    cumplimiento inexistente se rechazan con "autosave_error" y el resto
+    del mensaje se acepta.
+
+    El canal no compara data_version: entre varias conexiones al mismo
+    diagnostico gana el ultimo guardado de cada respuesta. Si la base de
+    datos falla, el lote vuelve a quedar pendiente (sin pisar cambios mas
+    nuevos) y se reintenta con el siguiente guardado.
+    """
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+        self.diagnosis_id = int(self.scope["url_route"]["kwargs"]["diagnosis_id"])
+        data_version = await self.get_data_version()
+        if data_version is None:
+            await self.close()
+            return
+
+        self.pending_answers = {}
+        self.pending_requirements = {}
+        self.flush_task = None
+        self.room_group_name = f"diagnosis_autosave_{self.diagnosis_id}"
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        await self.accept()
+        await self.send(
+            text_data=json.dumps(
+                {"type": "autosave_ready", "data_version": data_version}
+            )
+        )
+
+    async def disconnect(self, close_code):
+        if not hasattr(self, "room_group_name"):
+            return
+        # Lo que quedo pendiente se guarda antes de soltar la conexion
+        await self.flush()
+        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+
+    async def receive(self, text_data):
+        try:
+            message = json.loads(text_data)
+            answers = message.get("answers") or []
+            requirements = message.get("requirements") or []
+            if not isinstance(answers, list) or not isinstance(requirements, list):
+                raise TypeError
+        except (AttributeError, TypeError, ValueError):
+            await self.send_error("Mensaje no valido.")
+            return
+
+        valid_answers = [answer for answer in answers if _valid_answer(answer)]
+        valid_requirements = [
+            answer for answer in requirements if _valid_requirement(answer)
+        ]
+        if valid_answers or valid_requirements:
+            question_ids, compliance_ids = await self.get_existing_ids(
+                {answer["question"] for answer in valid_answers},
+                {answer["compliance"] for answer in valid_answers}
+                | {answer["compliance"] for answer in valid_requirements},
+            )
+            valid_answers = [
+                answer
+                for answer in valid_answers
+                if answer["question"] in question_ids
+                and answer["compliance"] in compliance_ids
+            ]
+            valid_requirements = [
+                answer
+                for answer in valid_requirements
+                if answer["compliance"] in compliance_ids
+            ]
+
+        rejected = len(answers) + len(requirements)
+        rejected -= len(valid_answers) + len(valid_requirements)
+        if rejected:
+            await self.send_error(f"Respuestas no validas descartadas: {rejected}.")
+        for answer in valid_answers:
+            self.pending_answers[answer["question"]] = answer
+        for answer in valid_requirements:
+            self.pending_requirements[answer["requirement"]] = answer
+
+        if message.get("type") == "flush":
+            await self.flush()
+        elif self.flush_task is None and (
+            self.pending_answers or self.pending_requirements
+        ):
+            self.flush_task = asyncio.create_task(self.flush_later())
+
+    async def flush_later(self):
+        try:
+            await asyncio.sleep(settings.AUTOSAVE_WINDOW_SECONDS)
+            self.flush_task = None
+            await self.flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # La tarea no tiene quien la espere; sin esto el error se pierde
+            logger.exception(
+                "Error en el autoguardado del diagnostico %s", self.diagnosis_id
+            )
+
+    async def flush(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        pending_answers = self.pending_answers
+        pending_requirements = self.pending_requirements
+        self.pending_answers = {}
+        self.pending_requirements = {}
+        if not pending_answers and not pending_requirements:
+            return
+
+        try:
+            result = await self.save_answers(
+                list(pending_answers.values()), list(pending_requirements.values())
+            )
+        except DatabaseError:
+            logger.exception(
+                "No se pudo autoguardar el diagnostico %s", self.diagnosis_id
+            )
+            # Lo recibido mientras se guardaba es mas nuevo y se conserva
+            self.pending_answers = {**pending_answers, **self.pending_answers}
+            self.pending_requirements = {
+                **pending_requirements,
+                **self.pending_requirements,
+            }
+            await self.send_error(
+                "No se pudieron guardar las respuestas; se reintentara con el "
+                "siguiente guardado."
+            )
+            return
+        except ObjectDoesNotExist as ex:
+            # Se borro la pregunta o el cumplimiento despues de validarlos
+            await self.send_error(str(ex))
+            return
+        await self.channel_layer.group_send(
+            self.room_group_name, {"type": "autosave_saved", **result}
+        )
+
+    async def autosave_saved(self, event):
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "autosave_saved",
+                    "data_version": event["data_version"],
+                    "saved": event["saved"],
+                    "scores": event["scores"],
+                }
+            )
+        )
+
+    async def send_error(self, error: str):
+        await self.send(
+            text_data=json.dumps({"type": "autosave_error", "error": error})
+        )
+
+    @database_sync_to_async
+    def get_data_version(self):
+        return (
+            Diagnosis.objects.filter(pk=self.diagnosis_id)
+            .values_list("data_version", flat=True)
+            .first()
+        )
+
+    @database_sync_to_async
+    def get_existing_ids(self, question_ids: set, compliance_ids: set) -> tuple:
+        return (
+            set(
+                Diagnosis_Questions.objects.filter(pk__in=question_ids).values_list(
+                    "pk", flat=True
+                )
+            ),
+            set(
+                Compliance.objects.filter(pk__in=compliance_ids).values_list(
+                    "pk", flat=True
+                )
+            ),
+        )
+
+    @database_sync_to_async
+    def save_answers(self, answers: list, requirements: list) -> dict:
+        with transaction.atomic():
+            diagnosis = Diagnosis.objects.select_for_update().get(pk=self.diagnosis_id)
+            saved = DiagnosisService.save_answers(diagnosis, answers, requirements)
+        return {
+            "data_version": diagnosis.data_version,
+            "saved": saved,
+            "scores": ScoringEngine().summary(self.diagnosis_id),
+        }
@@ -0,0 +1,439 @@
+import logging
+import os
+import queue
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Corre con LIBREOFFICE_PYTHON, el Python que puede importar uno
+UNO_BRIDGE_SCRIPT = os.path.join(os.path.dirname(__file__), "uno_bridge.py")
+
+
+class ConversionError(Exception):
+    pass
+
+
+class ConversionTimeout(ConversionError):
+    pass
+
+
+def convert_with_cli(word_file_content: bytes) -> bytes:
+    """
+    Conversion con un proceso de LibreOffice por documento (sin pool).
+
+    Cada llamada trabaja en su propio directorio temporal, con un perfil de
+    usuario privado, para que varias conversiones puedan correr a la vez.
+    """
+    with tempfile.TemporaryDirectory(prefix="docx2pdf-") as workdir:
+        docx_path = os.path.join(workdir, "document.docx")
+        with open(docx_path, "wb") as docx_file:
+            docx_file.write(word_file_content)
+
+        profile_dir = os.path.join(workdir, "profile")
+        try:
+            subprocess.run(
+                [
+                    settings.LIBREOFFICE_BINARY,
+                    f"-env:UserInstallation=file://{profile_dir}",
+                    "--headless",
+                    "--convert-to",
+                    "pdf",
+                    docx_path,
+                    "--outdir",
+                    workdir,
+                ],
+                check=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=settings.LIBREOFFICE_JOB_TIMEOUT,
+            )
+        except subprocess.TimeoutExpired:
+            raise ConversionTimeout(
+                f"La conversion a PDF supero {settings.LIBREOFFICE_JOB_TIMEOUT} segundos"
+            )
+
+        with open(os.path.join(workdir, "document.pdf"), "rb") as pdf_file:
+            return pdf_file.read()
+
+
+class ConversionSlots:
+    """
+    Semaforo acotado compartido entre hilos y procesos.
+
+    Cada cupo es un archivo de bloqueo en lock_dir; flock se toma por
+    descriptor, asi que dos hilos del mismo proceso tambien se excluyen. En
+    plataformas sin fcntl se usa una cola de cupos local al proceso.
+
+    :param size: Numero de conversiones simultaneas permitidas.
+    :param lock_dir: Directorio de los archivos de bloqueo.
+    """
+
+    def __init__(self, size: int, lock_dir: str):
+        self.size = max(size, 1)
+        self.lock_dir = lock_dir
+        self._local = None
+        if fcntl is None:
+            self._local = queue.Queue()
+            for index in range(self.size):
+                self._local.put(index)
+
+    def _lock(self, index: int):
+        """Toma el cupo `index` sin esperar; devuelve su archivo o None."""
+        os.makedirs(self.lock_dir, exist_ok=True)
+        slot_file = open(os.path.join(self.lock_dir, f"slot-{index}.lock"), "w")
+        try:
+            fcntl.flock(slot_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            slot_file.close()
+            return None
+        return slot_file
+
+    @staticmethod
+    def _unlock(slot_file):
+        fcntl.flock(slot_file, fcntl.LOCK_UN)
+        slot_file.close()
+
+    @contextmanager
+    def acquire(self, timeout: float):
+        """Espera un cupo libre y entrega su numero (0 a size - 1)."""
+        if self._local is not None:
+            try:
+                index = self._local.get(timeout=timeout)
+            except queue.Empty:
+                raise ConversionTimeout("No hay cupos libres para convertir a PDF")
+            try:
+                yield index
+            finally:
+                self._local.put(index)
+            return
+
+        limit = time.monotonic() + timeout
+        slot_file = None
+        while slot_file is None:
+            for index in range(self.size):
+                slot_file = self._lock(index)
+                if slot_file is not None:
+                    break
+            else:
+                if time.monotonic() > limit:
+                    raise ConversionTimeout("No hay cupos libres para convertir a PDF")
+                time.sleep(0.1)
+        try:
+            yield index
+        finally:
+            self._unlock(slot_file)
+
+    @contextmanager
+    def acquire_index(self, index: int):
+        """Toma el cupo `index` solo si esta libre; entrega si lo obtuvo."""
+        slot_file = self._lock(index) if self._local is None else None
+        try:
+            yield slot_file is not None
+        finally:
+            if slot_file is not None:
+                self._unlock(slot_file)
+
+
+class LibreOfficeInstance:
+    """
+    Proceso soffice en modo listener atado a un cupo de conversion.
+
+    Escucha en LIBREOFFICE_BASE_PORT + index con su propio perfil y vive
+    aparte de los workers, que lo comparten: solo lo usa quien tiene tomado
+    el cupo `index` en ConversionSlots. El pid queda en lock_dir para poder
+    reiniciarlo desde cualquier proceso.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        lock_dir: str,
+        binary: str,
+        python: str,
+        port: int,
+        start_timeout: int,
+        job_timeout: int,
+    ):
+        self.index = index
+        self.binary = binary
+        self.python = python
+        self.port = port
+        self.start_timeout = start_timeout
+        self.job_timeout = job_timeout
+        self.profile_dir = os.path.join(lock_dir, f"profile-{index}")
+        self.pid_path = os.path.join(lock_dir, f"soffice-{index}.pid")
+
+    def is_alive(self) -> bool:
+        try:
+            with socket.create_connection(("127.0.0.1", self.port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def start(self):
+        self.stop()
+        os.makedirs(os.path.dirname(self.pid_path), exist_ok=True)
+        # Sesion propia: sobrevive al worker que la inicio y se mata en grupo
+        process = subprocess.Popen(
+            [
+                self.binary,
+                "--headless",
+                "--invisible",
+                "--nologo",
+                "--nodefault",
+                "--norestore",
+                "--nolockcheck",
+                f"-env:UserInstallation=file://{self.profile_dir}",
+                f"--accept=socket,host=127.0.0.1,port={self.port};urp;"
+                "StarOffice.ComponentContext",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        with open(self.pid_path, "w") as pid_file:
+            pid_file.write(str(process.pid))
+
+        limit = time.monotonic() + self.start_timeout
+        while not self.is_alive():
+            if process.poll() is not None:
+                raise ConversionError(
+                    f"LibreOffice {self.index} termino al iniciar "
+                    f"(codigo {process.returncode})"
+                )
+            if time.monotonic() > limit:
+                self.stop()
+                raise ConversionError(
+                    f"LibreOffice {self.index} no respondio en "
+                    f"{self.start_timeout} segundos"
+                )
+            time.sleep(0.25)
+        logger.info(
+            "LibreOffice %s iniciado (pid %s, puerto %s)",
+            self.index,
+            process.pid,
+            self.port,
+        )
+
+    def stop(self):
+        try:
+            with open(self.pid_path) as pid_file:
+                pid = int(pid_file.read())
+        except (OSError, ValueError):
+            return
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        os.remove(self.pid_path)
+        # SIGKILL no es inmediato: sin esta espera start() podria tomar el
+        # puerto del proceso viejo como la instancia nueva
+        limit = time.monotonic() + self.start_timeout
+        while self.is_alive() and time.monotonic() < limit:
+            time.sleep(0.1)
+
+    def convert(self, word_file_content: bytes) -> bytes:
+        with tempfile.TemporaryDirectory(prefix="docx2pdf-") as workdir:
+            docx_path = os.path.join(workdir, "document.docx")
+            pdf_path = os.path.join(workdir, "document.pdf")
+            with open(docx_path, "wb") as docx_file:
+                docx_file.write(word_file_content)
+            try:
+                completed = subprocess.run(
+                    [
+                        self.python,
+                        UNO_BRIDGE_SCRIPT,
+                        str(self.port),
+                        docx_path,
+                        pdf_path,
+                    ],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE,
+                    timeout=self.job_timeout,
+                )
+            except subprocess.TimeoutExpired:
+                logger.error(
+                    "Conversion en LibreOffice %s supero %s segundos, reiniciando",
+                    self.index,
+                    self.job_timeout,
+                )
+                self.start()
+                raise ConversionTimeout(
+                    f"La conversion a PDF supero {self.job_timeout} segundos"
+                )
+            if completed.returncode != 0:
+                error = completed.stderr.decode(errors="replace").strip()
+                raise ConversionError(
+                    f"LibreOffice {self.index} no pudo convertir el documento: "
+                    f"{error.splitlines()[-1] if error else completed.returncode}"
+                )
+            with open(pdf_path, "rb") as pdf_file:
+                return pdf_file.read()
+
+
+class LibreOfficePool:
+    """
+    Instancias de LibreOffice precalentadas, una por cupo de ConversionSlots.
+
+    El cupo tomado da uso exclusivo de su instancia entre todos los procesos,
+    asi el servidor nunca corre mas soffice que conversiones simultaneas.
+    Una instancia caida se reinicia en la siguiente conversion de su cupo.
+
+    :param slots: Cupos de conversion que reparten las instancias.
+    :param job_timeout: Segundos maximos por conversion; al vencerse la
+        instancia se reinicia.
+    :param start_timeout: Segundos maximos para que una instancia acepte
+        conexiones.
+    """
+
+    def __init__(
+        self,
+        slots: ConversionSlots,
+        binary: str,
+        python: str,
+        base_port: int,
+        job_timeout: int,
+        start_timeout: int,
+    ):
+        self.slots = slots
+        self.instances = [
+            LibreOfficeInstance(
+                index,
+                slots.lock_dir,
+                binary,
+                python,
+                base_port + index,
+                start_timeout,
+                job_timeout,
+            )
+            for index in range(slots.size)
+        ]
+
+    def convert(self, index: int, word_file_content: bytes) -> bytes:
+        """Convierte en la instancia del cupo `index`, que debe estar tomado."""
+        instance = self.instances[index]
+        if not instance.is_alive():
+            instance.start()
+        return instance.convert(word_file_content)
+
+    def warm(self):
+        """Inicia las instancias detenidas cuyo cupo este libre."""
+        for instance in self.instances:
+            with self.slots.acquire_index(instance.index) as acquired:
+                if not acquired or instance.is_alive():
+                    continue
+                try:
+                    instance.start()
+                except ConversionError:
+                    logger.warning(
+                        "No se pudo iniciar LibreOffice %s; se usara la CLI "
+                        "hasta que inicie",
+                        instance.index,
+                        exc_info=True,
+                    )
+
+    def close(self):
+        for instance in self.instances:
+            instance.stop()
+
+
+def uno_available(python: str) -> bool:
+    """Indica si `python` puede importar el modulo uno de LibreOffice."""
+    try:
+        completed = subprocess.run(
+            [python, "-c", "import uno"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=30,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return completed.returncode == 0
+
+
+_slots = None
+_pool = None
+_pool_checked = False
+_pool_lock = threading.Lock()
+
+
+def get_conversion_slots():
+    global _slots
+    if _slots is None:
+        _slots = ConversionSlots(
+            settings.PDF_CONVERSION_CONCURRENCY, settings.PDF_CONVERSION_LOCK_DIR
+        )
+    return _slots
+
+
+def get_converter_pool():
+    """
+    Devuelve el pool de LibreOffice, o None si esta deshabilitado
+    (LIBREOFFICE_POOL) o si LIBREOFFICE_PYTHON no puede importar uno. La
+    revision se hace una vez por proceso.
+    """
+    global _pool, _pool_checked
+    if not settings.LIBREOFFICE_POOL:
+        return None
+    if _pool_checked:
+        return _pool
+    with _pool_lock:
+        if not _pool_checked:
+            if uno_available(settings.LIBREOFFICE_PYTHON):
+                _pool = LibreOfficePool(
+                    get_conversion_slots(),
+                    binary=settings.LIBREOFFICE_BINARY,
+                    python=settings.LIBREOFFICE_PYTHON,
+                    base_port=settings.LIBREOFFICE_BASE_PORT,
+                    job_timeout=settings.LIBREOFFICE_JOB_TIMEOUT,
+                    start_timeout=settings.LIBREOFFICE_START_TIMEOUT,
+                )
+            else:
+                logger.warning(
+                    "%s no puede importar uno (instale python3-uno); las "
+                    "conversiones a PDF usaran la CLI de LibreOffice",
+                    settings.LIBREOFFICE_PYTHON,
+                )
+            _pool_checked = True
+    return _pool
+
+
+def warm_converter_pool():
+    """
+    Inicia las instancias de LibreOffice que no esten corriendo. Se llama al
+    arrancar cada worker (gunicorn.conf.py y celery.py) para que la primera
+    conversion no pague el arranque.
+    """
+    pool = get_converter_pool()
+    if pool is not None:
+        pool.warm()
+
+
+def convert_docx_to_pdf(word_file_content: bytes) -> bytes:
+    with get_conversion_slots().acquire(settings.PDF_CONVERSION_WAIT_TIMEOUT) as index:
+        pool = get_converter_pool()
+        if pool is not None:
+            try:
+                return pool.convert(index, word_file_content)
+            except ConversionTimeout:
+                raise
+            except ConversionError:
+                logger.warning(
+                    "El pool de LibreOffice no pudo convertir en el cupo %s; "
+                    "se usara la CLI",
+                    index,
+                    exc_info=True,
+                )
+        return convert_with_cli(word_file_content)
@@ -5,6 +5,7 @@ from apps.diagnosis.models import (
     Compliance,
     CheckList,
     Diagnosis_Questions,
+    DiagnosisStepScore,
 )
 from typing import List
 from apps.diagnosis_requirement.core.models import Diagnosis_Requirement
@@ -58,7 +59,15 @@ class IDiagnosisQuestionRepository(ABC):
 
 class CheckListRepositoryInterface(ABC):
     @abstractmethod
-    def get_checklists_by_company(self, company_id: int):
+    def get_score_rows(self, diagnosis_id: int):
+        pass
+
+    @abstractmethod
+    def get_step_totals(self, diagnosis_ids: List[int], count_fields: dict):
+        pass
+
+    @abstractmethod
+    def get_score_stamp(self, diagnosis_id: int) -> dict:
         pass
 
     @abstractmethod
@@ -75,6 +84,30 @@ class CheckListRepositoryInterface(ABC):
     def massive_update(self, data_to_save):
         pass
 
+    @abstractmethod
+    def massive_upsert(self, data_to_save):
+        pass
+
+
+class DiagnosisStepScoreRepositoryInterface(ABC):
+    @abstractmethod
+    def get_by_diagnosis_ids(self, diagnosis_ids: List[int]):
+        pass
+
+    @abstractmethod
+    def get_columns(self, diagnosis_ids: List[int], fields: List[str]):
+        pass
+
+    @abstractmethod
+    def lock_diagnoses(self, diagnosis_ids: List[int]) -> List[int]:
+        pass
+
+    @abstractmethod
+    def replace(
+        self, diagnosis_ids: List[int], step_scores: List[DiagnosisStepScore]
+    ) -> List[DiagnosisStepScore]:
+        pass
+
 
 class CheckListRequirementRepositoryInterface(ABC):
     @abstractmethod
@@ -95,6 +128,12 @@ class CheckListRequirementRepositoryInterface(ABC):
     ) -> Checklist_Requirement | None:
         pass
 
+    @abstractmethod
+    def get_checklists_requirement_by_ids_and_diagnosis_id(
+        self, ids: List[int], diagnosis_id
+    ) -> dict:
+        pass
+
     @abstractmethod
     def get_requirement_by_id(self, id) -> Diagnosis_Requirement:
         pass
@@ -0,0 +1,437 @@
+import json
+import math
+import os
+import random
+import time
+import tracemalloc
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from faker import Faker
+from apps.company.models import Ciiu, Company, CompanySize, Mission, Segments
+from apps.corporate_group.models import Corporate, Corporate_Company_Diagnosis
+from apps.diagnosis.converters import convert_docx_to_pdf
+from apps.diagnosis.profiling import ReportProfiler
+from apps.diagnosis.models import (
+    CheckList,
+    Checklist_Requirement,
+    Compliance,
+    Diagnosis,
+    Diagnosis_Questions,
+    DriverQuestion,
+    VehicleQuestions,
+)
+from apps.diagnosis.pdf_renderer import PDF_RENDERER_REPORTLAB, PDF_RENDERERS
+from apps.diagnosis.report_templates import template_registry
+from apps.diagnosis.scoring import ScoringEngine
+from apps.diagnosis.services import (
+    GenerateReport,
+    REPORT_KIND_DIAGNOSIS,
+    REPORT_KIND_WORK_PLAN,
+    REPORT_TEMPLATES,
+)
+from apps.diagnosis_counter.models import Diagnosis_Counter, Driver, Fleet
+from apps.diagnosis_requirement.core.models import (
+    Diagnosis_Requirement,
+    Recomendation,
+    WorkPlan_Recomendation,
+)
+from apps.sign.models import User
+from utils.constants import ComplianceIds
+
+# Fixtures del repositorio con los catalogos base, en orden de carga
+CATALOG_FIXTURES = (
+    "DiagnosisCompliance",
+    "DedicationAndSize",
+    "DiagnosisRequirement",
+    "VehicleAndDriversQuestions",
+    "DriversQuestions",
+)
+
+# Reparto de los pasos del PESV entre los ciclos PHVA
+CYCLES = ["P"] * 7 + ["H"] * 10 + ["V"] * 3 + ["A"] * 3
+
+OBTAINED_VALUES = {
+    ComplianceIds.CUMPLE.value: 1,
+    ComplianceIds.NO_CUMPLE.value: 0,
+    ComplianceIds.CUMPLE_PARCIALMENTE.value: 0.5,
+    ComplianceIds.NO_APLICA.value: 1,
+}
+
+
+def percentile(values, fraction):
+    """Percentil por rango mas cercano; suficiente para pocas iteraciones."""
+    ordered = sorted(values)
+    index = max(math.ceil(fraction * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la generacion de informes con diagnosticos sinteticos de distintos "
+        "tamaños. Todo lo creado se revierte al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--companies",
+            type=int,
+            nargs="+",
+            default=[1, 5, 20],
+            help="Empresas por escenario; 1 es un diagnostico de empresa y mas de 1 "
+            "un diagnostico de grupo empresarial.",
+        )
+        parser.add_argument(
+            "--questions",
+            type=int,
+            default=4,
+            help="Preguntas minimas por requisito.",
+        )
+        parser.add_argument(
+            "--requirements",
+            type=int,
+            default=0,
+            help="Requisitos sinteticos adicionales a los del fixture.",
+        )
+        parser.add_argument(
+            "--vehicle-questions",
+            type=int,
+            default=0,
+            help="Preguntas de vehiculos sinteticas adicionales.",
+        )
+        parser.add_argument(
+            "--driver-questions",
+            type=int,
+            default=0,
+            help="Preguntas de conductores sinteticas adicionales.",
+        )
+        parser.add_argument("--iterations", type=int, default=5)
+        parser.add_argument(
+            "--format", dest="format_to_save", choices=["docx", "pdf"], default="docx"
+        )
+        parser.add_argument(
+            "--renderer",
+            choices=PDF_RENDERERS,
+            help="Generador de PDF; por defecto REPORT_PDF_RENDERER.",
+        )
+        parser.add_argument(
+            "--kind",
+            choices=[REPORT_KIND_DIAGNOSIS, REPORT_KIND_WORK_PLAN],
+            default=REPORT_KIND_DIAGNOSIS,
+        )
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument(
+            "--output", help="Archivo JSON donde guardar los resultados."
+        )
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations debe ser al menos 1")
+        random.seed(options["seed"])
+        self.faker = Faker("es_CO")
+        self.faker.seed_instance(options["seed"])
+
+        results = []
+        with transaction.atomic():
+            self.prepare_catalogs(options)
+            for companies in options["companies"]:
+                diagnosis, company = self.seed_diagnosis(companies)
+                stages, breakdown = self.measure(diagnosis, company, options)
+                results.append(
+                    {
+                        "companies": companies,
+                        "requirements": Diagnosis_Requirement.objects.count(),
+                        "questions": Diagnosis_Questions.objects.count(),
+                        "vehicle_questions": VehicleQuestions.objects.count(),
+                        "driver_questions": DriverQuestion.objects.count(),
+                        "stages": stages,
+                        "build_breakdown": breakdown,
+                    }
+                )
+                self.print_scenario(results[-1])
+            transaction.set_rollback(True)
+
+        if options["output"]:
+            with open(options["output"], "w") as output_file:
+                json.dump(results, output_file, indent=2)
+            self.stdout.write(f"Resultados guardados en {options['output']}")
+
+    def prepare_catalogs(self, options):
+        """Carga los fixtures si faltan y completa los catalogos sinteticos."""
+        if not Compliance.objects.exists():
+            for fixture in CATALOG_FIXTURES:
+                call_command(
+                    "loaddata",
+                    os.path.join(settings.BASE_DIR, "fixtures", f"{fixture}.json"),
+                    verbosity=0,
+                )
+
+        Diagnosis_Requirement.objects.bulk_create(
+            Diagnosis_Requirement(name=f"{self.faker.unique.catch_phrase()} ({index})")
+            for index in range(options["requirements"])
+        )
+        for index, requirement in enumerate(
+            Diagnosis_Requirement.objects.order_by("id")
+        ):
+            if requirement.step is None or requirement.cycle is None:
+                requirement.step = index + 1
+                requirement.cycle = CYCLES[index % len(CYCLES)]
+            requirement.basic = requirement.standard = requirement.advanced = True
+            requirement.save()
+
+            missing = (
+                options["questions"]
+                - Diagnosis_Questions.objects.filter(requirement=requirement).count()
+            )
+            Diagnosis_Questions.objects.bulk_create(
+                Diagnosis_Questions(
+                    name=self.faker.sentence(nb_words=12),
+                    requirement=requirement,
+                    variable_value=random.choice([10, 20, 25]),
+                )
+                for _ in range(max(missing, 0))
+            )
+            if not Recomendation.objects.filter(requirement=requirement).exists():
+                Recomendation.objects.create(
+                    name=self.faker.paragraph(), requirement=requirement, all=True
+                )
+            if not WorkPlan_Recomendation.objects.filter(
+                requirement=requirement
+            ).exists():
+                WorkPlan_Recomendation.objects.create(
+                    name=self.faker.paragraph(), requirement=requirement
+                )
+
+        VehicleQuestions.objects.bulk_create(
+            VehicleQuestions(name=f"{self.faker.sentence(nb_words=8)} ({index})")
+            for index in range(options["vehicle_questions"])
+        )
+        DriverQuestion.objects.bulk_create(
+            DriverQuestion(name=self.faker.sentence(nb_words=8))
+            for _ in range(options["driver_questions"])
+        )
+
+    def seed_diagnosis(self, companies: int):
+        """
+        Crea un diagnostico con respuestas, flota y conductores aleatorios.
+
+        :return: Tupla (diagnostico, empresa); la empresa es None en un
+            diagnostico de grupo empresarial.
+        """
+        size = CompanySize.objects.order_by("id").first()
+        segment, _ = Segments.objects.get_or_create(name="Benchmark")
+        ciiu, _ = Ciiu.objects.get_or_create(
+            code="0000", defaults={"name": "Actividad de prueba"}
+        )
+        consultor, _ = User.objects.get_or_create(
+            username="benchmark_reports",
+            defaults={
+                "first_name": self.faker.first_name(),
+                "last_name": self.faker.last_name(),
+                "email": "benchmark@example.com",
+            },
+        )
+
+        created = []
+        for _ in range(companies):
+            company = Company.objects.create(
+                name=self.faker.unique.company()[:100],
+                nit=str(self.faker.unique.random_number(digits=10, fix_len=True)),
+                segment=segment,
+                dependant=self.faker.name(),
+                dependant_position=self.faker.job()[:200],
+                mission=Mission.objects.order_by("id").first(),
+                size=size,
+            )
+            company.ciius.add(ciiu)
+            created.append(company)
+
+        corporate = None
+        if companies > 1:
+            corporate = Corporate.objects.create(
+                name=self.faker.unique.company()[:200],
+                nit=str(self.faker.unique.random_number(digits=10, fix_len=True)),
+            )
+            Corporate_Company_Diagnosis.objects.bulk_create(
+                Corporate_Company_Diagnosis(company=company, corporate=corporate)
+                for company in created
+            )
+        diagnosis = Diagnosis.objects.create(
+            company=None if corporate else created[0],
+            type=size,
+            date_elabored=self.faker.date_this_year(),
+            consultor=consultor,
+            is_for_corporate_group=corporate is not None,
+            corporate_group=corporate,
+        )
+
+        vehicle_questions = list(VehicleQuestions.objects.all())
+        driver_questions = list(DriverQuestion.objects.all())
+        for company in created:
+            counter = Diagnosis_Counter.objects.create(
+                company=company, diagnosis=diagnosis, size=size
+            )
+            Fleet.objects.bulk_create(
+                Fleet(
+                    diagnosis_counter=counter,
+                    vehicle_question=question,
+                    quantity_owned=random.randint(0, 20),
+                    quantity_third_party=random.randint(0, 5),
+                    quantity_renting=random.randint(0, 5),
+                    quantity_employees=random.randint(0, 5),
+                )
+                for question in vehicle_questions
+            )
+            Driver.objects.bulk_create(
+                Driver(
+                    diagnosis_counter=counter,
+                    driver_question=question,
+                    quantity=random.randint(0, 30),
+                )
+                for question in driver_questions
+            )
+
+        compliances = list(Compliance.objects.order_by("id"))
+        Checklist_Requirement.objects.bulk_create(
+            Checklist_Requirement(
+                diagnosis=diagnosis,
+                requirement=requirement,
+                compliance=random.choice(compliances),
+                observation=self.faker.sentence(),
+            )
+            for requirement in Diagnosis_Requirement.objects.order_by("id")
+        )
+        checklists = []
+        for question in Diagnosis_Questions.objects.order_by("id"):
+            compliance = random.choice(compliances)
+            checklists.append(
+                CheckList(
+                    question=question,
+                    diagnosis=diagnosis,
+                    compliance=compliance,
+                    obtained_value=question.variable_value
+                    * OBTAINED_VALUES.get(compliance.id, 0),
+                    is_articuled=random.random() > 0.2,
+                )
+            )
+        CheckList.objects.bulk_create(checklists)
+        # bulk_create no envia senales; el resumen de puntajes se llena aqui
+        ScoringEngine().refresh([diagnosis.id])
+        return diagnosis, (None if corporate else created[0])
+
+    def measure(self, diagnosis, company, options):
+        """
+        Mide cada etapa: tiempo en todas las iteraciones, consultas SQL y pico
+        de memoria en una corrida aparte con tracemalloc (que hace mas lento el
+        codigo y no debe contaminar los tiempos).
+        """
+        kind = options["kind"]
+        format_to_save = options["format_to_save"]
+        template_path = os.path.join(settings.MEDIA_ROOT, REPORT_TEMPLATES[kind])
+
+        def make_generator():
+            return GenerateReport(
+                company=company,
+                diagnosis=diagnosis,
+                schedule=diagnosis.schedule,
+                sequence=diagnosis.sequence,
+                pdf_renderer=options["renderer"],
+            )
+
+        # Con reportlab el PDF se dibuja directo, sin DOCX ni conversion
+        direct_pdf = (
+            format_to_save == "pdf"
+            and make_generator().pdf_renderer == PDF_RENDERER_REPORTLAB
+        )
+        build_format = "pdf" if direct_pdf else "docx"
+
+        def run_stages():
+            generate_report = make_generator()
+            yield "cache_key", lambda: generate_report.report_key(
+                kind, format_to_save
+            )
+            if direct_pdf:
+                yield "build_pdf", lambda: generate_report.build(kind, "pdf")
+                return
+            yield "template", lambda: template_registry.get(template_path)
+            document = {}
+
+            def build_docx():
+                document["docx"] = generate_report.build(kind, "docx")
+
+            yield "build_docx", build_docx
+            if format_to_save == "pdf":
+                yield "convert_pdf", lambda: convert_docx_to_pdf(document["docx"])
+
+        # Calentamiento: parseo de plantillas y caches de proceso
+        for _, stage in run_stages():
+            stage()
+
+        timings = {}
+        queries = {}
+        for _ in range(options["iterations"]):
+            for name, stage in run_stages():
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    stage()
+                    elapsed = time.perf_counter() - start
+                timings.setdefault(name, []).append(elapsed)
+                queries[name] = len(captured.captured_queries)
+
+        # Desglose de la construccion con las etapas internas del informe
+        generate_report = make_generator()
+        generate_report.profiler = ReportProfiler(enabled=True)
+        with generate_report.profiler.track(kind):
+            generate_report.build(kind, build_format)
+        breakdown = generate_report.profiler.spans
+
+        peaks = {}
+        tracemalloc.start()
+        try:
+            for name, stage in run_stages():
+                baseline = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                stage()
+                peaks[name] = tracemalloc.get_traced_memory()[1] - baseline
+        finally:
+            tracemalloc.stop()
+
+        stages = {
+            name: {
+                "p50_ms": percentile(values, 0.5) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "queries": queries[name],
+                "peak_memory_kb": peaks[name] / 1024,
+            }
+            for name, values in timings.items()
+        }
+        return stages, breakdown
+
+    def print_scenario(self, result):
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(
+                f"Empresas: {result['companies']} | requisitos: "
+                f"{result['requirements']} | preguntas: {result['questions']} | "
+                f"vehiculos: {result['vehicle_questions']} | conductores: "
+                f"{result['driver_questions']}"
+            )
+        )
+        self.stdout.write(
+            f"  {'etapa':<14}{'p50 ms':>10}{'p95 ms':>10}{'consultas':>11}"
+            f"{'pico KB':>11}"
+        )
+        total_p50 = 0
+        for name, stage in result["stages"].items():
+            total_p50 += stage["p50_ms"]
+            self.stdout.write(
+                f"  {name:<14}{stage['p50_ms']:>10.1f}{stage['p95_ms']:>10.1f}"
+                f"{stage['queries']:>11}{stage['peak_memory_kb']:>11.0f}"
+            )
+        self.stdout.write(f"  {'total p50':<14}{total_p50:>10.1f}")
+        self.stdout.write("  desglose de la construccion (una corrida):")
+        for span in result["build_breakdown"]:
+            self.stdout.write(
+                f"    {span['name']:<22}{span['ms']:>10.1f} ms{span['queries']:>6} consultas"
+            )
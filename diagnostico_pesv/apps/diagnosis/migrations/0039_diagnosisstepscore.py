@@ -0,0 +1,35 @@
+# Generated by Django 5.1 on 2026-10-18 18:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnosis', '0038_reportdelivery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiagnosisStepScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created_at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated_at')),
+                ('cycle', models.CharField(default=None, max_length=2, null=True)),
+                ('step', models.IntegerField(default=None, null=True)),
+                ('variable_value', models.FloatField(default=0)),
+                ('obtained_value', models.FloatField(default=0)),
+                ('articulated_value', models.FloatField(default=0)),
+                ('count_cumple', models.IntegerField(default=0)),
+                ('count_no_cumple', models.IntegerField(default=0)),
+                ('count_cumple_parcialmente', models.IntegerField(default=0)),
+                ('count_no_aplica', models.IntegerField(default=0)),
+                ('diagnosis', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='step_scores', to='diagnosis.diagnosis')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('diagnosis', 'cycle', 'step'), name='unique_diagnosis_step_score')],
+            },
+        ),
+    ]
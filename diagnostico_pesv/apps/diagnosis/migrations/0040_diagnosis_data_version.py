@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnosis', '0039_diagnosisstepscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diagnosis',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
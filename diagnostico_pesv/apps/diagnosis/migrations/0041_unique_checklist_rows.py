@@ -0,0 +1,100 @@
+# Generated by Django 5.1 on 2026-10-18 18:31
+
+import django.core.serializers.json
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def _remove_duplicates(model, field, backup_model):
+    """
+    Deja una sola fila por (diagnostico, `field`): la primera sin eliminar,
+    que es la que venia actualizando saveDiagnosis. Las demas se copian a
+    ChecklistDuplicateBackup antes de borrarlas; la restriccion de unicidad
+    tambien cuenta las filas eliminadas con SoftDeletes, asi que no basta con
+    marcarlas. Devuelve los diagnosticos afectados.
+    """
+    duplicated = (
+        model.objects.values("diagnosis_id", field)
+        .annotate(total=Count("id"))
+        .filter(total__gt=1, diagnosis_id__isnull=False)
+        .exclude(**{f"{field}__isnull": True})
+    )
+    diagnosis_ids = set()
+    for group in duplicated:
+        rows = list(
+            model.objects.filter(
+                diagnosis_id=group["diagnosis_id"], **{field: group[field]}
+            )
+            .order_by("id")
+            .values_list("id", "deleted_at")
+        )
+        keep = next((id for id, deleted_at in rows if deleted_at is None), rows[0][0])
+        duplicates = model.objects.filter(id__in=[id for id, _ in rows if id != keep])
+        backup_model.objects.bulk_create(
+            backup_model(
+                model=model.__name__,
+                original_id=row["id"],
+                diagnosis_id=row["diagnosis_id"],
+                kept_id=keep,
+                data=row,
+            )
+            for row in duplicates.values()
+        )
+        duplicates.delete()
+        diagnosis_ids.add(group["diagnosis_id"])
+    return diagnosis_ids
+
+
+def remove_duplicated_checklists(apps, schema_editor):
+    backup_model = apps.get_model("diagnosis", "ChecklistDuplicateBackup")
+    diagnosis_ids = _remove_duplicates(
+        apps.get_model("diagnosis", "CheckList"), "question_id", backup_model
+    ) | _remove_duplicates(
+        apps.get_model("diagnosis", "Checklist_Requirement"),
+        "requirement_id",
+        backup_model,
+    )
+    # Los puntajes guardados de esos diagnosticos contaban las filas repetidas
+    apps.get_model("diagnosis", "DiagnosisStepScore").objects.filter(
+        diagnosis_id__in=diagnosis_ids
+    ).delete()
+    apps.get_model("diagnosis", "Diagnosis").objects.filter(
+        id__in=diagnosis_ids
+    ).update(data_version=F("data_version") + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnosis', '0040_diagnosis_data_version'),
+        ('diagnosis_requirement', '0009_workplan_recomendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChecklistDuplicateBackup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created_at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated_at')),
+                ('model', models.CharField(max_length=50)),
+                ('original_id', models.BigIntegerField()),
+                ('diagnosis_id', models.BigIntegerField(default=None, null=True)),
+                ('kept_id', models.BigIntegerField()),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        # Sin reverse: las filas borradas solo quedan en ChecklistDuplicateBackup
+        migrations.RunPython(remove_duplicated_checklists),
+        migrations.AddConstraint(
+            model_name='checklist',
+            constraint=models.UniqueConstraint(fields=('diagnosis', 'question'), name='unique_checklist_diagnosis_question'),
+        ),
+        migrations.AddConstraint(
+            model_name='checklist_requirement',
+            constraint=models.UniqueConstraint(fields=('diagnosis', 'requirement'), name='unique_checklist_requirement_diagnosis_requirement'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.1 on 2026-10-18 21:05
+
+from django.db import migrations
+from django.db.models import Case, Count, F, FloatField, Min, Q, Sum, When
+
+# Ids de utils.constants.ComplianceIds
+CUMPLE, NO_CUMPLE, CUMPLE_PARCIALMENTE, NO_APLICA = 1, 2, 3, 4
+BATCH = 500
+
+
+def backfill_step_scores(apps, schema_editor):
+    """
+    Llena el resumen de puntajes de los diagnosticos con respuestas que aun no
+    lo tienen; antes se calculaba en la primera lectura.
+    """
+    CheckList = apps.get_model("diagnosis", "CheckList")
+    DiagnosisStepScore = apps.get_model("diagnosis", "DiagnosisStepScore")
+    checklists = CheckList.objects.filter(
+        deleted_at__isnull=True, diagnosis__isnull=False
+    )
+    diagnosis_ids = sorted(
+        set(checklists.values_list("diagnosis_id", flat=True).distinct())
+        - set(DiagnosisStepScore.objects.values_list("diagnosis_id", flat=True))
+    )
+    for start in range(0, len(diagnosis_ids), BATCH):
+        rows = (
+            checklists.filter(diagnosis_id__in=diagnosis_ids[start : start + BATCH])
+            .values(
+                "diagnosis_id",
+                "question__requirement__cycle",
+                "question__requirement__step",
+            )
+            .annotate(
+                first_checklist=Min("id"),
+                total_variable=Sum("question__variable_value"),
+                total_obtained=Sum("obtained_value"),
+                total_articulated=Sum(
+                    Case(
+                        When(is_articuled=True, then=F("obtained_value")),
+                        default=F("question__variable_value"),
+                        output_field=FloatField(),
+                    )
+                ),
+                count_cumple=Count("id", filter=Q(compliance_id=CUMPLE)),
+                count_no_cumple=Count("id", filter=Q(compliance_id=NO_CUMPLE)),
+                count_cumple_parcialmente=Count(
+                    "id", filter=Q(compliance_id=CUMPLE_PARCIALMENTE)
+                ),
+                count_no_aplica=Count("id", filter=Q(compliance_id=NO_APLICA)),
+            )
+            .order_by("diagnosis_id", "first_checklist")
+        )
+        DiagnosisStepScore.objects.bulk_create(
+            [
+                DiagnosisStepScore(
+                    diagnosis_id=row["diagnosis_id"],
+                    cycle=row["question__requirement__cycle"],
+                    step=row["question__requirement__step"],
+                    variable_value=row["total_variable"] or 0,
+                    obtained_value=row["total_obtained"] or 0,
+                    articulated_value=row["total_articulated"] or 0,
+                    count_cumple=row["count_cumple"],
+                    count_no_cumple=row["count_no_cumple"],
+                    count_cumple_parcialmente=row["count_cumple_parcialmente"],
+                    count_no_aplica=row["count_no_aplica"],
+                )
+                for row in rows
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnosis', '0042_reportjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_step_scores, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from timestamps.models import SoftDeletes, Timestampable
 from apps.diagnosis_requirement.core.models import Diagnosis_Requirement
@@ -71,6 +72,8 @@ class Diagnosis(SoftDeletes, Timestampable):
         blank=False,
         related_name="corporates_diagnosis",
     )
+    # Aumenta cada vez que se guardan respuestas; sirve de ETag de los puntajes
+    data_version = models.PositiveIntegerField(default=0, null=False)
 
 
 class CheckList(SoftDeletes, Timestampable):
@@ -89,6 +92,14 @@ class CheckList(SoftDeletes, Timestampable):
     observation = models.TextField(null=False, default="SIN OBSERVACIONES", blank=False)
     is_articuled = models.BooleanField(default=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["diagnosis", "question"],
+                name="unique_checklist_diagnosis_question",
+            )
+        ]
+
 
 class Checklist_Requirement(SoftDeletes, Timestampable):
     diagnosis = models.ForeignKey(Diagnosis, on_delete=models.CASCADE)
@@ -100,6 +111,14 @@ class Checklist_Requirement(SoftDeletes, Timestampable):
     )
     observation = models.TextField(blank=False, null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["diagnosis", "requirement"],
+                name="unique_checklist_requirement_diagnosis_requirement",
+            )
+        ]
+
 
 class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, default=None)
@@ -110,3 +129,104 @@ class Notification(models.Model):
 
     def __str__(self):
         return f"Notification to {self.user} - {self.message}"
+
+
+class ReportDelivery(Timestampable):
+    """Envio del informe por correo; lo procesa un task de celery."""
+
+    STATUS_PENDING = "pending"
+    STATUS_SENDING = "sending"
+    STATUS_RETRYING = "retrying"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUSES = [
+        (STATUS_PENDING, "Pendiente"),
+        (STATUS_SENDING, "Enviando"),
+        (STATUS_RETRYING, "Reintentando"),
+        (STATUS_SENT, "Enviado"),
+        (STATUS_FAILED, "Fallido"),
+    ]
+
+    diagnosis = models.ForeignKey(Diagnosis, on_delete=models.CASCADE)
+    company = models.ForeignKey(
+        Company, on_delete=models.SET_NULL, null=True, default=None
+    )
+    requested_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, default=None
+    )
+    email_to = models.EmailField(max_length=254)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    schedule = models.CharField(null=True, blank=False, max_length=100)
+    sequence = models.CharField(null=True, blank=False, max_length=100)
+    status = models.CharField(max_length=20, choices=STATUSES, default=STATUS_PENDING)
+    attempts = models.IntegerField(default=0, null=False)
+    error = models.TextField(null=True, default=None, blank=False)
+    task_id = models.CharField(max_length=255, null=True, default=None)
+    sent_at = models.DateTimeField(null=True, default=None)
+
+
+class ReportJob(Timestampable):
+    """Informe generado en celery; solo quien lo pidio puede consultarlo."""
+
+    job_id = models.CharField(max_length=255, unique=True)
+    kind = models.CharField(max_length=50)
+    diagnosis = models.ForeignKey(Diagnosis, on_delete=models.CASCADE)
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE)
+
+
+class DiagnosisStepScore(Timestampable):
+    """
+    Totales de un paso del diagnostico, derivados de sus CheckList.
+
+    Se recalculan con ScoringEngine.refresh cada vez que se
+    escriben las respuestas o cambian las preguntas y requisitos que las
+    puntuan (ver apps.diagnosis.signals), para que los puntajes se lean sin
+    recorrer las preguntas.
+    """
+
+    diagnosis = models.ForeignKey(
+        Diagnosis, on_delete=models.CASCADE, related_name="step_scores"
+    )
+    cycle = models.CharField(null=True, default=None, max_length=2)
+    step = models.IntegerField(null=True, default=None)
+    variable_value = models.FloatField(default=0, null=False)
+    # Suma de obtained_value tal como se guardo
+    obtained_value = models.FloatField(default=0, null=False)
+    # Valor del paso: las preguntas sin articular cuentan con su valor completo
+    articulated_value = models.FloatField(default=0, null=False)
+    count_cumple = models.IntegerField(default=0, null=False)
+    count_no_cumple = models.IntegerField(default=0, null=False)
+    count_cumple_parcialmente = models.IntegerField(default=0, null=False)
+    count_no_aplica = models.IntegerField(default=0, null=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["diagnosis", "cycle", "step"],
+                name="unique_diagnosis_step_score",
+            )
+        ]
+
+    @property
+    def percentage(self) -> float:
+        if self.variable_value > 0:
+            return (self.articulated_value / self.variable_value) * 100
+        return 0.0
+
+
+class ChecklistDuplicateBackup(Timestampable):
+    """
+    Copia de las respuestas repetidas que borro la migracion 0041 al exigir
+    una sola fila por diagnostico y pregunta (o requisito).
+
+    Guarda cada fila tal como estaba para poder revisarla o recuperarla a
+    mano; created_at es el momento en que se borro.
+    """
+
+    model = models.CharField(max_length=50)
+    original_id = models.BigIntegerField()
+    # Sin llave foranea: la copia se conserva aunque el diagnostico se borre
+    diagnosis_id = models.BigIntegerField(null=True, default=None)
+    kept_id = models.BigIntegerField()
+    data = models.JSONField(encoder=DjangoJSONEncoder)
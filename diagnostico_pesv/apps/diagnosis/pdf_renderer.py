@@ -0,0 +1,484 @@
+from io import BytesIO
+from xml.sax.saxutils import escape
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import (
+    Image,
+    ListFlowable,
+    ListItem,
+    Paragraph,
+    SimpleDocTemplate,
+    Spacer,
+    Table,
+    TableStyle,
+)
+
+PDF_RENDERER_LIBREOFFICE = "libreoffice"
+PDF_RENDERER_REPORTLAB = "reportlab"
+PDF_RENDERERS = (PDF_RENDERER_LIBREOFFICE, PDF_RENDERER_REPORTLAB)
+
+# Mismos colores que las tablas de las plantillas DOCX
+HEADER_COLOR = colors.HexColor("#2f4858")
+CRITERIA_COLOR = colors.HexColor("#ebedf3")
+CYCLE_COLORS = {
+    "P": colors.HexColor("#0066B2"),
+    "H": colors.HexColor("#00A551"),
+    "V": colors.HexColor("#DCB00A"),
+    "A": colors.HexColor("#EC1C24"),
+}
+CYCLE_NAMES = {
+    "P": "PLANEAR",
+    "H": "HACER",
+    "V": "VERIFICAR",
+    "A": "ACTUAR",
+}
+FLEET_HEADERS = (
+    "Cantidad Propios",
+    "Cantidad Terceros",
+    "Cantidad Arrendados",
+    "Cantidad Contratistas",
+    "Cantidad Intermediación",
+    "Cantidad Leasing",
+    "Cantidad Renting",
+)
+
+PAGE_WIDTH = letter[0] - 1.5 * inch
+
+_styles = getSampleStyleSheet()
+TITLE_STYLE = ParagraphStyle("ReportTitle", parent=_styles["Title"], fontSize=16)
+HEADING_STYLE = ParagraphStyle(
+    "ReportHeading", parent=_styles["Heading2"], spaceBefore=12, spaceAfter=6
+)
+BODY_STYLE = ParagraphStyle("ReportBody", parent=_styles["BodyText"], fontSize=9)
+CELL_STYLE = ParagraphStyle("ReportCell", parent=BODY_STYLE, fontSize=8, leading=10)
+HEADER_CELL_STYLE = ParagraphStyle(
+    "ReportHeaderCell", parent=CELL_STYLE, textColor=colors.white
+)
+CENTER_CELL_STYLE = ParagraphStyle("ReportCenterCell", parent=CELL_STYLE, alignment=1)
+CENTER_HEADER_CELL_STYLE = ParagraphStyle(
+    "ReportCenterHeaderCell", parent=HEADER_CELL_STYLE, alignment=1
+)
+# Los encabezados de las cantidades de la flota van en columnas angostas
+FLEET_HEADER_CELL_STYLE = ParagraphStyle(
+    "ReportFleetHeaderCell", parent=CENTER_HEADER_CELL_STYLE, fontSize=6.5, leading=8
+)
+
+GRID_STYLE = [
+    ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
+    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+]
+
+
+def _cell(text, style=CELL_STYLE) -> Paragraph:
+    return Paragraph(escape(str(text if text is not None else "")), style)
+
+
+def _header(text, centered=False) -> Paragraph:
+    return _cell(text, CENTER_HEADER_CELL_STYLE if centered else HEADER_CELL_STYLE)
+
+
+def _table(rows, col_widths, commands) -> Table:
+    table = Table(rows, colWidths=col_widths)
+    table.setStyle(TableStyle(GRID_STYLE + commands))
+    return table
+
+
+def _widths(*fractions) -> list:
+    return [PAGE_WIDTH * fraction for fraction in fractions]
+
+
+def _image(content: bytes, width: float) -> Image:
+    image_width, image_height = ImageReader(BytesIO(content)).getSize()
+    return Image(
+        BytesIO(content), width=width, height=width * image_height / image_width
+    )
+
+
+def _info_table(rows) -> Table:
+    """Tabla de dos columnas etiqueta / valor."""
+    return _table(
+        [[_cell(label), _cell(value)] for label, value in rows],
+        _widths(0.35, 0.65),
+        [("BACKGROUND", (0, 0), (0, -1), CRITERIA_COLOR)],
+    )
+
+
+def _company_table(company: dict, date: str) -> list:
+    info_rows = [
+        [_header("Fecha de elaboración"), _header(date)],
+        [_header("Empresa"), _header(company["name"])],
+        [_header("Nit"), _header(company["nit"])],
+        [
+            _header("Actividades"),
+            # Una actividad por linea, como las viñetas de la plantilla
+            Paragraph(
+                "<br/>".join(escape(activity) for activity in company["activities"]),
+                HEADER_CELL_STYLE,
+            ),
+        ],
+        [_header("Tamaño de la empresa"), _header(company["size"])],
+        [_header("Segmento al que pertenece"), _header(company["segment"])],
+        [_header("Contacto"), _header(company["contact"])],
+        [
+            _header("Certificaciones adquiridas (Normas ISO)"),
+            _header(company["certification"] or "NINGUNA"),
+        ],
+    ]
+    info = _table(
+        [[_header("CARACTERIZACION DE LA EMPRESA"), ""]] + info_rows,
+        _widths(0.35, 0.65),
+        [
+            ("SPAN", (0, 0), (1, 0)),
+            ("BACKGROUND", (0, 0), (-1, -1), HEADER_COLOR),
+        ],
+    )
+
+    fleet_rows = [
+        [_header("FLOTA DE VEHICULOS AUTOMOTORES")]
+        + [_cell(label, FLEET_HEADER_CELL_STYLE) for label in FLEET_HEADERS]
+    ]
+    total_vehicles = 0
+    for name, *quantities in company["vehicles"]:
+        fleet_rows.append(
+            [_cell(name)] + [_cell(quantity, CENTER_CELL_STYLE) for quantity in quantities]
+        )
+        total_vehicles += sum(quantities)
+    fleet_rows.append(
+        [_header("TOTAL VEHICULOS"), _cell(total_vehicles, CENTER_CELL_STYLE)]
+        + [""] * (len(FLEET_HEADERS) - 1)
+    )
+    fleet = _table(
+        fleet_rows,
+        _widths(0.23, *([0.11] * len(FLEET_HEADERS))),
+        [
+            ("LEFTPADDING", (1, 0), (-1, -1), 2),
+            ("RIGHTPADDING", (1, 0), (-1, -1), 2),
+            ("BACKGROUND", (0, 0), (-1, 0), HEADER_COLOR),
+            ("BACKGROUND", (0, -1), (0, -1), HEADER_COLOR),
+            ("SPAN", (1, -1), (-1, -1)),
+        ],
+    )
+
+    driver_rows = [
+        [
+            _header("PERSONAS QUE CONDUCEN CON FINES MISIONALES"),
+            _header("Cantidad", True),
+        ]
+    ]
+    total_drivers = 0
+    for name, quantity in company["drivers"]:
+        driver_rows.append([_cell(name), _cell(quantity, CENTER_CELL_STYLE)])
+        total_drivers += quantity
+    driver_rows.append(
+        [_header("TOTAL CONDUCTORES"), _cell(total_drivers, CENTER_CELL_STYLE)]
+    )
+    drivers = _table(
+        driver_rows,
+        _widths(0.75, 0.25),
+        [
+            ("BACKGROUND", (0, 0), (-1, 0), HEADER_COLOR),
+            ("BACKGROUND", (0, -1), (0, -1), HEADER_COLOR),
+        ],
+    )
+    return [
+        info,
+        Spacer(1, 6),
+        fleet,
+        Spacer(1, 6),
+        drivers,
+        Spacer(1, 6),
+        Paragraph(escape(company["summary"]), BODY_STYLE),
+    ]
+
+
+def _results_table(cycle_data: dict) -> Table:
+    rows = [[_header("PASO PESV"), _header("REQUISITO"), ""]]
+    commands = [
+        ("SPAN", (1, 0), (2, 0)),
+        ("BACKGROUND", (0, 0), (-1, 0), HEADER_COLOR),
+    ]
+    for step in cycle_data["steps"]:
+        for requirement in step["requirements"]:
+            row = len(rows)
+            rows.append(
+                [_header(step["step"]), _header(requirement["requirement_name"]), ""]
+            )
+            rows.append(
+                [_cell("Criterio de verificación"), "", _cell("Nivel de Cumplimiento")]
+            )
+            commands += [
+                ("SPAN", (1, row), (2, row)),
+                ("BACKGROUND", (0, row), (-1, row), HEADER_COLOR),
+                ("SPAN", (0, row + 1), (1, row + 1)),
+                ("BACKGROUND", (0, row + 1), (-1, row + 1), CRITERIA_COLOR),
+            ]
+            for number, question in enumerate(requirement["questions"], start=1):
+                rows.append(
+                    [
+                        Paragraph(
+                            f"<b>{step['step']}.{number}</b> "
+                            f"{escape(question['question_name'])}",
+                            CELL_STYLE,
+                        ),
+                        "",
+                        _cell(question["compliance"], CENTER_CELL_STYLE),
+                    ]
+                )
+                commands.append(("SPAN", (0, len(rows) - 1), (1, len(rows) - 1)))
+    return _table(rows, _widths(0.15, 0.6, 0.25), commands)
+
+
+def _conclusion_table(datas_by_cycle: list, level: str) -> Table:
+    rows = [
+        [_header(f"ESTRUCTURA DE PONDERACIÓN - NIVEL {level} - PESV", True)]
+        + [""] * 4,
+        [
+            _header("FASE"),
+            _header("PASO"),
+            _header("DESCRIPCIÓN"),
+            _header("% PASO"),
+            _header("% FASE"),
+        ],
+    ]
+    commands = [
+        ("SPAN", (0, 0), (-1, 0)),
+        ("BACKGROUND", (0, 0), (-1, 1), HEADER_COLOR),
+    ]
+    for cycle in datas_by_cycle:
+        if not cycle["steps"]:
+            continue
+        start = len(rows)
+        for step in cycle["steps"]:
+            # Igual que en la plantilla, la descripcion es el ultimo requisito
+            description = (
+                step["requirements"][-1]["requirement_name"]
+                if step["requirements"]
+                else ""
+            )
+            rows.append(
+                [
+                    "",
+                    _cell(step["step"], CENTER_CELL_STYLE),
+                    _cell(description),
+                    _cell(f"{round(step['percentage'], 2)}%", CENTER_CELL_STYLE),
+                    "",
+                ]
+            )
+        end = len(rows) - 1
+        rows[start][0] = _header(
+            CYCLE_NAMES.get(cycle["cycle"].upper(), "OTROS"), True
+        )
+        rows[start][4] = _cell(
+            f"{round(cycle['cycle_percentage'], 2)}%", CENTER_CELL_STYLE
+        )
+        commands += [
+            ("SPAN", (0, start), (0, end)),
+            ("SPAN", (4, start), (4, end)),
+            (
+                "BACKGROUND",
+                (0, start),
+                (0, end),
+                CYCLE_COLORS.get(cycle["cycle"].upper(), HEADER_COLOR),
+            ),
+        ]
+    return _table(rows, _widths(0.14, 0.08, 0.54, 0.12, 0.12), commands)
+
+
+def _articulated_table(datas_by_cycle: list) -> Table:
+    evaluated = 0
+    not_articulated = 0
+    for cycle in datas_by_cycle:
+        for step in cycle["steps"]:
+            for requirement in step["requirements"]:
+                compliance = requirement["questions"][-1]["compliance"]
+                if compliance in (
+                    "CUMPLE",
+                    "NO CUMPLE",
+                    "CUMPLE PARCIALMENTE",
+                    "NO APLICA",
+                ):
+                    evaluated += 1
+                if compliance == "NO CUMPLE":
+                    not_articulated += 1
+    return _table(
+        [
+            [_header("PASOS EVALUADOS", True), _header("SIN ARTICULAR", True)],
+            [
+                _cell(evaluated, CENTER_CELL_STYLE),
+                _cell(not_articulated, CENTER_CELL_STYLE),
+            ],
+        ],
+        _widths(0.5, 0.5),
+        [("BACKGROUND", (0, 0), (-1, 0), HEADER_COLOR)],
+    )
+
+
+def _totals_table(compliance_counts: dict, percentage) -> Table:
+    counts = [compliance_counts.get(compliance_id, 0) for compliance_id in (1, 2, 3, 4)]
+    return _table(
+        [
+            [
+                _header(label, True)
+                for label in (
+                    "TOTAL ITEMS",
+                    "CUMPLE",
+                    "NO CUMPLE",
+                    "CUMPLE PARCIALMENTE",
+                    "NO APLICA",
+                    "PORCENTAJE CUMPLIMIENTO",
+                )
+            ],
+            [_cell(value, CENTER_CELL_STYLE) for value in [sum(counts), *counts]]
+            + [_cell(f"{percentage}%", CENTER_CELL_STYLE)],
+        ],
+        _widths(*([1 / 6] * 6)),
+        [("BACKGROUND", (0, 0), (-1, 0), HEADER_COLOR)],
+    )
+
+
+def _cycle_header(cycle: str, columns: int) -> tuple:
+    """Fila con el nombre del ciclo y los comandos para pintarla."""
+    return (
+        [_header(CYCLE_NAMES.get(cycle.upper(), "OTROS"), True)] + [""] * (columns - 1),
+        CYCLE_COLORS.get(cycle.upper(), HEADER_COLOR),
+    )
+
+
+def _recommendations_table(recommendations: list) -> Table:
+    rows = [[_header("CICLO PESV", True)]]
+    commands = [("BACKGROUND", (0, 0), (-1, 0), HEADER_COLOR)]
+    for item in recommendations:
+        row, color = _cycle_header(item["cycle"], 1)
+        commands.append(("BACKGROUND", (0, len(rows)), (0, len(rows)), color))
+        rows.append(row)
+        bullets = []
+        for recommendation in item["recomendations"]:
+            bullets.append(ListItem(_cell(recommendation["recomendacion"])))
+            if recommendation["observation"]:
+                bullets.append(ListItem(_cell(recommendation["observation"])))
+        rows.append([ListFlowable(bullets, bulletType="bullet", leftIndent=12)])
+    return _table(rows, _widths(1), commands)
+
+
+def _page_footer(canvas, doc):
+    canvas.saveState()
+    canvas.setFont("Helvetica", 7)
+    canvas.drawRightString(
+        letter[0] - 0.75 * inch, 0.5 * inch, f"Página {doc.page}"
+    )
+    canvas.restoreState()
+
+
+def _build(flowables: list, title: str) -> bytes:
+    buffer = BytesIO()
+    document = SimpleDocTemplate(
+        buffer,
+        pagesize=letter,
+        leftMargin=0.75 * inch,
+        rightMargin=0.75 * inch,
+        topMargin=0.75 * inch,
+        bottomMargin=0.75 * inch,
+        title=title,
+    )
+    document.build(flowables, onFirstPage=_page_footer, onLaterPages=_page_footer)
+    return buffer.getvalue()
+
+
+def render_report_pdf(report: dict) -> bytes:
+    """
+    Informe de diagnostico en PDF dibujado directamente con reportlab.
+
+    Usa los mismos datos que llenan la plantilla DOCX, pero no pasa por
+    python-docx ni por LibreOffice.
+
+    :param report: Datos del informe; ver GenerateReport._report_pdf_data.
+    """
+    story = [
+        Paragraph("DIAGNÓSTICO PLAN ESTRATÉGICO DE SEGURIDAD VIAL", TITLE_STYLE),
+        _info_table(
+            [
+                ("Empresa", report["company_name"]),
+                ("Nit", report["nit"]),
+                ("Fecha de elaboración", report["month_year"]),
+                ("Consultor", report["consultor_name"]),
+                ("Licencia SST", report["sst_license"]),
+                ("Modalidad", report["mode"]),
+                ("Cronograma", report["schedule"]),
+                ("Secuencia", report["sequence"]),
+            ]
+        ),
+        Paragraph("CARACTERIZACIÓN", HEADING_STYLE),
+    ]
+    for company in report["companies"]:
+        story += _company_table(company, report["date"])
+        story.append(Spacer(1, 12))
+
+    story.append(Paragraph("RESULTADOS POR CICLO", HEADING_STYLE))
+    for cycle in ("P", "H", "V", "A"):
+        for cycle_data in report["datas_by_cycle"]:
+            if cycle_data["cycle"] == cycle:
+                story += [_results_table(cycle_data), Spacer(1, 8)]
+
+    story += [
+        Paragraph("CONCLUSIONES", HEADING_STYLE),
+        _conclusion_table(report["datas_by_cycle"], report["level"]),
+        Spacer(1, 8),
+        _articulated_table(report["datas_by_cycle"]),
+        Spacer(1, 8),
+        _totals_table(report["compliance_counts"], report["percentage"]),
+        Spacer(1, 8),
+        Paragraph(
+            f"Nivel de cumplimiento: <b>{escape(report['compliance_level'])}</b>",
+            BODY_STYLE,
+        ),
+    ]
+    if report.get("bar_chart"):
+        story.append(_image(report["bar_chart"], PAGE_WIDTH * 0.8))
+    story.append(_image(report["radar_chart"], PAGE_WIDTH * 0.6))
+
+    story += [
+        Paragraph("RECOMENDACIONES", HEADING_STYLE),
+        _recommendations_table(report["recommendations"]),
+    ]
+    return _build(story, "Diagnóstico PESV")
+
+
+def render_work_plan_pdf(work_plan: dict) -> bytes:
+    """
+    Plan de trabajo en PDF dibujado directamente con reportlab.
+
+    :param work_plan: Datos del plan; ver GenerateReport._work_plan_pdf_data.
+    """
+    rows = [[_header("PLAN DE TRABAJO"), _header("HORAS", True), ""]]
+    commands = [("BACKGROUND", (0, 0), (-1, 0), HEADER_COLOR)]
+    for cycle, recommendations in work_plan["observations"].items():
+        row, color = _cycle_header(cycle, 3)
+        commands += [
+            ("SPAN", (0, len(rows)), (-1, len(rows))),
+            ("BACKGROUND", (0, len(rows)), (-1, len(rows)), color),
+        ]
+        rows.append(row)
+        for recommendation in recommendations:
+            rows.append([_cell(recommendation["recommendation_name"]), "", ""])
+    commands.append(("BACKGROUND", (0, len(rows)), (-1, len(rows)), HEADER_COLOR))
+    rows.append([_header("TOTAL HORAS", True), "", ""])
+
+    story = [
+        Paragraph("PLAN DE TRABAJO PLAN ESTRATÉGICO DE SEGURIDAD VIAL", TITLE_STYLE),
+        _info_table(
+            [
+                ("Empresa", work_plan["company_name"]),
+                ("Nit", work_plan["nit"]),
+                ("Fecha de elaboración", work_plan["month_year"]),
+                ("Consultor", work_plan["consultor_name"]),
+                ("Licencia SST", work_plan["sst_license"]),
+                ("Nivel PESV", work_plan["level"]),
+            ]
+        ),
+        Spacer(1, 12),
+        _table(rows, _widths(0.76, 0.12, 0.12), commands),
+    ]
+    return _build(story, "Plan de trabajo PESV")
@@ -0,0 +1,88 @@
+from .models import Diagnosis
+from .scoring import ScoringEngine
+from .services import compliance_level_for
+
+
+def portfolio_diagnoses(
+    diagnosis_ids=None,
+    arl_id=None,
+    segment_id=None,
+    mission_id=None,
+    date_from=None,
+    date_to=None,
+):
+    """
+    Diagnosticos de la cartera: los ids recibidos y/o los que cumplen los
+    filtros de la empresa (ARL, segmento, misionalidad) y de fecha de
+    elaboracion. Los filtros se combinan entre si.
+    """
+    queryset = Diagnosis.objects.all()
+    if diagnosis_ids:
+        queryset = queryset.filter(id__in=diagnosis_ids)
+    if arl_id:
+        queryset = queryset.filter(company__arl_id=arl_id)
+    if segment_id:
+        queryset = queryset.filter(company__segment_id=segment_id)
+    if mission_id:
+        queryset = queryset.filter(company__mission_id=mission_id)
+    if date_from:
+        queryset = queryset.filter(date_elabored__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date_elabored__lte=date_to)
+    return queryset.order_by("id")
+
+
+def score_portfolio(diagnoses) -> list:
+    """
+    Puntajes de varios diagnosticos leidos en bloque del resumen por paso;
+    con una cartera grande el ScoringEngine los calcula con pandas.
+
+    Son los mismos del ScoringEngine por diagnostico: el porcentaje general
+    usa el valor obtenido guardado y los de ciclo y paso aplican
+    `is_articuled`; el de cada ciclo es el promedio de sus pasos.
+
+    :param diagnoses: queryset de Diagnosis (ver portfolio_diagnoses).
+    :return: un dict por diagnostico, en el orden del queryset.
+    """
+    diagnoses = list(
+        diagnoses.values(
+            "id", "company_id", "company__name", "date_elabored", "is_finalized"
+        )
+    )
+    summaries = ScoringEngine().summaries(diagnosis["id"] for diagnosis in diagnoses)
+
+    result = []
+    for diagnosis in diagnoses:
+        scores = summaries[diagnosis["id"]]
+        result.append(
+            {
+                "diagnosis": diagnosis["id"],
+                "company": diagnosis["company_id"],
+                "company_name": diagnosis["company__name"],
+                "date_elabored": diagnosis["date_elabored"],
+                "is_finalized": diagnosis["is_finalized"],
+                "percentage": scores["percentage"],
+                "compliance_level": compliance_level_for(scores["percentage"]),
+                "compliance_counts": [
+                    {"compliance_id": compliance_id, "count": count}
+                    for compliance_id, count in sorted(
+                        scores["compliance_counts"].items()
+                    )
+                ],
+                "cycles": [
+                    {
+                        "cycle": cycle["cycle"],
+                        "cycle_percentage": round(cycle["cycle_percentage"], 2),
+                        "steps": [
+                            {
+                                "step": step["step"],
+                                "percentage": round(step["percentage"], 2),
+                            }
+                            for step in cycle["steps"]
+                        ],
+                    }
+                    for cycle in scores["cycles"]
+                ],
+            }
+        )
+    return result
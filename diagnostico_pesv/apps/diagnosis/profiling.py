@@ -0,0 +1,81 @@
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class ReportProfiler:
+    """
+    Tiempos y consultas SQL por etapa de la generacion de un informe.
+
+    Las etapas se marcan con lap(nombre): cada marca cierra la etapa que
+    empezo en la marca anterior, asi no hace falta envolver bloques de codigo.
+    Deshabilitado, track y lap no hacen nada.
+
+    :param enabled: Si es False no se mide nada.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.spans = []
+        self.queries = 0
+        self._started = None
+        self._last = None
+        self._last_queries = 0
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def _tracking(self, label: str):
+        self._started = self._last = time.perf_counter()
+        self._last_queries = self.queries
+        try:
+            with connection.execute_wrapper(self._count_query):
+                yield self
+        finally:
+            self.lap("otros")
+            logger.info("Perfil de %s: %s", label, self.summary())
+
+    def track(self, label: str):
+        """Activa la medicion durante el bloque y registra el resultado en el log."""
+        if not self.enabled:
+            return nullcontext(self)
+        return self._tracking(label)
+
+    def lap(self, name: str):
+        if not self.enabled or self._last is None:
+            return
+        now = time.perf_counter()
+        self.spans.append(
+            {
+                "name": name,
+                "ms": round((now - self._last) * 1000, 1),
+                "queries": self.queries - self._last_queries,
+            }
+        )
+        self._last = now
+        self._last_queries = self.queries
+
+    @property
+    def total_ms(self) -> float:
+        return round(sum(span["ms"] for span in self.spans), 1)
+
+    def summary(self) -> str:
+        stages = ", ".join(
+            f"{span['name']}={span['ms']}ms/{span['queries']}q" for span in self.spans
+        )
+        return f"{self.total_ms}ms, {self.queries} consultas ({stages})"
+
+    def server_timing(self) -> str:
+        """Valor para la cabecera Server-Timing."""
+        return ", ".join(
+            f'{span["name"]};dur={span["ms"]};desc="{span["queries"]} consultas"'
+            for span in self.spans
+        )
+
+    def as_dict(self) -> dict:
+        return {"total_ms": self.total_ms, "queries": self.queries, "spans": self.spans}
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from apps.diagnosis_requirement.core.models import (
+    Diagnosis_Requirement,
+    WorkPlan_Recomendation,
+)
+
+WORK_PLAN_RECOMMENDATIONS_CACHE_KEY = "diagnosis:work_plan_recommendations"
+
+
+def _build_work_plan_recommendation_map() -> dict:
+    requirements = {}
+    for requirement_id, cycle, step, name in Diagnosis_Requirement.objects.values_list(
+        "id", "cycle", "step", "name"
+    ):
+        requirements[requirement_id] = {
+            "cycle": cycle,
+            "step": step,
+            "name": name,
+            "recommendations": [],
+        }
+    for requirement_id, name in (
+        WorkPlan_Recomendation.objects.filter(requirement__isnull=False)
+        .order_by("id")
+        .values_list("requirement_id", "name")
+    ):
+        requirement = requirements.get(requirement_id)
+        # Un mismo texto repetido en el requisito se muestra una sola vez
+        if requirement is not None and name not in requirement["recommendations"]:
+            requirement["recommendations"].append(name)
+    return {
+        requirement_id: requirement
+        for requirement_id, requirement in requirements.items()
+        if requirement["recommendations"]
+    }
+
+
+def _catalog_version() -> str:
+    """
+    Version de los catalogos segun la base de datos: cambia al crear, editar o
+    borrar un requisito o una recomendacion, en cualquier proceso.
+    """
+    parts = []
+    for model in (Diagnosis_Requirement, WorkPlan_Recomendation):
+        stamp = model.objects.aggregate(last=Max("updated_at"), total=Count("id"))
+        last = stamp["last"].isoformat() if stamp["last"] else ""
+        parts.extend([last, str(stamp["total"])])
+    return ":".join(parts)
+
+
+def work_plan_recommendation_map() -> dict:
+    """
+    Recomendaciones del plan de trabajo por requisito, desde la cache.
+
+    La llave incluye la version de los catalogos, asi ningun proceso sirve un
+    mapa anterior a la ultima edicion.
+
+    :return: {requirement_id: {"cycle", "step", "name", "recommendations"}}
+        solo con los requisitos que tienen recomendaciones.
+    """
+    return cache.get_or_set(
+        f"{WORK_PLAN_RECOMMENDATIONS_CACHE_KEY}:{_catalog_version()}",
+        _build_work_plan_recommendation_map,
+        settings.WORK_PLAN_RECOMMENDATIONS_CACHE_TIMEOUT,
+    )
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import tempfile
+from datetime import date
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max
+from apps.company.models import Company, CompanySize
+from apps.corporate_group.models import Corporate
+from apps.diagnosis_counter.models import Diagnosis_Counter, Fleet, Driver
+from apps.diagnosis_requirement.core.models import (
+    Diagnosis_Requirement,
+    Recomendation,
+    WorkPlan_Recomendation,
+)
+from apps.sign.models import User
+from .models import (
+    CheckList,
+    Checklist_Requirement,
+    Compliance,
+    Diagnosis,
+    Diagnosis_Questions,
+    DriverQuestion,
+    VehicleQuestions,
+)
+from .report_templates import template_registry
+
+# Catalogos que alimentan los informes; se resumen por cantidad y ultima edicion
+CATALOG_MODELS = (
+    Compliance,
+    Diagnosis_Requirement,
+    Diagnosis_Questions,
+    Recomendation,
+    WorkPlan_Recomendation,
+    VehicleQuestions,
+    DriverQuestion,
+)
+
+
+def _rows(queryset, *fields):
+    return list(queryset.order_by("pk").values_list(*fields))
+
+
+def build_report_cache_key(
+    kind: str,
+    diagnosis: Diagnosis,
+    company: Company | None,
+    schedule: str | None,
+    sequence: str | None,
+    format_to_save: str,
+    template_path: str,
+    pdf_renderer: str | None = None,
+) -> str:
+    """
+    Hash de todo lo que alimenta el documento generado.
+
+    Incluye la fecha del dia porque el informe imprime la fecha y el mes de
+    elaboracion.
+
+    :param pdf_renderer: Generador del PDF; None para los DOCX.
+    """
+    counters = Diagnosis_Counter.objects.filter(diagnosis=diagnosis.id)
+    company_ids = set(counters.values_list("company_id", flat=True))
+    if company is not None:
+        company_ids.add(company.id)
+
+    state = {
+        "kind": kind,
+        "format": format_to_save,
+        "schedule": schedule,
+        "sequence": sequence,
+        "template": template_registry.checksum(template_path),
+        "bar_chart": settings.REPORT_BAR_CHART,
+        "pdf_renderer": pdf_renderer,
+        "today": date.today(),
+        "diagnosis": _rows(Diagnosis.objects.filter(pk=diagnosis.id)),
+        "checklists": _rows(CheckList.objects.filter(diagnosis=diagnosis.id)),
+        "requirements": _rows(
+            Checklist_Requirement.objects.filter(diagnosis=diagnosis.id)
+        ),
+        "counters": _rows(counters),
+        "fleets": _rows(Fleet.objects.filter(diagnosis_counter__in=counters)),
+        "drivers": _rows(Driver.objects.filter(diagnosis_counter__in=counters)),
+        "companies": _rows(Company.objects.filter(pk__in=company_ids)),
+        "company_labels": _rows(
+            Company.objects.filter(pk__in=company_ids),
+            "id",
+            "segment__name",
+            "mission__name",
+        ),
+        "ciius": _rows(
+            Company.ciius.through.objects.filter(company_id__in=company_ids),
+            "company_id",
+            "ciiu__code",
+            "ciiu__name",
+        ),
+        "corporate": _rows(Corporate.objects.filter(pk=diagnosis.corporate_group_id)),
+        "consultor": _rows(
+            User.objects.filter(pk=diagnosis.consultor_id),
+            "first_name",
+            "last_name",
+            "licensia_sst",
+        ),
+        "type": _rows(CompanySize.objects.filter(pk=diagnosis.type_id)),
+        "catalogs": [
+            model.objects.aggregate(count=Count("id"), updated=Max("updated_at"))
+            for model in CATALOG_MODELS
+        ],
+    }
+    payload = json.dumps(state, cls=DjangoJSONEncoder, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ReportCache:
+    """
+    Cache en disco de informes generados, direccionada por contenido.
+
+    Los archivos se nombran con la llave; cada lectura actualiza su mtime y al
+    superar max_bytes se eliminan primero los menos usados.
+
+    :param root: Directorio donde se guardan los archivos.
+    :param max_bytes: Tamaño maximo del directorio; 0 desactiva la cache.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def path_for(self, key: str, extension: str) -> str:
+        return os.path.join(self.root, f"{key}.{extension}")
+
+    def get(self, key: str, extension: str) -> bytes | None:
+        if not self.enabled:
+            return None
+        path = self.path_for(key, extension)
+        try:
+            with open(path, "rb") as cached_file:
+                content = cached_file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return content
+
+    def open(self, key: str, extension: str):
+        """Abre el archivo en cache para enviarlo sin cargarlo en memoria."""
+        if not self.enabled:
+            return None
+        path = self.path_for(key, extension)
+        try:
+            cached_file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return cached_file
+
+    def put(self, key: str, extension: str, content: bytes):
+        if not self.enabled:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        # Escritura atomica para que un lector nunca vea un archivo a medias
+        fd, temp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(content)
+            os.replace(temp_path, self.path_for(key, extension))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.root):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def get_report_cache() -> ReportCache:
+    return ReportCache(settings.REPORT_CACHE_ROOT, settings.REPORT_CACHE_MAX_BYTES)
@@ -0,0 +1,193 @@
+import logging
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils.text import slugify
+from .converters import ConversionSlots
+from .models import Diagnosis
+from .services import GenerateReport, REPORT_KIND_DIAGNOSIS, report_extension
+from .tasks import REPORT_FILENAMES
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("docx", "word", "pdf")
+
+_export_slots = None
+
+
+def get_export_slots() -> ConversionSlots:
+    """Cupos de exportacion compartidos por todos los procesos del servidor."""
+    global _export_slots
+    if _export_slots is None:
+        _export_slots = ConversionSlots(
+            settings.REPORT_EXPORT_CONCURRENCY, settings.REPORT_EXPORT_LOCK_DIR
+        )
+    return _export_slots
+
+
+def diagnoses_for_export(diagnosis_ids=None, corporate_group_id=None):
+    """
+    Diagnosticos a exportar: la lista recibida o todos los del grupo empresarial
+    (el diagnostico corporativo y los de cada empresa del grupo).
+    """
+    queryset = Diagnosis.objects.select_related("company", "corporate_group")
+    if corporate_group_id:
+        queryset = queryset.filter(
+            Q(corporate_group_id=corporate_group_id)
+            | Q(company__corporates__id=corporate_group_id)
+        )
+    else:
+        queryset = queryset.filter(id__in=diagnosis_ids or [])
+    return list(queryset.distinct().order_by("id"))
+
+
+def _init_export_worker():
+    # Con spawn (Windows) el proceso hijo arranca sin Django configurado
+    import django
+
+    django.setup()
+
+
+def _generate_export_entry(
+    kind: str,
+    company_id: int,
+    diagnosis_id: int,
+    format_to_save: str,
+    schedule: str | None,
+    sequence: str | None,
+    pdf_renderer: str | None = None,
+) -> bytes:
+    generate_report = GenerateReport.from_ids(
+        company_id,
+        diagnosis_id,
+        schedule=schedule,
+        sequence=sequence,
+        pdf_renderer=pdf_renderer,
+    )
+    return generate_report.report_content(kind, format_to_save)
+
+
+def _entry_name(kind: str, diagnosis: Diagnosis, extension: str) -> str:
+    if diagnosis.is_for_corporate_group and diagnosis.corporate_group:
+        owner = diagnosis.corporate_group.name
+    elif diagnosis.company:
+        owner = diagnosis.company.name
+    else:
+        owner = ""
+    name = "_".join(
+        part for part in (REPORT_FILENAMES[kind], slugify(owner or "")) if part
+    )
+    return f"{diagnosis.id}_{name}.{extension}"
+
+
+class _ZipStream:
+    """Destino de escritura del zip que entrega los bytes a medida que llegan."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_reports_zip(
+    diagnoses,
+    format_to_save: str,
+    kind: str = REPORT_KIND_DIAGNOSIS,
+    workers: int | None = None,
+    pdf_renderer: str | None = None,
+):
+    """
+    Genera los informes en procesos paralelos y produce el zip por partes.
+
+    Cada entrada se escribe en cuanto su proceso termina, asi la descarga
+    avanza mientras se generan las demas. Los informes que fallan se listan en
+    errores.txt al final del archivo.
+
+    La exportacion ocupa uno de los REPORT_EXPORT_CONCURRENCY cupos mientras
+    dura. El primer valor producido es vacio y se entrega apenas se obtiene el
+    cupo: quien llama lo consume antes de responder, y si no hay cupo recibe
+    ConversionTimeout.
+
+    :param diagnoses: Diagnosticos a exportar.
+    :param workers: Procesos simultaneos; por defecto REPORT_EXPORT_WORKERS.
+    :param pdf_renderer: Generador de los PDF; por defecto REPORT_PDF_RENDERER.
+    """
+    workers = max(workers or settings.REPORT_EXPORT_WORKERS, 1)
+    extension = report_extension(format_to_save)
+    stream = _ZipStream()
+    errors = []
+
+    with get_export_slots().acquire(settings.REPORT_EXPORT_WAIT_TIMEOUT):
+        yield b""
+        # Los procesos hijos no deben heredar las conexiones abiertas del padre
+        connections.close_all()
+        executor = ProcessPoolExecutor(workers, initializer=_init_export_worker)
+        try:
+            with zipfile.ZipFile(stream, "w", zipfile.ZIP_STORED) as archive:
+                pending_diagnoses = iter(diagnoses)
+                running = {}
+
+                def submit_next():
+                    diagnosis = next(pending_diagnoses, None)
+                    if diagnosis is None:
+                        return False
+                    company_id = (
+                        0 if diagnosis.is_for_corporate_group else diagnosis.company_id
+                    )
+                    future = executor.submit(
+                        _generate_export_entry,
+                        kind,
+                        company_id or 0,
+                        diagnosis.id,
+                        format_to_save,
+                        diagnosis.schedule,
+                        diagnosis.sequence,
+                        pdf_renderer,
+                    )
+                    running[future] = diagnosis
+                    return True
+
+                # Se mantienen a lo sumo dos informes por proceso en vuelo para no
+                # acumular archivos terminados en memoria
+                for _ in range(workers * 2):
+                    if not submit_next():
+                        break
+
+                while running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        diagnosis = running.pop(future)
+                        try:
+                            file_content = future.result()
+                        except Exception as ex:
+                            logger.exception(
+                                "No se pudo exportar el diagnostico %s", diagnosis.id
+                            )
+                            errors.append(f"{diagnosis.id}: {ex}")
+                        else:
+                            entry = zipfile.ZipInfo(
+                                _entry_name(kind, diagnosis, extension),
+                                time.localtime()[:6],
+                            )
+                            archive.writestr(entry, file_content)
+                            yield stream.drain()
+                        submit_next()
+
+                if errors:
+                    archive.writestr("errores.txt", "\n".join(errors))
+            yield stream.drain()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import threading
+from copy import deepcopy
+from io import BytesIO
+from docx import Document
+from docx.opc.part import XmlPart
+from .helper import PlaceholderIndex
+
+# Atributos de un Part que se copian tal cual; el resto (rels, caches de
+# lazyproperty, proxys como SettingsPart._settings) se reconstruye en la copia
+PART_SHARED_ATTRIBUTES = ("_partname", "_content_type", "_blob", "_image")
+
+
+def clone_document(template):
+    """
+    Copia un documento ya parseado sin volver a leer el zip.
+
+    Los elementos XML de cada parte se copian en profundidad; los blobs
+    binarios (imagenes, fuentes) son inmutables y se comparten con la plantilla.
+    """
+    package = template.part.package
+    new_package = type(package)()
+    cloned_parts = {}
+
+    def clone_part(part):
+        new_part = cloned_parts.get(part)
+        if new_part is None:
+            new_part = object.__new__(type(part))
+            for attribute in PART_SHARED_ATTRIBUTES:
+                if attribute in part.__dict__:
+                    new_part.__dict__[attribute] = part.__dict__[attribute]
+            new_part._package = new_package
+            if isinstance(part, XmlPart):
+                new_part._element = deepcopy(part._element)
+            cloned_parts[part] = new_part
+            pending.append((part, new_part))
+        return new_part
+
+    pending = [(package, new_package)]
+    while pending:
+        source, new_source = pending.pop()
+        for rel in source.rels.values():
+            target = rel._target if rel.is_external else clone_part(rel.target_part)
+            new_source.rels.add_relationship(
+                rel.reltype, target, rel.rId, rel.is_external
+            )
+
+    new_package.after_unmarshal()
+    return new_package.main_document_part.document
+
+
+class _Template:
+    def __init__(self, path: str):
+        self.path = path
+        self.signature = None
+        self.checksum = None
+        # (documento parseado, indice de placeholders); se reemplaza de una vez
+        self.parsed = None
+
+    def refresh(self):
+        """Vuelve a parsear la plantilla si su contenido cambio en disco."""
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self.signature:
+            return
+        with open(self.path, "rb") as template_file:
+            content = template_file.read()
+        checksum = hashlib.sha256(content).hexdigest()
+        if checksum != self.checksum:
+            document = Document(BytesIO(content))
+            self.parsed = (document, PlaceholderIndex(document))
+            self.checksum = checksum
+        self.signature = signature
+
+
+class TemplateRegistry:
+    """
+    Plantillas DOCX parseadas una vez por proceso.
+
+    Cada llamada a get entrega una copia independiente del documento, con el
+    indice de placeholders ya enlazado; la plantilla se recarga cuando cambia
+    el checksum del archivo.
+    """
+
+    def __init__(self):
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def _template(self, template_path: str) -> _Template:
+        with self._lock:
+            template = self._templates.get(template_path)
+            if template is None:
+                template = _Template(template_path)
+                self._templates[template_path] = template
+            template.refresh()
+            return template
+
+    def get(self, template_path: str):
+        document, placeholders = self._template(template_path).parsed
+        return placeholders.bind(clone_document(document))
+
+    def checksum(self, template_path: str) -> str:
+        return self._template(template_path).checksum
+
+
+template_registry = TemplateRegistry()
@@ -1,5 +1,6 @@
 from apps.diagnosis.models import (
     Diagnosis,
+    DiagnosisStepScore,
     CheckList,
     Checklist_Requirement,
     Diagnosis_Questions,
@@ -7,10 +8,25 @@ from apps.diagnosis.models import (
     Diagnosis_Questions,
 )
 from apps.diagnosis_requirement.core.models import Diagnosis_Requirement
+from django.db import connection, transaction
+from django.db.models import (
+    Case,
+    Count,
+    FloatField,
+    Max,
+    Min,
+    Q,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from apps.diagnosis.interfaces import (
     DiagnosisRepositoryInterface,
     CheckListRepositoryInterface,
     CheckListRequirementRepositoryInterface,
+    DiagnosisStepScoreRepositoryInterface,
     IComplianceRepository,
     IDiagnosisQuestionRepository,
 )
@@ -58,11 +74,68 @@ class DiagnosisRepository(DiagnosisRepositoryInterface):
 
 
 class CheckListRepository(CheckListRepositoryInterface):
-    def get_checklists_by_company(self, company_id: int):
-        return CheckList.objects.filter(company_id=company_id).select_related(
-            "question__requirement"
+    def get_score_rows(self, diagnosis_id: int):
+        return (
+            CheckList.objects.filter(diagnosis=diagnosis_id)
+            .order_by("id")
+            .values(
+                "question__name",
+                "question__variable_value",
+                "question__requirement__name",
+                "question__requirement__cycle",
+                "question__requirement__step",
+                "compliance_id",
+                "compliance__name",
+                "obtained_value",
+                "is_articuled",
+            )
+        )
+
+    def get_step_totals(self, diagnosis_ids, count_fields: dict):
+        # Una fila por diagnostico y paso, sumada en la base de datos; las
+        # preguntas sin articular cuentan con su valor completo
+        articulated_value = Case(
+            When(is_articuled=True, then=Coalesce("obtained_value", Value(0.0))),
+            default=Coalesce("question__variable_value", Value(0)),
+            output_field=FloatField(),
+        )
+        compliance_counts = {
+            field: Count("id", filter=Q(compliance_id=compliance_id))
+            for compliance_id, field in count_fields.items()
+        }
+        return (
+            CheckList.objects.filter(diagnosis__in=diagnosis_ids)
+            .values(
+                "diagnosis_id",
+                "question__requirement__cycle",
+                "question__requirement__step",
+            )
+            .annotate(
+                total_variable_value=Coalesce(
+                    Sum("question__variable_value"), Value(0)
+                ),
+                total_obtained_value=Coalesce(Sum("obtained_value"), Value(0.0)),
+                total_articulated_value=Coalesce(Sum(articulated_value), Value(0.0)),
+                first_id=Min("id"),
+                **compliance_counts,
+            )
+            .order_by("diagnosis_id", "first_id")
         )
 
+    def get_score_stamp(self, diagnosis_id: int) -> dict:
+        stamp = CheckList.objects.filter(diagnosis=diagnosis_id).aggregate(
+            last_checklist=Max("updated_at"),
+            last_question=Max("question__updated_at"),
+            last_requirement=Max("question__requirement__updated_at"),
+            total=Count("id"),
+        )
+        # El resumen se reescribe despues de la transaccion que cambia un
+        # catalogo; su fecha distingue el estado anterior y el posterior
+        stamp["last_summary"] = DiagnosisStepScore.objects.filter(
+            diagnosis=diagnosis_id
+        ).aggregate(last=Max("updated_at"))["last"]
+        return stamp
+
     def get_checklists_by_question_id_and_diagnosis_id(
         self, question_id: int, diagnosis_id: int
     ):
@@ -74,6 +147,10 @@ class CheckListRepository(CheckListRepositoryInterface):
         return CheckList.objects.bulk_create(data_to_save)
 
     def massive_update(self, data_to_save):
+        # bulk_update no llena auto_now; updated_at marca la cache de puntajes
+        now = timezone.now()
+        for checklist in data_to_save:
+            checklist.updated_at = now
         return CheckList.objects.bulk_update(
             data_to_save,
             [
@@ -82,6 +159,29 @@ class CheckListRepository(CheckListRepositoryInterface):
                 "is_articuled",
                 "obtained_value",
                 "verify_document",
+                "updated_at",
+            ],
+        )
+
+
+    def massive_upsert(self, data_to_save):
+        # Inserta las respuestas nuevas y actualiza las existentes (restaurando
+        # las eliminadas) en una sola sentencia, segun (diagnosis, question)
+        unique_fields = None
+        if connection.features.supports_update_conflicts_with_target:
+            unique_fields = ["diagnosis", "question"]
+        return CheckList.objects.bulk_create(
+            data_to_save,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=[
+                "observation",
+                "compliance",
+                "is_articuled",
+                "obtained_value",
+                "verify_document",
+                "updated_at",
+                "deleted_at",
             ],
         )
 
@@ -124,6 +224,11 @@ class CheckListRequirementRepository(CheckListRequirementRepositoryInterface):
             pk=id, diagnosis=diagnosis_id
         ).first()
 
+    def get_checklists_requirement_by_ids_and_diagnosis_id(self, ids, diagnosis_id):
+        return Checklist_Requirement.objects.filter(diagnosis=diagnosis_id).in_bulk(
+            ids
+        )
+
     def get_checklist_requirement_by_diagnosis_id(self, diagnosis_id):
         return Checklist_Requirement.objects.filter(diagnosis=diagnosis_id).first()
 
@@ -147,3 +252,31 @@ class CheckListRequirementRepository(CheckListRequirementRepositoryInterface):
 class ComplianceRepository(IComplianceRepository):
     def get_compliance_by_id(self, id) -> Compliance:
         return Compliance.objects.get(pk=id)
+
+
+class DiagnosisStepScoreRepository(DiagnosisStepScoreRepositoryInterface):
+    def get_by_diagnosis_ids(self, diagnosis_ids):
+        return DiagnosisStepScore.objects.filter(
+            diagnosis__in=diagnosis_ids
+        ).order_by("diagnosis_id", "id")
+
+    def get_columns(self, diagnosis_ids, fields):
+        return (
+            DiagnosisStepScore.objects.filter(diagnosis__in=diagnosis_ids)
+            .order_by("diagnosis_id", "id")
+            .values_list(*fields)
+        )
+
+    def lock_diagnoses(self, diagnosis_ids):
+        # Siempre en el mismo orden para no provocar bloqueos cruzados
+        return list(
+            Diagnosis.objects_with_deleted.select_for_update()
+            .filter(pk__in=diagnosis_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+    @transaction.atomic
+    def replace(self, diagnosis_ids, step_scores):
+        DiagnosisStepScore.objects.filter(diagnosis__in=diagnosis_ids).delete()
+        return DiagnosisStepScore.objects.bulk_create(step_scores)
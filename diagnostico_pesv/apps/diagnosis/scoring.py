@@ -0,0 +1,467 @@
+import itertools
+import threading
+from collections import Counter
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from utils.constants import ComplianceIds
+from .interfaces import (
+    CheckListRepositoryInterface,
+    DiagnosisStepScoreRepositoryInterface,
+)
+from .models import DiagnosisStepScore
+from .repositories import CheckListRepository, DiagnosisStepScoreRepository
+
+SCORES_CACHE_PREFIX = "diagnosis:scores"
+
+# Diagnosticos por consulta al recalcular el resumen de puntajes
+REFRESH_BATCH_SIZE = 500
+
+# Columna de DiagnosisStepScore con la cantidad de cada cumplimiento
+COMPLIANCE_COUNT_FIELDS = {
+    ComplianceIds.CUMPLE.value: "count_cumple",
+    ComplianceIds.NO_CUMPLE.value: "count_no_cumple",
+    ComplianceIds.CUMPLE_PARCIALMENTE.value: "count_cumple_parcialmente",
+    ComplianceIds.NO_APLICA.value: "count_no_aplica",
+}
+
+# Desde esta cantidad de diagnosticos, summaries calcula en bloque con pandas
+VECTORIZED_MIN_DIAGNOSES = 50
+
+# Columnas del resumen por paso que lee el calculo en bloque
+STEP_SCORE_COLUMNS = [
+    "diagnosis_id",
+    "cycle",
+    "step",
+    "variable_value",
+    "obtained_value",
+    "articulated_value",
+    *COMPLIANCE_COUNT_FIELDS.values(),
+]
+
+# Orden de los recalculos programados y hechos (ver refresh_on_commit)
+_refresh_sequence = itertools.count()
+_refresh_local = threading.local()
+
+
+def _last_refreshes() -> dict:
+    """{diagnosis_id: secuencia del ultimo recalculo} en el hilo actual."""
+    if not hasattr(_refresh_local, "refreshed"):
+        _refresh_local.refreshed = {}
+    return _refresh_local.refreshed
+
+
+def _articulated_value(row: dict) -> float:
+    # Ajustar el valor obtenido basado en `is_articuled`
+    if row["is_articuled"]:
+        return row["obtained_value"] or 0
+    return row["question__variable_value"] or 0  # Considerar 100%
+
+
+def _add_row(steps: dict, row: dict) -> dict:
+    """Suma una respuesta (fila de CheckList) al total de su paso."""
+    key = (row["question__requirement__cycle"], row["question__requirement__step"])
+    step = steps.get(key)
+    if step is None:
+        step = steps[key] = {
+            "cycle": key[0],
+            "step": key[1],
+            "variable_value": 0,
+            "obtained_value": 0,
+            "articulated_value": 0,
+            "compliance_counts": Counter(),
+            "requirements": {},
+        }
+    step["variable_value"] += row["question__variable_value"] or 0
+    step["obtained_value"] += row["obtained_value"] or 0
+    step["articulated_value"] += _articulated_value(row)
+    if row["compliance_id"] is not None:
+        step["compliance_counts"][row["compliance_id"]] += 1
+    return step
+
+
+def _step_from_summary(step_score: DiagnosisStepScore) -> dict:
+    return {
+        "cycle": step_score.cycle,
+        "step": step_score.step,
+        "variable_value": step_score.variable_value,
+        "obtained_value": step_score.obtained_value,
+        "articulated_value": step_score.articulated_value,
+        "compliance_counts": Counter(
+            {
+                compliance_id: getattr(step_score, field)
+                for compliance_id, field in COMPLIANCE_COUNT_FIELDS.items()
+            }
+        ),
+    }
+
+
+def _scores(steps) -> dict:
+    """
+    Puntajes a partir de los totales por paso.
+
+    El porcentaje de un paso usa el valor articulado, el de un ciclo es el
+    promedio de sus pasos y el general usa el valor obtenido guardado.
+    """
+    cycles = {}
+    total_variable_value = 0
+    total_obtained_value = 0
+    compliance_counts = Counter()
+    for step in steps:
+        percentage = 0.0
+        if step["variable_value"] > 0:
+            percentage = (step["articulated_value"] / step["variable_value"]) * 100
+        step_data = {"step": step["step"]}
+        if "requirements" in step:
+            step_data["requirements"] = list(step["requirements"].values())
+        step_data["percentage"] = percentage
+        cycles.setdefault(
+            step["cycle"],
+            {"cycle": step["cycle"], "steps": [], "cycle_percentage": 0.0},
+        )["steps"].append(step_data)
+        total_variable_value += step["variable_value"]
+        total_obtained_value += step["obtained_value"]
+        compliance_counts.update(step["compliance_counts"])
+
+    for cycle_data in cycles.values():
+        cycle_data["cycle_percentage"] = sum(
+            step_data["percentage"] for step_data in cycle_data["steps"]
+        ) / len(cycle_data["steps"])
+
+    percentage = 0.0
+    if total_variable_value:
+        percentage = round((total_obtained_value / total_variable_value) * 100, 2)
+    return {
+        "cycles": list(cycles.values()),
+        "percentage": percentage,
+        "compliance_counts": {
+            compliance_id: count
+            for compliance_id, count in compliance_counts.items()
+            if count
+        },
+    }
+
+
+def _percentages(values: pd.Series, totals: pd.Series) -> np.ndarray:
+    """values / totals * 100, con 0 donde el total es 0."""
+    return (
+        np.divide(
+            values.to_numpy(dtype=float),
+            totals.to_numpy(dtype=float),
+            out=np.zeros(len(totals)),
+            where=totals.to_numpy() > 0,
+        )
+        * 100
+    )
+
+
+def _clean(value):
+    # Los grupos de pandas traen NaN y tipos de numpy; la API espera Python
+    if pd.isna(value):
+        return None
+    if isinstance(value, (np.integer, np.floating)):
+        return value.item()
+    return value
+
+
+def _vectorized_scores(rows, diagnosis_ids) -> dict:
+    """
+    Lo mismo que _scores para muchos diagnosticos, con group-bys de pandas
+    sobre las columnas planas del resumen por paso.
+
+    :param rows: Tuplas con STEP_SCORE_COLUMNS, ordenadas por diagnostico.
+    """
+    frame = pd.DataFrame.from_records(list(rows), columns=STEP_SCORE_COLUMNS)
+    # Un paso nulo convertiria toda la columna a float
+    frame["step"] = frame["step"].astype("Int64")
+    frame["percentage"] = _percentages(
+        frame["articulated_value"], frame["variable_value"]
+    )
+    cycles = frame.groupby(["diagnosis_id", "cycle"], sort=False, dropna=False)[
+        "percentage"
+    ].mean()
+    count_fields = list(COMPLIANCE_COUNT_FIELDS.values())
+    totals = frame.groupby("diagnosis_id", sort=False)[
+        ["variable_value", "obtained_value", *count_fields]
+    ].sum()
+    totals["percentage"] = _percentages(
+        totals["obtained_value"], totals["variable_value"]
+    ).round(2)
+
+    steps_by_cycle = {}
+    for diagnosis_id, cycle, step, percentage in frame[
+        ["diagnosis_id", "cycle", "step", "percentage"]
+    ].itertuples(index=False):
+        steps_by_cycle.setdefault((diagnosis_id, _clean(cycle)), []).append(
+            {"step": _clean(step), "percentage": float(percentage)}
+        )
+    scores = {
+        diagnosis_id: {"cycles": [], "percentage": 0.0, "compliance_counts": {}}
+        for diagnosis_id in diagnosis_ids
+    }
+    for (diagnosis_id, cycle), percentage in cycles.items():
+        cycle = _clean(cycle)
+        scores[diagnosis_id]["cycles"].append(
+            {
+                "cycle": cycle,
+                "steps": steps_by_cycle[(diagnosis_id, cycle)],
+                "cycle_percentage": float(percentage),
+            }
+        )
+    for diagnosis_id, total in totals.iterrows():
+        scores[diagnosis_id]["percentage"] = float(total["percentage"])
+        scores[diagnosis_id]["compliance_counts"] = {
+            compliance_id: int(total[field])
+            for compliance_id, field in COMPLIANCE_COUNT_FIELDS.items()
+            if total[field]
+        }
+    return scores
+
+
+class ScoringEngine:
+    """
+    Unico calculo de los puntajes de los diagnosticos.
+
+    Los totales por paso se guardan en DiagnosisStepScore: refresh los
+    recalcula con una consulta agregada sobre los CheckList y se llama en cada
+    escritura (ver apps.diagnosis.signals). El radar, el porcentaje general y
+    el conteo por cumplimiento se leen de ese resumen sin escribir nada; las
+    tablas por requisito recorren los CheckList aplicando la misma regla de
+    `is_articuled`, asi ambos caminos dan los mismos porcentajes.
+
+    Cada instancia memoriza lo que ya leyo, asi un informe o una peticion no
+    vuelve a puntuar el mismo diagnostico. Las tablas se comparten entre
+    peticiones por la cache de Django, con una llave que cambia cuando se
+    modifica alguna respuesta, pregunta, requisito o el resumen.
+    """
+
+    def __init__(
+        self,
+        repository: CheckListRepositoryInterface | None = None,
+        step_score_repository: DiagnosisStepScoreRepositoryInterface | None = None,
+    ):
+        self.repository = repository or CheckListRepository()
+        self.step_score_repository = (
+            step_score_repository or DiagnosisStepScoreRepository()
+        )
+        self._scores = {}
+        self._summaries = {}
+        self._versions = {}
+
+    def scores(self, diagnosis_id: int) -> dict:
+        """
+        Puntajes con el detalle por requisito y pregunta.
+
+        :return: {"cycles": [...], "percentage": float,
+            "compliance_counts": {compliance_id: cantidad}}
+        """
+        diagnosis_id = int(diagnosis_id)
+        if diagnosis_id not in self._scores:
+            self._scores[diagnosis_id] = cache.get_or_set(
+                self._cache_key(diagnosis_id),
+                lambda: self._calculate(diagnosis_id),
+                settings.DIAGNOSIS_SCORES_CACHE_TIMEOUT,
+            )
+        return self._scores[diagnosis_id]
+
+    def summaries(self, diagnosis_ids) -> dict:
+        """
+        Puntajes de varios diagnosticos leidos del resumen en una consulta.
+
+        Desde VECTORIZED_MIN_DIAGNOSES diagnosticos (una cartera, ver
+        apps.diagnosis.portfolio) el calculo se hace en bloque con pandas en
+        lugar de recorrer los pasos; ambos caminos dan los mismos puntajes.
+
+        :return: {diagnosis_id: {"cycles", "percentage", "compliance_counts"}};
+            los pasos no traen requisitos.
+        """
+        diagnosis_ids = [int(diagnosis_id) for diagnosis_id in diagnosis_ids]
+        missing = [
+            diagnosis_id
+            for diagnosis_id in diagnosis_ids
+            if diagnosis_id not in self._summaries
+        ]
+        if len(missing) >= VECTORIZED_MIN_DIAGNOSES:
+            self._summaries.update(
+                _vectorized_scores(
+                    self.step_score_repository.get_columns(
+                        missing, STEP_SCORE_COLUMNS
+                    ),
+                    missing,
+                )
+            )
+        elif missing:
+            steps_by_diagnosis = {diagnosis_id: [] for diagnosis_id in missing}
+            for step_score in self.step_score_repository.get_by_diagnosis_ids(
+                missing
+            ):
+                steps_by_diagnosis[step_score.diagnosis_id].append(
+                    _step_from_summary(step_score)
+                )
+            for diagnosis_id, steps in steps_by_diagnosis.items():
+                self._summaries[diagnosis_id] = _scores(steps)
+        return {
+            diagnosis_id: self._summaries[diagnosis_id]
+            for diagnosis_id in diagnosis_ids
+        }
+
+    def cycles(self, diagnosis_id: int) -> list:
+        """Porcentajes por ciclo, paso y requisito, con sus preguntas."""
+        return self.scores(diagnosis_id)["cycles"]
+
+    def cycle_percentages(self, diagnosis_id: int) -> list:
+        """[{"cycle", "cycle_percentage"}] desde el resumen."""
+        return [
+            {"cycle": data["cycle"], "cycle_percentage": data["cycle_percentage"]}
+            for data in self._summary(diagnosis_id)["cycles"]
+        ]
+
+    def percentage(self, diagnosis_id: int) -> float:
+        """Porcentaje general con el valor obtenido guardado, redondeado a 2."""
+        return self._summary(diagnosis_id)["percentage"]
+
+    def compliance_counts(self, diagnosis_id: int) -> dict:
+        """{compliance_id: cantidad} sin los cumplimientos en cero."""
+        return self._summary(diagnosis_id)["compliance_counts"]
+
+    def summary(self, diagnosis_id: int) -> dict:
+        """Porcentaje general, conteo por cumplimiento y radar, como en la API."""
+        return {
+            "general": self.percentage(diagnosis_id),
+            "counts": [
+                {"compliance_id": compliance_id, "count": count}
+                for compliance_id, count in sorted(
+                    self.compliance_counts(diagnosis_id).items()
+                )
+            ],
+            "radar": [
+                {
+                    "cycle": data["cycle"],
+                    "cycle_percentage": round(data["cycle_percentage"], 2),
+                }
+                for data in self.cycle_percentages(diagnosis_id)
+            ],
+        }
+
+    def version(self, diagnosis_id: int) -> str:
+        """Marca que cambia con cualquier escritura que afecte los puntajes."""
+        diagnosis_id = int(diagnosis_id)
+        if diagnosis_id not in self._versions:
+            stamp = self.repository.get_score_stamp(diagnosis_id)
+            self._versions[diagnosis_id] = ":".join(
+                value.isoformat() if hasattr(value, "isoformat") else str(value)
+                for value in (
+                    stamp["last_checklist"],
+                    stamp["last_question"],
+                    stamp["last_requirement"],
+                    stamp["last_summary"],
+                    stamp["total"],
+                )
+            )
+        return self._versions[diagnosis_id]
+
+    def refresh(self, diagnosis_ids) -> None:
+        """
+        Recalcula el resumen por paso de los diagnosticos desde sus CheckList.
+
+        Las sumas por paso y los conteos por cumplimiento salen de una sola
+        consulta agregada por lote; un diagnostico sin respuestas queda sin
+        pasos y con porcentaje 0.
+
+        Bloquea los diagnosticos mientras tanto para que dos recalculos
+        simultaneos no se crucen; dentro de una transaccion que escribe
+        respuestas, el resumen queda confirmado junto con ellas.
+        """
+        diagnosis_ids = sorted({int(diagnosis_id) for diagnosis_id in diagnosis_ids})
+        for start in range(0, len(diagnosis_ids), REFRESH_BATCH_SIZE):
+            batch = diagnosis_ids[start : start + REFRESH_BATCH_SIZE]
+            with transaction.atomic():
+                self.step_score_repository.lock_diagnoses(batch)
+                step_totals = self.repository.get_step_totals(
+                    batch, COMPLIANCE_COUNT_FIELDS
+                )
+                self.step_score_repository.replace(
+                    batch,
+                    [
+                        DiagnosisStepScore(
+                            diagnosis_id=row["diagnosis_id"],
+                            cycle=row["question__requirement__cycle"],
+                            step=row["question__requirement__step"],
+                            variable_value=row["total_variable_value"],
+                            obtained_value=row["total_obtained_value"],
+                            articulated_value=row["total_articulated_value"],
+                            **{
+                                field: row[field]
+                                for field in COMPLIANCE_COUNT_FIELDS.values()
+                            },
+                        )
+                        for row in step_totals
+                    ],
+                )
+
+        sequence = next(_refresh_sequence)
+        last_refreshes = _last_refreshes()
+        for diagnosis_id in diagnosis_ids:
+            last_refreshes[diagnosis_id] = sequence
+            self._scores.pop(diagnosis_id, None)
+            self._summaries.pop(diagnosis_id, None)
+            self._versions.pop(diagnosis_id, None)
+
+    def refresh_on_commit(self, diagnosis_ids) -> None:
+        """
+        Programa refresh para cuando se confirme la transaccion actual (de
+        inmediato si no hay una).
+
+        Varias escrituras del mismo diagnostico en una transaccion, como las
+        senales de cada CheckList, producen un solo recalculo: al confirmar se
+        omiten los diagnosticos recalculados despues de programarse.
+        """
+        diagnosis_ids = {int(diagnosis_id) for diagnosis_id in diagnosis_ids}
+        if not diagnosis_ids:
+            return
+        scheduled_at = next(_refresh_sequence)
+
+        def refresh():
+            last_refreshes = _last_refreshes()
+            pending = [
+                diagnosis_id
+                for diagnosis_id in diagnosis_ids
+                if last_refreshes.get(diagnosis_id, -1) < scheduled_at
+            ]
+            if pending:
+                self.refresh(pending)
+
+        transaction.on_commit(refresh, robust=True)
+
+    def _summary(self, diagnosis_id: int) -> dict:
+        return self.summaries([diagnosis_id])[int(diagnosis_id)]
+
+    def _cache_key(self, diagnosis_id: int) -> str:
+        return ":".join(
+            [SCORES_CACHE_PREFIX, str(diagnosis_id), self.version(diagnosis_id)]
+        )
+
+    def _calculate(self, diagnosis_id: int) -> dict:
+        steps = {}
+        for row in self.repository.get_score_rows(diagnosis_id):
+            step = _add_row(steps, row)
+            requirement_name = row["question__requirement__name"]
+            requirement = step["requirements"].setdefault(
+                requirement_name,
+                {
+                    "requirement_name": requirement_name,
+                    "questions": [],
+                    "percentage": 0.0,
+                },
+            )
+            requirement["questions"].append(
+                {
+                    "question_name": row["question__name"],
+                    "variable_value": row["question__variable_value"] or 0,
+                    "obtained_value": _articulated_value(row),
+                    "compliance": (row["compliance__name"] or "").upper(),
+                }
+            )
+        return _scores(steps.values())
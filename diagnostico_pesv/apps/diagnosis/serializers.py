@@ -122,7 +122,9 @@ class DiagnosisSerializer(serializers.ModelSerializer):
             "is_for_corporate_group",
             "corporate_group",
             "company_detail",
+            "data_version",
         ]
+        read_only_fields = ["data_version"]
         extra_kwargs = {
             "date_elabored": {"allow_null": True, "required": False},
             "type": {"allow_null": True, "required": False},
@@ -206,3 +208,21 @@ class NotificationSerializer(serializers.ModelSerializer):
             "created_at",
             "read",
         ]
+
+
+class ReportDeliverySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReportDelivery
+        fields = [
+            "id",
+            "diagnosis",
+            "company",
+            "email_to",
+            "status",
+            "attempts",
+            "error",
+            "task_id",
+            "sent_at",
+            "created_at",
+            "updated_at",
+        ]
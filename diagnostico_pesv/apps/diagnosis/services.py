@@ -10,17 +10,57 @@ from apps.diagnosis_counter.serializers import FleetSerializer, DriverSerializer
 from django.db import transaction
 from django.conf import settings
 import os
-from docx import Document
 from apps.sign.models import User
 from utils.constants import ComplianceIds
 from utils.functionUtils import blank_to_null
 from .helper import *
-from django.db.models import Prefetch, OuterRef, Subquery, Q, Sum, Count
+from django.db.models import Prefetch, Q, Sum, F
 from apps.diagnosis_requirement.core.models import (
     Recomendation,
 )
+from collections import OrderedDict
+from .report_cache import build_report_cache_key, get_report_cache
+from .report_templates import template_registry
+from .profiling import ReportProfiler
+from .recommendation_map import work_plan_recommendation_map
+from .scoring import ScoringEngine
+from .repositories import CheckListRepository, CheckListRequirementRepository
+from .pdf_renderer import (
+    PDF_RENDERER_REPORTLAB,
+    PDF_RENDERERS,
+    render_report_pdf,
+    render_work_plan_pdf,
+)
 import platform
 
+REPORT_KIND_DIAGNOSIS = "diagnosis"
+REPORT_KIND_WORK_PLAN = "work_plan"
+
+REPORT_TEMPLATES = {
+    REPORT_KIND_DIAGNOSIS: "templates/DIAGNÓSTICO_BOLIVAR.docx",
+    REPORT_KIND_WORK_PLAN: "templates/PLAN_DE_TRABAJO_BOLIVAR.docx",
+}
+
+REPORT_CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+
+def report_extension(format_to_save: str) -> str:
+    return "pdf" if format_to_save == "pdf" else "docx"
+
+
+def compliance_level_for(percentage) -> str:
+    compliance_level = "NINGUNO"
+    if percentage < 50:
+        compliance_level = "BAJO"
+    elif percentage >= 50 and percentage < 80:
+        compliance_level = "MEDIO"
+    elif percentage > 80:
+        compliance_level = "ALTO"
+    return compliance_level
+
 
 class DiagnosisService:
     diagnosis_model = Diagnosis
@@ -28,120 +68,100 @@ class DiagnosisService:
     date_elabored = None
 
     @staticmethod
-    def calculate_total_variable_value(checklists):
-        total = 0
-        for checklist in checklists:
-            total += checklist.question.variable_value
-        return total
+    def bump_data_version(diagnosis: Diagnosis) -> int:
+        """
+        Marca que cambiaron las respuestas del diagnostico.
 
-    @staticmethod
-    def calculate_total_obtained_value(checklists):
-        total = 0
-        for checklist in checklists:
-            total += checklist.obtained_value
-        return total
+        El incremento se hace en la base de datos y se copia a la instancia,
+        asi un diagnosis.save() posterior no lo pisa.
+        """
+        Diagnosis.objects.filter(pk=diagnosis.pk).update(
+            data_version=F("data_version") + 1
+        )
+        diagnosis.refresh_from_db(fields=["data_version"])
+        return diagnosis.data_version
 
     @staticmethod
-    def calculate_completion_percentage_data(diagnosis_id):
-        service_instance = DiagnosisService()
-        # Obtén los CheckList relacionados con el diagnostico
-        checklists_questions = CheckList.objects.filter(diagnosis=diagnosis_id)
+    def save_answers(
+        diagnosis: Diagnosis, answers: list, requirement_answers: list = ()
+    ) -> int:
+        """
+        Guarda respuestas del cuestionario con pocas consultas: carga preguntas,
+        cumplimientos y requisitos con `in` y escribe cada tabla en bloque.
+
+        Debe llamarse dentro de una transaccion. Recalcula el resumen de
+        puntajes y aumenta la version de datos del diagnostico.
 
-        total_value_variable = service_instance.calculate_total_variable_value(
-            checklists_questions
+        :param answers: [{"question", "compliance", "obtained_value",
+            "is_articuled", "observation", "verify_document"}]
+        :param requirement_answers: [{"requirement", "compliance",
+            "observation"}]; "requirement" es el id del Checklist_Requirement.
+        :return: cantidad de respuestas guardadas.
+        """
+        questions = Diagnosis_Questions.objects.in_bulk(
+            {int(answer["question"]) for answer in answers}
         )
-        total_obtained_value = service_instance.calculate_total_obtained_value(
-            checklists_questions
+        compliances = Compliance.objects.in_bulk(
+            {int(answer["compliance"]) for answer in answers}
+            | {int(answer["compliance"]) for answer in requirement_answers}
         )
 
-        percentage = round((total_obtained_value / total_value_variable) * 100, 2)
-        return percentage
+        def get_compliance(compliance_id):
+            compliance = compliances.get(int(compliance_id))
+            if compliance is None:
+                raise Compliance.DoesNotExist(
+                    f"Cumplimiento no encontrado: {compliance_id}"
+                )
+            return compliance
+
+        checklists_to_save = []
+        for answer in answers:
+            question = questions.get(int(answer["question"]))
+            if question is None:
+                raise Diagnosis_Questions.DoesNotExist(
+                    f"Pregunta no encontrada: {answer['question']}"
+                )
+            observation = blank_to_null(answer.get("observation"))
+            if observation is None:
+                observation = "SIN OBSERVACIONES"
+            checklists_to_save.append(
+                CheckList(
+                    compliance=get_compliance(answer["compliance"]),
+                    observation=observation,
+                    obtained_value=answer["obtained_value"],
+                    is_articuled=answer["is_articuled"],
+                    verify_document=blank_to_null(answer.get("verify_document")),
+                    diagnosis=diagnosis,
+                    question=question,
+                )
+            )
 
-    @staticmethod
-    def calculate_completion_percentage(diagnosis_id):
-        # Obtén los CheckList relacionados con el diagnostico
-        checklists = CheckList.objects.filter(diagnosis=diagnosis_id).select_related(
-            "question__requirement"
+        # Solo se actualizan los requisitos que ya tiene el diagnostico
+        checklist_requirement_repository = CheckListRequirementRepository()
+        existing_checklist_requirements = checklist_requirement_repository.get_checklists_requirement_by_ids_and_diagnosis_id(
+            [int(answer["requirement"]) for answer in requirement_answers],
+            diagnosis.id,
         )
-
-        # Estructura para el resultado final
-        result = []
-
-        # Agrupar CheckLists por ciclo y paso
-        checklists_by_cycle = {}
-        for checklist in checklists:
-            requirement = checklist.question.requirement
-            step = requirement.step
-            cycle = requirement.cycle
-
-            if cycle not in checklists_by_cycle:
-                checklists_by_cycle[cycle] = {}
-
-            if step not in checklists_by_cycle[cycle]:
-                checklists_by_cycle[cycle][step] = []
-
-            checklists_by_cycle[cycle][step].append(checklist)
-
-        # Calcular porcentajes y estructurar datos
-        for cycle, steps in checklists_by_cycle.items():
-            cycle_data = {"cycle": cycle, "steps": [], "cycle_percentage": 0.0}
-            total_cycle_percentage = 0.0
-            num_steps = len(steps)
-
-            for step, checklists in steps.items():
-                step_data = {"step": step, "requirements": [], "percentage": 0.0}
-
-                total_variable_value = 0
-                total_obtained_value = 0
-
-                # Agrupar por requerimiento
-                requirements_by_name = {}
-                for checklist in checklists:
-                    requirement = checklist.question.requirement
-                    requirement_name = requirement.name
-                    if requirement_name not in requirements_by_name:
-                        requirements_by_name[requirement_name] = {
-                            "requirement_name": requirement_name,
-                            "questions": [],
-                            "percentage": 0.0,
-                        }
-
-                    # Ajustar el valor obtenido basado en `is_articuled`
-                    if checklist.is_articuled:
-                        obtained_value = checklist.obtained_value
-                    else:
-                        obtained_value = (
-                            checklist.question.variable_value
-                        )  # Considerar 100%
-
-                    requirements_by_name[requirement_name]["questions"].append(
-                        {
-                            "question_name": checklist.question.name,
-                            "variable_value": checklist.question.variable_value,
-                            "obtained_value": obtained_value,
-                            "compliance": checklist.compliance.name.upper(),
-                        }
-                    )
-                    total_variable_value += checklist.question.variable_value
-                    total_obtained_value += obtained_value
-
-                # Calcular porcentaje del paso
-                if total_variable_value > 0:
-                    step_data["percentage"] = (
-                        total_obtained_value / total_variable_value
-                    ) * 100
-
-                # Añadir requerimientos al paso
-                step_data["requirements"] = list(requirements_by_name.values())
-                cycle_data["steps"].append(step_data)
-                total_cycle_percentage += step_data["percentage"]
-
-            if num_steps > 0:
-                cycle_data["cycle_percentage"] = total_cycle_percentage / num_steps
-            # Añadir el ciclo a la lista de resultados
-            result.append(cycle_data)
-
-        return result
+        checklists_to_update = []
+        for answer in requirement_answers:
+            checklist_requirement = existing_checklist_requirements.get(
+                int(answer["requirement"])
+            )
+            if checklist_requirement is None:
+                continue
+            checklist_requirement.observation = answer["observation"]
+            checklist_requirement.compliance = get_compliance(answer["compliance"])
+            checklists_to_update.append(checklist_requirement)
+
+        if checklists_to_update:
+            checklist_requirement_repository.massive_update(checklists_to_update)
+        # Crear o actualizar las preguntas en una sola sentencia
+        if checklists_to_save:
+            CheckListRepository().massive_upsert(checklists_to_save)
+
+        ScoringEngine().refresh([diagnosis.id])
+        DiagnosisService.bump_data_version(diagnosis)
+        return len(checklists_to_save)
 
     @staticmethod
     def group_questions_by_step(
@@ -313,6 +333,7 @@ class DiagnosisService:
 class GenerateReport:
     company = None
     diagnosis = None
+    cache_key = None
     sequence = str
     schedule = str
 
@@ -322,11 +343,17 @@ class GenerateReport:
         diagnosis: Diagnosis | None,
         sequence: str,
         schedule: str,
+        pdf_renderer: str | None = None,
     ) -> None:
         self.company = company
         self.diagnosis = diagnosis
         self.sequence = sequence
         self.schedule = schedule
+        self.pdf_renderer = pdf_renderer or settings.REPORT_PDF_RENDERER
+        if self.pdf_renderer not in PDF_RENDERERS:
+            raise ValueError(f"Generador de PDF no valido: {self.pdf_renderer}")
+        self.profiler = ReportProfiler(enabled=settings.REPORT_PROFILING)
+        self.scoring = ScoringEngine()
         # Solo intenta importar pythoncom si el sistema operativo es Windows
         if platform.system() == "Windows":
             try:
@@ -336,17 +363,308 @@ class GenerateReport:
             except Exception as e:
                 print(f"Error al inicializar COM: {e}")
 
+    @classmethod
+    def from_ids(
+        cls,
+        company_id: int,
+        diagnosis_id: int,
+        schedule: str | None = None,
+        sequence: str | None = None,
+        pdf_renderer: str | None = None,
+    ) -> "GenerateReport":
+        """
+        Construye el generador a partir de los IDs recibidos en la peticion.
+
+        Sigue la misma regla que las vistas: si no se envia diagnostico se usa el
+        diagnostico sin finalizar de la empresa.
+        """
+        company = None
+        if int(company_id or 0) > 0:
+            company = Company.objects.get(pk=company_id)
+        if int(diagnosis_id or 0) > 0:
+            diagnosis = Diagnosis.objects.get(pk=diagnosis_id)
+        else:
+            diagnosis = Diagnosis.objects.filter(
+                company=company, is_finalized=False
+            ).first()
+        return cls(
+            company=company,
+            diagnosis=diagnosis,
+            schedule=schedule,
+            sequence=sequence,
+            pdf_renderer=pdf_renderer,
+        )
+
+    def report_key(self, kind: str, format_to_save: str) -> str:
+        """
+        Llave de cache del informe; sirve tambien como ETag de la descarga.
+        """
+        self.cache_key = build_report_cache_key(
+            kind,
+            self.diagnosis,
+            self.company,
+            self.schedule,
+            self.sequence,
+            report_extension(format_to_save),
+            os.path.join(settings.MEDIA_ROOT, REPORT_TEMPLATES[kind]),
+            # El generador solo cambia el archivo cuando se pide PDF
+            self.pdf_renderer if format_to_save == "pdf" else None,
+        )
+        return self.cache_key
+
+    def build(self, kind: str, format_to_save: str) -> bytes:
+        """Construye el informe sin consultar ni llenar la cache."""
+        if format_to_save == "pdf" and self.pdf_renderer == PDF_RENDERER_REPORTLAB:
+            if kind == REPORT_KIND_WORK_PLAN:
+                return self._render_work_plan_pdf()
+            return self._render_report_pdf()
+        build = (
+            self._build_work_plan
+            if kind == REPORT_KIND_WORK_PLAN
+            else self._build_report
+        )
+        template_path = os.path.join(settings.MEDIA_ROOT, REPORT_TEMPLATES[kind])
+        return build(template_path, format_to_save)
+
+    def _build_and_cache(self, kind: str, format_to_save: str, cache_key: str):
+        file_content = self.build(kind, format_to_save)
+        get_report_cache().put(
+            cache_key, report_extension(format_to_save), file_content
+        )
+        self.profiler.lap("escritura_cache")
+        return file_content
+
+    def report_content(self, kind: str, format_to_save: str) -> bytes:
+        """Bytes del informe, desde la cache de artefactos o recien construido."""
+        with self.profiler.track(kind):
+            cache_key = self.report_key(kind, format_to_save)
+            self.profiler.lap("llave_cache")
+            file_content = get_report_cache().get(
+                cache_key, report_extension(format_to_save)
+            )
+            self.profiler.lap("lectura_cache")
+            if file_content is None:
+                file_content = self._build_and_cache(kind, format_to_save, cache_key)
+        return file_content
+
+    def _from_cache(self, kind: str, format_to_save: str):
+        """
+        Devuelve el informe desde la cache de artefactos o lo construye.
+
+        :return: Tupla (archivo en base64, bytes del archivo).
+        """
+        file_content = self.report_content(kind, format_to_save)
+        encoded_file = base64.b64encode(file_content).decode("utf-8")
+        return encoded_file, file_content
+
+    def open_report(self, kind: str, format_to_save: str, cache_key: str = None):
+        """
+        Archivo binario abierto con el informe, para enviarlo por streaming.
+
+        Si el informe esta en cache se abre directamente desde disco; si no, se
+        construye y se entrega desde memoria.
+
+        :param cache_key: Llave ya calculada con report_key, para no repetir las
+            consultas.
+        """
+        with self.profiler.track(kind):
+            cache_key = cache_key or self.report_key(kind, format_to_save)
+            self.profiler.lap("llave_cache")
+            cached_file = get_report_cache().open(
+                cache_key, report_extension(format_to_save)
+            )
+            self.profiler.lap("lectura_cache")
+            if cached_file is not None:
+                return cached_file
+            return BytesIO(self._build_and_cache(kind, format_to_save, cache_key))
+
+    def generate_work_plan(self, format_to_save: str):
+        return self._from_cache(REPORT_KIND_WORK_PLAN, format_to_save)
+
     def generate_report(self, format_to_save: str):
+        return self._from_cache(REPORT_KIND_DIAGNOSIS, format_to_save)
+
+    def _header_fields(self) -> dict:
+        """Datos de encabezado comunes al informe y al plan de trabajo."""
+        month, year = get_current_month_and_year()
+        consultor = self.diagnosis.consultor
+        if self.diagnosis.is_for_corporate_group:
+            company_name = self.diagnosis.corporate_group.name.upper()
+            nit = format_nit(self.diagnosis.corporate_group.nit)
+        else:
+            company_name = self.company.name.upper()
+            nit = format_nit(self.company.nit)
+        return {
+            "company_name": company_name,
+            "nit": nit,
+            "month_year": f"{month.upper()} {year}",
+            "consultor_name": f"{consultor.first_name.upper()} {consultor.last_name.upper()}",
+            "sst_license": (
+                consultor.licensia_sst
+                if consultor.licensia_sst is not None
+                else "SIN LICENCIA"
+            ),
+            "level": self.diagnosis.type.name.upper(),
+        }
+
+    def _build_work_plan(self, template_path: str, format_to_save: str) -> bytes:
+        doc = template_registry.get(template_path)
+        self.profiler.lap("plantilla")
+        header = self._header_fields()
+
+        variables_to_change = {
+            "{{COMPANY_NAME}}": header["company_name"],
+            "{{COMPANY_NIT}}": header["nit"],
+            "{{DATE_ELABORED}}": header["month_year"],
+            "{{CONSULTOR_NAME}}": header["consultor_name"],
+            "{{SST_LICENSE}}": header["sst_license"],
+            "{{NIVEL_PESV}}": header["level"],
+            "{{GENERAL_TABLE}}": "",
+        }
+        grouped_observations = self._work_plan_observations()
+        self.profiler.lap("consultas")
+        insert_table_work_plan(doc, "{{GENERAL_TABLE}}", grouped_observations)
+        self.profiler.lap("tablas")
+        replace_placeholders_in_document(doc, variables_to_change)
+        self.profiler.lap("placeholders")
+
+        buffer = BytesIO()
+        doc.save(buffer)
+        buffer.seek(0)
+        word_file_content = buffer.getvalue()
+        self.profiler.lap("guardar_docx")
+        if format_to_save == "pdf":
+            pdf_file_content = convert_docx_to_pdf(word_file_content)
+            self.profiler.lap("pdf")
+            return pdf_file_content
+        return word_file_content
+
+    def _render_work_plan_pdf(self) -> bytes:
+        """Plan de trabajo en PDF con reportlab, sin plantilla ni LibreOffice."""
+        work_plan = self._header_fields()
+        work_plan["observations"] = self._work_plan_observations()
+        self.profiler.lap("consultas")
+        pdf_file_content = render_work_plan_pdf(work_plan)
+        self.profiler.lap("pdf")
+        return pdf_file_content
+
+    def _work_plan_observations(self) -> OrderedDict:
+        """
+        Recomendaciones del plan de trabajo agrupadas por ciclo.
+
+        Solo consulta los requisitos no cumplidos del diagnostico; los nombres
+        de las recomendaciones salen del mapa en cache.
+        """
+        recommendations_by_requirement = work_plan_recommendation_map()
+        requirement_ids = (
+            Checklist_Requirement.objects.filter(
+                diagnosis=self.diagnosis.id,
+                compliance_id=ComplianceIds.NO_CUMPLE.value,
+            )
+            .order_by("id")
+            .values_list("requirement_id", flat=True)
+        )
+
+        # Agrupar las observaciones por ciclo
+        grouped_observations = OrderedDict()
+        for requirement_id in dict.fromkeys(requirement_ids):
+            requirement = recommendations_by_requirement.get(requirement_id)
+            if requirement is None:
+                continue
+            observations = grouped_observations.setdefault(requirement["cycle"], [])
+            for recommendation_name in requirement["recommendations"]:
+                observations.append(
+                    {
+                        "requirement_name": requirement["name"],
+                        "recommendation_name": recommendation_name,
+                    }
+                )
+        return grouped_observations
+
+    def _corporate_company_totals(self, company: Company | None = None) -> list:
+        """
+        Flota y conductores de cada empresa del grupo empresarial.
+
+        Usa una consulta agrupada por empresa y pregunta para cada tabla, en
+        lugar de consultar la flota y los conductores empresa por empresa.
+
+        :param company: Limita el resultado a una sola empresa.
+        """
+        counters = Diagnosis_Counter.objects.filter(diagnosis=self.diagnosis)
+        if company is not None:
+            counters = counters.filter(company=company)
+        counters = (
+            counters.select_related("company__segment", "company__mission", "size")
+            .prefetch_related("company__ciius")
+            .order_by("company_id", "id")
+        )
+        fleet_rows = (
+            Fleet.objects.filter(diagnosis_counter__in=counters)
+            .values("diagnosis_counter__company_id", "vehicle_question_id")
+            .annotate(
+                **{f"sum_{field}": Sum(field) for field in FLEET_QUANTITY_FIELDS}
+            )
+            .order_by()
+        )
+        driver_rows = (
+            Driver.objects.filter(diagnosis_counter__in=counters)
+            .values("diagnosis_counter__company_id", "driver_question_id")
+            .annotate(total_quantity=Sum("quantity"))
+            .order_by()
+        )
+
+        fleet_by_company = defaultdict(dict)
+        for row in fleet_rows:
+            fleet_by_company[row["diagnosis_counter__company_id"]][
+                row["vehicle_question_id"]
+            ] = tuple(row[f"sum_{field}"] or 0 for field in FLEET_QUANTITY_FIELDS)
+        drivers_by_company = defaultdict(dict)
+        for row in driver_rows:
+            drivers_by_company[row["diagnosis_counter__company_id"]][
+                row["driver_question_id"]
+            ] = (row["total_quantity"] or 0)
+
+        company_totals = []
+        processed_companies = set()
+        for counter in counters:
+            company = counter.company
+            if company is None or company.id in processed_companies:
+                continue
+            processed_companies.add(company.id)
+            fleet_by_question = fleet_by_company[company.id]
+            drivers_by_question = drivers_by_company[company.id]
+            totals = [
+                sum(quantities[position] for quantities in fleet_by_question.values())
+                for position in range(len(FLEET_QUANTITY_FIELDS))
+            ]
+            company_totals.append(
+                {
+                    "company": company,
+                    "count_size": counter.size,
+                    "total_owned": totals[0],
+                    "total_third_party": totals[1],
+                    "total_arrended": totals[2],
+                    "total_contractors": totals[3],
+                    "total_intermediation": totals[4],
+                    "total_leasing": totals[5],
+                    "total_renting": totals[6],
+                    "total_general_vehicles": sum(totals),
+                    "total_quantity_driver": sum(drivers_by_question.values()),
+                    "fleet_by_question": fleet_by_question,
+                    "drivers_by_question": drivers_by_question,
+                }
+            )
+        return company_totals
+
+    def _build_report(self, template_path: str, format_to_save: str) -> bytes:
         vehicle_questions = VehicleQuestions.objects.all()
         driver_questions = DriverQuestion.objects.all()
-        template_path = os.path.join(
-            settings.MEDIA_ROOT, "templates/DIAGNÓSTICO_BOLIVAR.docx"
-        )
 
-        doc = Document(template_path)
+        doc = template_registry.get(template_path)
+        self.profiler.lap("plantilla")
         self.diagnosis.sequence = self.sequence
         self.diagnosis.schedule = self.schedule
-        month, year = get_current_month_and_year()
+        header = self._header_fields()
         # Datos de la tabla
         now = datetime.now()
         formatted_date = now.strftime("%d-%m-%Y")
@@ -354,13 +672,9 @@ class GenerateReport:
         variables_to_change = {
             "{{CRONOGRAMA}}": self.diagnosis.schedule,
             "{{SECUENCIA}}": self.diagnosis.sequence,
-            "{{MES_ANNO}}": f"{month.upper()} {year}",
-            "{{CONSULTOR_NOMBRE}}": f"{self.diagnosis.consultor.first_name.upper()} {self.diagnosis.consultor.last_name.upper()}",
-            "{{LICENCIA_SST}}": (
-                self.diagnosis.consultor.licensia_sst
-                if self.diagnosis.consultor.licensia_sst is not None
-                else "SIN LICENCIA"
-            ),
+            "{{MES_ANNO}}": header["month_year"],
+            "{{CONSULTOR_NOMBRE}}": header["consultor_name"],
+            "{{LICENCIA_SST}}": header["sst_license"],
             "{{MODE_PESV}}": self.diagnosis.mode_ejecution,
             "{{TABLA_DIAGNOSTICO}}": "",
             "{{SUMMARY_NOT_IN_CORPORATE_GROUPS}}": "",
@@ -381,108 +695,19 @@ class GenerateReport:
             "{{PERCENTAGE_TOTAL}}": "",
             "{{ARTICULED_TABLE}}": "",
             "{{TOTALS_ARTICULED}}": "",
+            "{{COMPANY_NAME}}": header["company_name"],
+            "{{NIT}}": header["nit"],
         }
 
         if self.diagnosis.is_for_corporate_group:
-            diagnosis_counter = Diagnosis_Counter.objects.filter(
-                diagnosis=self.diagnosis
-            )
-            counter_ids = diagnosis_counter.values_list("id", flat=True)
-            fleet_totals_by_company = (
-                Fleet.objects.filter(diagnosis_counter__in=counter_ids)
-                .select_related("diagnosis_counter__company")
-                .annotate(
-                    total_owned=Sum("quantity_owned"),
-                    total_third_party=Sum("quantity_third_party"),
-                    total_arrended=Sum("quantity_arrended"),
-                    total_contractors=Sum("quantity_contractors"),
-                    total_intermediation=Sum("quantity_intermediation"),
-                    total_leasing=Sum("quantity_leasing"),
-                    total_renting=Sum("quantity_renting"),
-                )
-                .order_by("diagnosis_counter__company")
-            )
-            # Agrupar los datos de Driver por empresa
-            driver_totals_by_company = (
-                Driver.objects.filter(diagnosis_counter__in=counter_ids)
-                .select_related("diagnosis_counter__company")
-                .annotate(total_quantity=Sum("quantity"))
-                .order_by("diagnosis_counter__company")
+            insert_tables_for_companies(
+                doc,
+                "{{TABLA_DIAGNOSTICO}}",
+                self._corporate_company_totals(),
+                fecha,
+                vehicle_questions,
+                driver_questions,
             )
-            processed_companies = set()
-            company_totals = []
-            for fleet_totals in fleet_totals_by_company:
-                company = fleet_totals.diagnosis_counter.company
-                if company in processed_companies:
-                    continue
-                count_size = fleet_totals.diagnosis_counter.size
-                driver_totals = next(
-                    (
-                        d
-                        for d in driver_totals_by_company
-                        if d.diagnosis_counter.company == company
-                    ),
-                    None,
-                )
-
-                # Extraer y manejar casos en los que no haya registros
-                total_owned = fleet_totals.total_owned or 0
-                total_third_party = fleet_totals.total_third_party or 0
-                total_arrended = fleet_totals.total_arrended or 0
-                total_contractors = fleet_totals.total_contractors or 0
-                total_intermediation = fleet_totals.total_intermediation or 0
-                total_leasing = fleet_totals.total_leasing or 0
-                total_renting = fleet_totals.total_renting or 0
-                total_quantity_driver = (
-                    driver_totals.total_quantity if driver_totals else 0
-                )
-
-                # Calcular el total general de vehículos para la empresa
-                total_general_vehicles = (
-                    total_owned
-                    + total_third_party
-                    + total_arrended
-                    + total_contractors
-                    + total_intermediation
-                    + total_leasing
-                    + total_renting
-                )
-
-                # Agregar la información completa de la empresa y los totales a la lista de resultados agrupados
-                company_totals.append(
-                    {
-                        "company": company,  # Aquí accedes a todos los campos de Company
-                        "count_size": count_size,  # Aquí accedes a todos los campos de Company
-                        "total_owned": total_owned,
-                        "total_third_party": total_third_party,
-                        "total_arrended": total_arrended,
-                        "total_contractors": total_contractors,
-                        "total_intermediation": total_intermediation,
-                        "total_leasing": total_leasing,
-                        "total_renting": total_renting,
-                        "total_general_vehicles": total_general_vehicles,
-                        "total_quantity_driver": total_quantity_driver,
-                    }
-                )
-                processed_companies.add(company)
-
-                variables_to_change["{{COMPANY_NAME}}"] = (
-                    self.diagnosis.corporate_group.name.upper()
-                )
-                variables_to_change["{{NIT}}"] = format_nit(
-                    self.diagnosis.corporate_group.nit
-                )
-                insert_tables_for_companies(
-                    doc,
-                    "{{TABLA_DIAGNOSTICO}}",
-                    company_totals,
-                    fecha,
-                    vehicle_questions,
-                    driver_questions,
-                    Fleet=Fleet,
-                    Driver=Driver,
-                    diagnosis=self.diagnosis,
-                )
         else:
             diagnosis_counter = Diagnosis_Counter.objects.filter(
                 diagnosis=self.diagnosis, company=self.company
@@ -529,11 +754,14 @@ class GenerateReport:
                 + total_renting
             )
 
-            nit = format_nit(self.company.nit)
-            summary = f"De acuerdo con la información anterior, se identifica que la empresa se encuentra en misionalidad {self.company.mission.id} | {self.company.mission.name.upper()} y que cuenta con {total_general_vehicles} vehículos propiedad de la empresa y {total_quantity_driver} personas con rol de conductor, por lo tanto, se define que debe diseñar e implementar un plan estratégico de seguridad vial “{self.diagnosis.type.name.upper()}”."
+            nit = header["nit"]
+            summary = company_summary(
+                self.company,
+                total_general_vehicles,
+                total_quantity_driver,
+                header["level"],
+            )
 
-            variables_to_change["{{COMPANY_NAME}}"] = self.company.name.upper()
-            variables_to_change["{{NIT}}"] = nit
             variables_to_change["{{SUMMARY_NOT_IN_CORPORATE_GROUPS}}"] = summary
 
             empresa = self.company.name
@@ -557,13 +785,10 @@ class GenerateReport:
                 self.company.ciius,
             )
 
-        datas_by_cycle = DiagnosisService.calculate_completion_percentage(
-            self.diagnosis.id
-        )
-
-        data_completion_percentage = (
-            DiagnosisService.calculate_completion_percentage_data(self.diagnosis.id)
-        )
+        self.profiler.lap("tablas_empresas")
+        datas_by_cycle = self.scoring.cycles(self.diagnosis.id)
+        data_completion_percentage = self.scoring.percentage(self.diagnosis.id)
+        self.profiler.lap("calculo_cumplimiento")
         filter_cycles = ["P", "H", "V", "A"]
         placeholders = {
             "P": "{{PLANEAR_TABLE}}",
@@ -577,6 +802,7 @@ class GenerateReport:
                 cycle for cycle in datas_by_cycle if cycle["cycle"] == f_cycle
             ]
             insert_table_results(doc, placeholders[f_cycle], filtered_data)
+        self.profiler.lap("tablas_resultados")
 
         insert_table_conclusion(
             doc,
@@ -590,42 +816,154 @@ class GenerateReport:
         insert_table_conclusion_percentage_articuled(
             doc, "{{TOTALS_ARTICULED}}", datas_by_cycle
         )
-        compliance_counts = Compliance.objects.annotate(
-            count=Subquery(
-                CheckList.objects.filter(
-                    diagnosis=self.diagnosis.id, compliance_id=OuterRef("pk")
-                )
-                .values("compliance_id")
-                .annotate(count=Count("id"))
-                .values("count")
-            )
-        ).order_by(
-            "id"
-        )  # Ordena por compliance_id
-
         insert_table_conclusion_percentage(
             doc,
             "{{TOTALS_TABLE}}",
-            compliance_counts,
+            self._compliance_counts(),
             data_completion_percentage,
         )
 
-        compliance_level = "NINGUNO"
-        if data_completion_percentage < 50:
-            compliance_level = "BAJO"
-        elif data_completion_percentage >= 50 and data_completion_percentage < 80:
-            compliance_level = "MEDIO"
-        elif data_completion_percentage > 80:
-            compliance_level = "ALTO"
-
-        variables_to_change["{{COMPLIANCE_LEVEL}}"] = compliance_level
-        # insert_image_after_placeholder(
-        #     doc, "{{GRAPHIC_BAR}}", create_bar_chart(datas_by_cycle)
-        # )
+        variables_to_change["{{COMPLIANCE_LEVEL}}"] = compliance_level_for(
+            data_completion_percentage
+        )
+        self.profiler.lap("tablas_conclusiones")
+        # Grafica de barras opcional: imagen PNG o grafico nativo de Word
+        if settings.REPORT_BAR_CHART == "native":
+            insert_bar_chart_after_placeholder(doc, "{{GRAPHIC_BAR}}", datas_by_cycle)
+        elif settings.REPORT_BAR_CHART == "png":
+            insert_image_after_placeholder(
+                doc, "{{GRAPHIC_BAR}}", create_bar_chart(datas_by_cycle)
+            )
         insert_image_after_placeholder(
             doc, "{{GRAPHIC_RADAR }}", create_radar_chart(datas_by_cycle)
         )
+        self.profiler.lap("graficas")
+
+        resultado_final = self._report_recommendations()
+        variables_to_change["{{PERCENTAGE_TOTAL}}"] = str(data_completion_percentage)
+        insert_table_recomendations(doc, "{{RECOMENDATIONS}}", resultado_final)
+        self.profiler.lap("recomendaciones")
 
+        replace_placeholders_in_document(doc, variables_to_change)
+        self.profiler.lap("placeholders")
+
+        buffer = BytesIO()
+        doc.save(buffer)
+        buffer.seek(0)
+        word_file_content = buffer.getvalue()
+        self.profiler.lap("guardar_docx")
+        if format_to_save == "pdf":
+            pdf_file_content = convert_docx_to_pdf(word_file_content)
+            self.profiler.lap("pdf")
+            return pdf_file_content
+        return word_file_content
+
+    def _render_report_pdf(self) -> bytes:
+        """Informe de diagnostico en PDF con reportlab, sin plantilla ni LibreOffice."""
+        report = self._report_pdf_data()
+        pdf_file_content = render_report_pdf(report)
+        self.profiler.lap("pdf")
+        return pdf_file_content
+
+    def _report_pdf_data(self) -> dict:
+        """
+        Datos del informe para el generador de PDF directo.
+
+        Son los mismos que llenan las tablas de la plantilla DOCX, ya convertidos
+        a textos y numeros.
+        """
+        report = self._header_fields()
+        report.update(
+            date=datetime.now().strftime("%d-%m-%Y"),
+            mode=self.diagnosis.mode_ejecution,
+            schedule=self.schedule,
+            sequence=self.sequence,
+        )
+        is_corporate = self.diagnosis.is_for_corporate_group
+        vehicle_questions = list(VehicleQuestions.objects.all())
+        driver_questions = list(DriverQuestion.objects.all())
+        empty_fleet = (0,) * len(FLEET_QUANTITY_FIELDS)
+
+        report["companies"] = []
+        for company_data in self._corporate_company_totals(
+            None if is_corporate else self.company
+        ):
+            company = company_data["company"]
+            if is_corporate:
+                size = company_data["count_size"].name.upper()
+                contact = company.dependant
+                total_vehicles = company_data["total_owned"]
+            else:
+                size = report["level"]
+                contact = f"{company.dependant} - {company.dependant_position}".upper()
+                total_vehicles = company_data["total_general_vehicles"]
+            fleet_by_question = company_data["fleet_by_question"]
+            drivers_by_question = company_data["drivers_by_question"]
+            report["companies"].append(
+                {
+                    "name": company.name.upper(),
+                    "nit": format_nit(company.nit),
+                    "activities": [
+                        f"{ciiu.code} - {ciiu.name}" for ciiu in company.ciius.all()
+                    ],
+                    "size": size,
+                    "segment": company.segment.name.upper(),
+                    "contact": contact,
+                    "certification": company.acquired_certification or "",
+                    "vehicles": [
+                        (
+                            question.name,
+                            *fleet_by_question.get(question.id, empty_fleet),
+                        )
+                        for question in vehicle_questions
+                    ],
+                    "drivers": [
+                        (question.name, drivers_by_question.get(question.id, 0))
+                        for question in driver_questions
+                    ],
+                    "summary": company_summary(
+                        company,
+                        total_vehicles,
+                        company_data["total_quantity_driver"],
+                        size,
+                    ),
+                }
+            )
+        self.profiler.lap("tablas_empresas")
+
+        datas_by_cycle = self.scoring.cycles(self.diagnosis.id)
+        percentage = self.scoring.percentage(self.diagnosis.id)
+        report.update(
+            datas_by_cycle=datas_by_cycle,
+            percentage=percentage,
+            compliance_level=compliance_level_for(percentage),
+            compliance_counts={
+                compliance.id: compliance.count or 0
+                for compliance in self._compliance_counts()
+            },
+        )
+        self.profiler.lap("calculo_cumplimiento")
+
+        # El grafico nativo de Word no aplica al PDF directo; se usa la imagen
+        report["bar_chart"] = (
+            create_bar_chart(datas_by_cycle) if settings.REPORT_BAR_CHART else None
+        )
+        report["radar_chart"] = create_radar_chart(datas_by_cycle)
+        self.profiler.lap("graficas")
+
+        report["recommendations"] = self._report_recommendations()
+        self.profiler.lap("recomendaciones")
+        return report
+
+    def _compliance_counts(self) -> list:
+        counts = self.scoring.compliance_counts(self.diagnosis.id)
+        compliances = list(Compliance.objects.order_by("id"))
+        for compliance in compliances:
+            compliance.count = counts.get(compliance.id)
+        return compliances
+
+    def _report_recommendations(self) -> list:
+        """Recomendaciones de los requisitos no cumplidos, agrupadas por ciclo."""
         # Filtrar Checklist_Requirements por diagnosis_id
         checklist_requirements = Checklist_Requirement.objects.filter(
             diagnosis=self.diagnosis.id,
@@ -681,26 +1019,7 @@ class GenerateReport:
                 )
 
         # Convertir los resultados agrupados en una lista final
-        resultado_final = [
+        return [
             {"cycle": cycle, "recomendations": recomendacion}
             for cycle, recomendacion in resultados_por_cycle.items()
         ]
-        variables_to_change["{{PERCENTAGE_TOTAL}}"] = str(data_completion_percentage)
-        insert_table_recomendations(doc, "{{RECOMENDATIONS}}", resultado_final)
-
-        replace_placeholders_in_document(doc, variables_to_change)
-
-        buffer = BytesIO()
-        doc.save(buffer)
-        buffer.seek(0)
-        word_file_content = buffer.getvalue()
-        encoded_file = None
-        if format_to_save == "pdf":
-            pdf_file_content, pdf_byte = convert_docx_to_pdf_base64(word_file_content)
-            encoded_file = pdf_file_content
-            file_content = pdf_byte
-        else:  # Default to Word
-            file_content = word_file_content
-            encoded_file = base64.b64encode(file_content).decode("utf-8")
-
-        return encoded_file, file_content
@@ -0,0 +1,55 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from apps.diagnosis_requirement.core.models import Diagnosis_Requirement
+from .models import CheckList, Diagnosis_Questions
+from .scoring import ScoringEngine
+
+# Campos que alimentan el resumen de puntajes en cada catalogo
+SCORED_FIELDS = {
+    Diagnosis_Questions: ("variable_value", "requirement_id"),
+    Diagnosis_Requirement: ("cycle", "step"),
+}
+
+
+def _scored_diagnoses(sender, pk) -> set:
+    """Diagnosticos con respuestas a la pregunta o al requisito `pk`."""
+    if sender is Diagnosis_Questions:
+        checklists = CheckList.objects.filter(question=pk)
+    else:
+        checklists = CheckList.objects.filter(question__requirement=pk)
+    return set(checklists.values_list("diagnosis_id", flat=True).distinct())
+
+
+@receiver(post_save, sender=CheckList)
+@receiver(post_delete, sender=CheckList)
+def refresh_checklist_step_scores(instance, **kwargs):
+    # Las escrituras en bloque (save_answers) recalculan el resumen por su cuenta
+    if instance.diagnosis_id:
+        ScoringEngine().refresh_on_commit([instance.diagnosis_id])
+
+
+@receiver(pre_save, sender=Diagnosis_Questions)
+@receiver(pre_save, sender=Diagnosis_Requirement)
+def track_scored_fields(sender, instance, **kwargs):
+    fields = SCORED_FIELDS[sender]
+    previous = None
+    if instance.pk is not None:
+        previous = sender._base_manager.filter(pk=instance.pk).values(*fields).first()
+    instance._scores_changed = previous is not None and any(
+        previous[field] != getattr(instance, field) for field in fields
+    )
+
+
+@receiver(post_save, sender=Diagnosis_Questions)
+@receiver(post_save, sender=Diagnosis_Requirement)
+def refresh_catalog_step_scores(sender, instance, **kwargs):
+    if getattr(instance, "_scores_changed", False):
+        ScoringEngine().refresh_on_commit(_scored_diagnoses(sender, instance.pk))
+
+
+@receiver(pre_delete, sender=Diagnosis_Questions)
+@receiver(pre_delete, sender=Diagnosis_Requirement)
+def refresh_deleted_catalog_step_scores(sender, instance, **kwargs):
+    # Al borrar, las llaves de CheckList y preguntas quedan en NULL sin senales;
+    # los diagnosticos se buscan antes y se recalculan al confirmar
+    ScoringEngine().refresh_on_commit(_scored_diagnoses(sender, instance.pk))
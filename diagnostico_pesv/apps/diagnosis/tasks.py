@@ -0,0 +1,161 @@
+import logging
+import os
+import smtplib
+import time
+from celery import shared_task
+from celery.utils.time import get_exponential_backoff_interval
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.utils import timezone
+from .converters import ConversionTimeout
+from .models import ReportDelivery
+from .services import (
+    GenerateReport,
+    REPORT_CONTENT_TYPES,
+    REPORT_KIND_DIAGNOSIS,
+    REPORT_KIND_WORK_PLAN,
+)
+
+logger = logging.getLogger(__name__)
+
+REPORT_FILENAMES = {
+    REPORT_KIND_DIAGNOSIS: "Diagnostico_PESV",
+    REPORT_KIND_WORK_PLAN: "Plan_de_Trabajo_PESV",
+}
+
+# Fallos pasajeros del envio: servidor de correo, red o conversion ocupada.
+# Cualquier otro error (diagnostico inexistente, plantilla rota) no se
+# arregla reintentando.
+REPORT_EMAIL_RETRY_ERRORS = (smtplib.SMTPException, OSError, ConversionTimeout)
+
+
+def get_report_job_path(job_id: str, extension: str) -> str:
+    return os.path.join(settings.REPORT_JOBS_ROOT, f"{job_id}.{extension}")
+
+
+@shared_task(bind=True)
+def generate_report_task(
+    self,
+    kind: str,
+    company_id: int,
+    diagnosis_id: int,
+    format_to_save: str,
+    schedule: str | None = None,
+    sequence: str | None = None,
+    pdf_renderer: str | None = None,
+):
+    """
+    Genera el informe de diagnostico o el plan de trabajo fuera de la peticion HTTP.
+
+    El archivo se guarda en REPORT_JOBS_ROOT con el id del job como nombre y el
+    resultado del task solo lleva los metadatos para descargarlo.
+    """
+    generate_report = GenerateReport.from_ids(
+        company_id,
+        diagnosis_id,
+        schedule=schedule,
+        sequence=sequence,
+        pdf_renderer=pdf_renderer,
+    )
+    if kind == REPORT_KIND_WORK_PLAN:
+        encoded_file, file_content = generate_report.generate_work_plan(
+            format_to_save
+        )
+    else:
+        encoded_file, file_content = generate_report.generate_report(format_to_save)
+
+    extension = "pdf" if format_to_save == "pdf" else "docx"
+    os.makedirs(settings.REPORT_JOBS_ROOT, exist_ok=True)
+    path = get_report_job_path(self.request.id, extension)
+    with open(path, "wb") as report_file:
+        report_file.write(file_content)
+
+    return {
+        "kind": kind,
+        "diagnosis": generate_report.diagnosis.id,
+        "filename": f"{REPORT_FILENAMES.get(kind, 'Informe')}.{extension}",
+        "content_type": REPORT_CONTENT_TYPES[extension],
+        "path": path,
+    }
+
+
+@shared_task(ignore_result=True)
+def purge_report_jobs():
+    """Elimina los archivos de jobs que superan REPORT_JOB_TTL_HOURS."""
+    if not os.path.isdir(settings.REPORT_JOBS_ROOT):
+        return
+    limit = time.time() - settings.REPORT_JOB_TTL_HOURS * 3600
+    for entry in os.scandir(settings.REPORT_JOBS_ROOT):
+        if entry.is_file() and entry.stat().st_mtime < limit:
+            os.remove(entry.path)
+
+
+def _fail_delivery(delivery: ReportDelivery):
+    logger.exception("No se pudo enviar el informe %s", delivery.id)
+    delivery.status = ReportDelivery.STATUS_FAILED
+    delivery.save(update_fields=["status", "error", "updated_at"])
+
+
+@shared_task(bind=True, max_retries=None)
+def send_report_email_task(self, delivery_id: int):
+    """
+    Envia por correo el informe de diagnostico en PDF.
+
+    El PDF sale de la cache de informes, asi un reintento por fallo del
+    servidor de correo no vuelve a generarlo. Solo se reintentan los errores de
+    REPORT_EMAIL_RETRY_ERRORS; los demas marcan el envio como fallido de
+    inmediato. Cada intento queda registrado en el ReportDelivery.
+    """
+    delivery = ReportDelivery.objects.get(pk=delivery_id)
+    if delivery.status == ReportDelivery.STATUS_SENT:
+        return delivery.status
+
+    delivery.status = ReportDelivery.STATUS_SENDING
+    delivery.attempts += 1
+    delivery.save(update_fields=["status", "attempts", "updated_at"])
+    try:
+        generate_report = GenerateReport.from_ids(
+            delivery.company_id or 0,
+            delivery.diagnosis_id,
+            schedule=delivery.schedule,
+            sequence=delivery.sequence,
+        )
+        file_content = generate_report.report_content(REPORT_KIND_DIAGNOSIS, "pdf")
+        email = EmailMessage(
+            subject=delivery.subject,
+            body=delivery.body,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[delivery.email_to],
+        )
+        email.attach(
+            f"{REPORT_FILENAMES[REPORT_KIND_DIAGNOSIS]}.pdf",
+            file_content,
+            REPORT_CONTENT_TYPES["pdf"],
+        )
+        email.send()
+    except REPORT_EMAIL_RETRY_ERRORS as ex:
+        delivery.error = str(ex)
+        if self.request.retries >= settings.REPORT_EMAIL_MAX_RETRIES:
+            _fail_delivery(delivery)
+            raise
+        delivery.status = ReportDelivery.STATUS_RETRYING
+        delivery.save(update_fields=["status", "error", "updated_at"])
+        raise self.retry(
+            exc=ex,
+            countdown=get_exponential_backoff_interval(
+                factor=settings.REPORT_EMAIL_RETRY_BACKOFF,
+                retries=self.request.retries,
+                maximum=settings.REPORT_EMAIL_RETRY_BACKOFF_MAX,
+                full_jitter=True,
+            ),
+        )
+    except Exception as ex:
+        delivery.error = str(ex)
+        _fail_delivery(delivery)
+        raise
+
+    delivery.status = ReportDelivery.STATUS_SENT
+    delivery.error = None
+    delivery.sent_at = timezone.now()
+    delivery.save(update_fields=["status", "error", "sent_at", "updated_at"])
+    return delivery.status
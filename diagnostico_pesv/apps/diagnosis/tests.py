@@ -1,3 +1,1635 @@
-from django.test import TestCase
+import json
+import os
+import smtplib
+import socket
+import sys
+import tempfile
+import time
+import zipfile
+from io import BytesIO, StringIO
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from docx import Document
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from channels.testing import WebsocketCommunicator
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from apps.company.models import Company, CompanySize, Mission, Segments
+from apps.diagnosis_counter.models import Diagnosis_Counter, Driver, Fleet
+from apps.diagnosis_requirement.core.models import (
+    Diagnosis_Requirement,
+    WorkPlan_Recomendation,
+)
+from apps.sign.models import User
+from . import converters, report_export
+from .helper import (
+    PlaceholderIndex,
+    RowPrototype,
+    align_cell_text,
+    create_bar_chart,
+    create_radar_chart,
+    find_placeholder_paragraph,
+    insert_bar_chart_after_placeholder,
+    insert_image_after_placeholder,
+    insert_tables_for_companies,
+    render_radar_chart,
+    replace_placeholders_in_document,
+    set_cell_background_color,
+    set_cell_text_color,
+)
+from .profiling import ReportProfiler
+from .recommendation_map import work_plan_recommendation_map
+from .report_cache import ReportCache
+from .report_templates import TemplateRegistry
+from .models import (
+    CheckList,
+    Compliance,
+    Diagnosis,
+    Checklist_Requirement,
+    Diagnosis_Questions,
+    DiagnosisStepScore,
+    DriverQuestion,
+    ReportDelivery,
+    ReportJob,
+    VehicleQuestions,
+)
+from . import scoring
+from .scoring import ScoringEngine
+from .pdf_renderer import PDF_RENDERER_LIBREOFFICE, PDF_RENDERER_REPORTLAB
+from .services import (
+    DiagnosisService,
+    GenerateReport,
+    REPORT_KIND_DIAGNOSIS,
+    REPORT_KIND_WORK_PLAN,
+)
+from .tasks import generate_report_task, purge_report_jobs, send_report_email_task
 
-# Create your tests here.
+
+def create_diagnosis(username="consultor"):
+    """
+    Diagnostico de una empresa con un paso por ciclo (PHVA) y dos preguntas
+    por paso, todas respondidas como NO CUMPLE.
+    """
+    for pk, name in enumerate(
+        ["CUMPLE", "NO CUMPLE", "CUMPLE PARCIALMENTE", "NO APLICA"], start=1
+    ):
+        Compliance.objects.get_or_create(pk=pk, defaults={"name": name})
+    user = User.objects.create_user(
+        username=username, cedula=username[:10], password="testpassword"
+    )
+    size = CompanySize.objects.create(name="Basico")
+    company = Company.objects.create(
+        name=f"Empresa de {username}",
+        nit=f"{900000000 + user.id}1",
+        segment=Segments.objects.create(name=f"Segmento de {username}"),
+        mission=Mission.objects.create(name="Transporte"),
+        size=size,
+        dependant="Juan Perez",
+        dependant_position="Gerente",
+    )
+    diagnosis = Diagnosis.objects.create(
+        company=company, type=size, date_elabored="2024-10-01", consultor=user
+    )
+    counter = Diagnosis_Counter.objects.create(
+        company=company, diagnosis=diagnosis, size=size
+    )
+    for number in range(2):
+        Fleet.objects.create(
+            diagnosis_counter=counter,
+            vehicle_question=VehicleQuestions.objects.create(
+                name=f"Vehiculo {number + 1} de {username}"
+            ),
+            quantity_owned=number + 1,
+            quantity_renting=number,
+        )
+        Driver.objects.create(
+            diagnosis_counter=counter,
+            driver_question=DriverQuestion.objects.create(
+                name=f"Conductor {number + 1}"
+            ),
+            quantity=number + 2,
+        )
+    questions = []
+    for step, cycle in enumerate("PHVA", start=1):
+        requirement = Diagnosis_Requirement.objects.create(
+            name=f"Paso {step}", step=step, cycle=cycle, basic=True
+        )
+        for number in range(2):
+            questions.append(
+                Diagnosis_Questions.objects.create(
+                    name=f"Pregunta {number + 1} del paso {step}",
+                    requirement=requirement,
+                    variable_value=25,
+                )
+            )
+    for question in questions:
+        CheckList.objects.create(
+            question=question,
+            diagnosis=diagnosis,
+            compliance_id=2,
+            obtained_value=0,
+            is_articuled=True,
+        )
+    ScoringEngine().refresh([diagnosis.id])
+    return diagnosis, questions, user
+
+
+def answer(question, compliance=1, obtained_value=25):
+    return {
+        "question": question.id,
+        "compliance": compliance,
+        "obtained_value": obtained_value,
+        "is_articuled": True,
+    }
+
+
+class ReportJobTests(TestCase):
+    def setUp(self):
+        self.diagnosis, self.questions, self.user = create_diagnosis()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_job_is_recorded_before_the_task_is_queued(self):
+        with mock.patch.object(
+            generate_report_task, "apply_async"
+        ) as apply_async, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/v1/diagnosis/generateReport/"
+                f"?company=0&diagnosis={self.diagnosis.id}&async=true"
+            )
+            apply_async.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = ReportJob.objects.get(job_id=response.data["job"])
+        self.assertEqual(job.requested_by, self.user)
+        self.assertEqual(
+            apply_async.call_args.kwargs["task_id"], response.data["job"]
+        )
+
+    def test_jobs_are_only_visible_to_their_owner(self):
+        ReportJob.objects.create(
+            job_id="job-1",
+            kind="diagnosis",
+            diagnosis=self.diagnosis,
+            requested_by=self.user,
+        )
+        response = self.client.get("/api/v1/diagnosis/report_job/?job=job-1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data["ready"])
+        response = self.client.get(
+            "/api/v1/diagnosis/download_report_job/?job=job-1"
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        other = User.objects.create_user(username="otro", cedula="otro")
+        self.client.force_authenticate(user=other)
+        for endpoint in ("report_job", "download_report_job"):
+            response = self.client.get(f"/api/v1/diagnosis/{endpoint}/?job=job-1")
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get("/api/v1/diagnosis/report_job/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_purge_removes_only_expired_files(self):
+        with tempfile.TemporaryDirectory() as jobs_root, override_settings(
+            REPORT_JOBS_ROOT=jobs_root, REPORT_JOB_TTL_HOURS=1
+        ):
+            expired = os.path.join(jobs_root, "viejo.pdf")
+            recent = os.path.join(jobs_root, "nuevo.pdf")
+            for path in (expired, recent):
+                open(path, "wb").close()
+            two_hours_ago = time.time() - 2 * 3600
+            os.utime(expired, (two_hours_ago, two_hours_ago))
+
+            purge_report_jobs()
+            self.assertFalse(os.path.exists(expired))
+            self.assertTrue(os.path.exists(recent))
+
+
+FAKE_SOFFICE = """
+import socket, sys
+accept = [arg for arg in sys.argv if arg.startswith("--accept=")][0]
+port = int(accept.split("port=")[1].split(";")[0])
+server = socket.socket()
+server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+server.bind(("127.0.0.1", port))
+server.listen()
+while True:
+    server.accept()[0].close()
+"""
+
+FAKE_LIBREOFFICE_CLI = """
+import os, sys, time
+docx_path = [arg for arg in sys.argv if arg.endswith(".docx")][0]
+outdir = sys.argv[sys.argv.index("--outdir") + 1]
+content = open(docx_path, "rb").read()
+time.sleep(0.2)
+open(os.path.join(outdir, "document.pdf"), "wb").write(b"%PDF " + content)
+"""
+
+FAKE_UNO_BRIDGE = """
+import sys, time
+port, docx_path, pdf_path = sys.argv[1:4]
+content = open(docx_path, "rb").read()
+if content == b"lento":
+    time.sleep(30)
+open(pdf_path, "wb").write(b"%PDF " + content)
+"""
+
+
+class ReportDeliveryTests(TestCase):
+    def setUp(self):
+        self.diagnosis, _, self.user = create_diagnosis()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        patcher = mock.patch.object(
+            GenerateReport, "report_content", return_value=b"%PDF-1.4"
+        )
+        self.report_content = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_delivery(self, user=None):
+        return ReportDelivery.objects.create(
+            diagnosis=self.diagnosis,
+            company=self.diagnosis.company,
+            requested_by=user or self.user,
+            email_to="gerencia@example.com",
+            subject="Informe",
+            body="Adjunto",
+        )
+
+    def send(self, delivery, send_effect=None):
+        with mock.patch(
+            "apps.diagnosis.tasks.EmailMessage.send", side_effect=send_effect
+        ) as send:
+            send_report_email_task.apply(args=(delivery.id,))
+        delivery.refresh_from_db()
+        return send
+
+    def test_deliveries_are_only_visible_to_their_owner(self):
+        delivery = self.create_delivery()
+        url = f"/api/v1/diagnosis/report_delivery/?delivery={delivery.id}"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["id"], delivery.id)
+
+        other = User.objects.create_user(
+            username="otro", cedula="otro", password="testpassword"
+        )
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get("/api/v1/diagnosis/report_delivery/?delivery=x")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(REPORT_EMAIL_MAX_RETRIES=3, REPORT_EMAIL_RETRY_BACKOFF=0)
+    def test_transient_errors_are_retried(self):
+        delivery = self.create_delivery()
+        send = self.send(
+            delivery,
+            [smtplib.SMTPServerDisconnected("cerrado"), ConnectionResetError(), 1],
+        )
+        self.assertEqual(send.call_count, 3)
+        self.assertEqual(delivery.status, ReportDelivery.STATUS_SENT)
+        self.assertEqual(delivery.attempts, 3)
+        self.assertIsNone(delivery.error)
+        self.assertIsNotNone(delivery.sent_at)
+
+    @override_settings(REPORT_EMAIL_MAX_RETRIES=1, REPORT_EMAIL_RETRY_BACKOFF=0)
+    def test_delivery_fails_after_the_last_retry(self):
+        delivery = self.create_delivery()
+        with self.assertLogs("apps.diagnosis.tasks", "ERROR"):
+            send = self.send(delivery, smtplib.SMTPServerDisconnected("cerrado"))
+        self.assertEqual(send.call_count, 2)
+        self.assertEqual(delivery.status, ReportDelivery.STATUS_FAILED)
+        self.assertEqual(delivery.attempts, 2)
+        self.assertEqual(delivery.error, "cerrado")
+
+    def test_other_errors_fail_without_retrying(self):
+        delivery = self.create_delivery()
+        self.report_content.side_effect = ValueError("plantilla invalida")
+        with self.assertLogs("apps.diagnosis.tasks", "ERROR"):
+            send = self.send(delivery)
+        send.assert_not_called()
+        self.assertEqual(delivery.status, ReportDelivery.STATUS_FAILED)
+        self.assertEqual(delivery.attempts, 1)
+        self.assertEqual(delivery.error, "plantilla invalida")
+
+
+class ConverterTests(SimpleTestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.workdir = workdir.name
+        self.lock_dir = os.path.join(workdir.name, "locks")
+        self.soffice = os.path.join(workdir.name, "soffice")
+        with open(self.soffice, "w") as script:
+            script.write(f"#!{sys.executable}\n{FAKE_SOFFICE}")
+        os.chmod(self.soffice, 0o755)
+        bridge = os.path.join(workdir.name, "uno_bridge.py")
+        with open(bridge, "w") as script:
+            script.write(FAKE_UNO_BRIDGE)
+        patcher = mock.patch.object(converters, "UNO_BRIDGE_SCRIPT", bridge)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def free_port(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
+    def make_pool(self, size=2):
+        pool = converters.LibreOfficePool(
+            converters.ConversionSlots(size, self.lock_dir),
+            binary=self.soffice,
+            python=sys.executable,
+            base_port=self.free_port(),
+            job_timeout=2,
+            start_timeout=10,
+        )
+        self.addCleanup(pool.close)
+        return pool
+
+    def pids(self, pool):
+        pids = []
+        for instance in pool.instances:
+            with open(instance.pid_path) as pid_file:
+                pids.append(pid_file.read())
+        return pids
+
+    def test_slots_are_exclusive(self):
+        slots = converters.ConversionSlots(2, self.lock_dir)
+        with slots.acquire(1) as first, slots.acquire(1) as second:
+            self.assertEqual({first, second}, {0, 1})
+            with self.assertRaises(converters.ConversionTimeout):
+                with slots.acquire(0.2):
+                    pass
+            with slots.acquire_index(first) as acquired:
+                self.assertFalse(acquired)
+        with slots.acquire(0.2) as index:
+            self.assertEqual(index, 0)
+
+    def test_cli_conversions_run_in_parallel_without_sharing_files(self):
+        cli = os.path.join(self.workdir, "libreoffice")
+        with open(cli, "w") as script:
+            script.write(f"#!{sys.executable}\n{FAKE_LIBREOFFICE_CLI}")
+        os.chmod(cli, 0o755)
+        with override_settings(LIBREOFFICE_BINARY=cli), ThreadPoolExecutor(4) as pool:
+            documents = [f"documento {number}".encode() for number in range(4)]
+            pdfs = list(pool.map(converters.convert_with_cli, documents))
+        self.assertEqual(pdfs, [b"%PDF " + document for document in documents])
+
+    def test_instances_are_shared_between_pools(self):
+        pool = self.make_pool()
+        pool.warm()
+        self.assertTrue(all(instance.is_alive() for instance in pool.instances))
+        pids = self.pids(pool)
+
+        # Otro proceso con la misma configuracion usa las mismas instancias
+        other = converters.LibreOfficePool(
+            converters.ConversionSlots(2, self.lock_dir),
+            binary=self.soffice,
+            python=sys.executable,
+            base_port=pool.instances[0].port,
+            job_timeout=2,
+            start_timeout=10,
+        )
+        other.warm()
+        self.assertEqual(self.pids(other), pids)
+        self.assertEqual(other.convert(1, b"docx"), b"%PDF docx")
+
+        pool.close()
+        self.assertFalse(any(instance.is_alive() for instance in pool.instances))
+
+    def test_timeout_restarts_the_instance(self):
+        pool = self.make_pool(size=1)
+        pool.warm()
+        pid = self.pids(pool)
+        with self.assertRaises(converters.ConversionTimeout), self.assertLogs(
+            converters.logger, "ERROR"
+        ):
+            pool.convert(0, b"lento")
+        self.assertTrue(pool.instances[0].is_alive())
+        self.assertNotEqual(self.pids(pool), pid)
+
+    def convert_with_pool_settings(self, uno_available=True, binary=None):
+        with override_settings(
+            LIBREOFFICE_POOL=True,
+            LIBREOFFICE_BINARY=binary or self.soffice,
+            LIBREOFFICE_PYTHON=sys.executable,
+            LIBREOFFICE_BASE_PORT=self.free_port(),
+            LIBREOFFICE_START_TIMEOUT=2,
+            PDF_CONVERSION_CONCURRENCY=1,
+            PDF_CONVERSION_LOCK_DIR=self.lock_dir,
+        ), mock.patch.multiple(
+            converters, _slots=None, _pool=None, _pool_checked=False
+        ), mock.patch.object(
+            converters, "uno_available", return_value=uno_available
+        ), mock.patch.object(
+            converters, "convert_with_cli", return_value=b"%PDF cli"
+        ):
+            try:
+                return converters.convert_docx_to_pdf(b"docx")
+            finally:
+                if converters._pool is not None:
+                    converters._pool.close()
+
+    def test_converts_with_the_pool(self):
+        self.assertEqual(self.convert_with_pool_settings(), b"%PDF docx")
+
+    def test_falls_back_to_cli_without_uno(self):
+        with self.assertLogs(converters.logger, "WARNING"):
+            pdf = self.convert_with_pool_settings(uno_available=False)
+        self.assertEqual(pdf, b"%PDF cli")
+
+    def test_falls_back_to_cli_when_instance_does_not_start(self):
+        with self.assertLogs(converters.logger, "WARNING"):
+            pdf = self.convert_with_pool_settings(binary="/bin/false")
+        self.assertEqual(pdf, b"%PDF cli")
+
+
+class ReportCacheTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.cache = ReportCache(root.name, max_bytes=25)
+
+    def age(self, key, seconds):
+        path = self.cache.path_for(key, "docx")
+        past = time.time() - seconds
+        os.utime(path, (past, past))
+
+    def test_least_recently_used_report_is_evicted(self):
+        self.cache.put("a", "docx", b"a" * 10)
+        self.cache.put("b", "docx", b"b" * 10)
+        self.age("a", 20)
+        self.age("b", 10)
+        self.assertEqual(self.cache.get("a", "docx"), b"a" * 10)
+
+        self.cache.put("c", "docx", b"c" * 10)
+        self.assertEqual(self.cache.get("a", "docx"), b"a" * 10)
+        self.assertIsNone(self.cache.get("b", "docx"))
+        self.assertEqual(self.cache.get("c", "docx"), b"c" * 10)
+
+    def test_failed_put_keeps_the_previous_report(self):
+        self.cache.put("a", "docx", b"viejo")
+        with mock.patch("os.replace", side_effect=OSError("disco lleno")):
+            with self.assertRaises(OSError):
+                self.cache.put("a", "docx", b"nuevo")
+        self.assertEqual(self.cache.get("a", "docx"), b"viejo")
+        self.assertEqual(os.listdir(self.cache.root), ["a.docx"])
+
+    def test_open_readers_keep_their_version(self):
+        self.cache.put("a", "docx", b"viejo")
+        with self.cache.open("a", "docx") as cached_file:
+            self.cache.put("a", "docx", b"nuevo")
+            self.assertEqual(cached_file.read(), b"viejo")
+        self.assertEqual(self.cache.get("a", "docx"), b"nuevo")
+
+
+class ReportCacheKeyTests(TestCase):
+    def setUp(self):
+        self.diagnosis, self.questions, self.user = create_diagnosis()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings_override = override_settings(REPORT_CACHE_ROOT=root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def generator(self):
+        return GenerateReport(
+            company=self.diagnosis.company,
+            diagnosis=self.diagnosis,
+            sequence=None,
+            schedule=None,
+        )
+
+    def test_key_follows_the_answers(self):
+        key = self.generator().report_key(REPORT_KIND_DIAGNOSIS, "docx")
+        self.assertEqual(
+            self.generator().report_key(REPORT_KIND_DIAGNOSIS, "docx"), key
+        )
+        self.assertNotEqual(
+            self.generator().report_key(REPORT_KIND_DIAGNOSIS, "pdf"), key
+        )
+        CheckList.objects.filter(question=self.questions[0]).update(compliance_id=1)
+        self.assertNotEqual(
+            self.generator().report_key(REPORT_KIND_DIAGNOSIS, "docx"), key
+        )
+
+    def test_cache_hit_skips_the_template(self):
+        content = self.generator().report_content(REPORT_KIND_DIAGNOSIS, "docx")
+        with mock.patch(
+            "apps.diagnosis.services.template_registry.get",
+            side_effect=AssertionError("no deberia construirse"),
+        ):
+            cached = self.generator().report_content(REPORT_KIND_DIAGNOSIS, "docx")
+        self.assertEqual(cached, content)
+
+
+class DownloadReportTests(TestCase):
+    def setUp(self):
+        self.diagnosis, self.questions, self.user = create_diagnosis()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings_override = override_settings(REPORT_CACHE_ROOT=root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = (
+            "/api/v1/diagnosis/downloadReport/"
+            f"?company={self.diagnosis.company_id}&diagnosis={self.diagnosis.id}"
+            "&format_to_save=docx"
+        )
+
+    def test_report_not_modified_until_answers_change(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"PK"))
+        etag = response["ETag"]
+
+        with mock.patch(
+            "apps.diagnosis.services.GenerateReport.open_report",
+            side_effect=AssertionError("no deberia generarse"),
+        ):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+        CheckList.objects.filter(question=self.questions[0]).update(compliance_id=1)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        response.close()
+
+
+class ExportReportsTests(TestCase):
+    url = "/api/v1/diagnosis/exportReports/"
+
+    def setUp(self):
+        self.diagnosis, _, self.user = create_diagnosis()
+        self.failing = Diagnosis.objects.create(
+            company=self.diagnosis.company,
+            type=self.diagnosis.type,
+            date_elabored="2024-11-01",
+            consultor=self.user,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        lock_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(lock_dir.cleanup)
+        self.slots = converters.ConversionSlots(1, lock_dir.name)
+        patchers = [
+            mock.patch.object(report_export, "_export_slots", self.slots),
+            # Los hilos comparten la base de datos de prueba con el proceso
+            mock.patch.object(
+                report_export,
+                "ProcessPoolExecutor",
+                lambda workers, initializer=None: ThreadPoolExecutor(workers),
+            ),
+            mock.patch.object(
+                report_export, "_generate_export_entry", self.fake_entry
+            ),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def fake_entry(self, kind, company_id, diagnosis_id, format_to_save, *args):
+        if diagnosis_id == self.failing.id:
+            raise ValueError("plantilla invalida")
+        return f"informe {diagnosis_id}".encode()
+
+    def export(self, **data):
+        return self.client.post(self.url, data, format="json")
+
+    def test_zip_lists_reports_and_errors(self):
+        with self.assertLogs(report_export.logger, "ERROR"):
+            response = self.export(
+                diagnosis_ids=[self.diagnosis.id, self.failing.id]
+            )
+            content = b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with zipfile.ZipFile(BytesIO(content)) as archive:
+            names = archive.namelist()
+            self.assertEqual(len(names), 2)
+            self.assertTrue(names[0].startswith(f"{self.diagnosis.id}_"))
+            self.assertTrue(names[0].endswith(".docx"))
+            self.assertEqual(
+                archive.read(names[0]), f"informe {self.diagnosis.id}".encode()
+            )
+            self.assertEqual(
+                archive.read("errores.txt").decode(),
+                f"{self.failing.id}: plantilla invalida",
+            )
+
+    @override_settings(REPORT_EXPORT_WAIT_TIMEOUT=0)
+    def test_busy_export_slots_answer_503(self):
+        with self.slots.acquire(0):
+            response = self.export(diagnosis_ids=[self.diagnosis.id])
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_invalid_requests_are_rejected(self):
+        for data, expected in (
+            ({}, status.HTTP_400_BAD_REQUEST),
+            ({"diagnosis_ids": ["x"]}, status.HTTP_400_BAD_REQUEST),
+            ({"diagnosis_ids": [1], "format_to_save": "odt"}, 400),
+            ({"diagnosis_ids": [0]}, status.HTTP_404_NOT_FOUND),
+        ):
+            self.assertEqual(self.export(**data).status_code, expected, data)
+
+
+class BenchmarkReportsTests(TestCase):
+    def test_scenarios_are_measured_and_rolled_back(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            output = os.path.join(workdir, "resultados.json")
+            call_command(
+                "benchmark_reports",
+                "--companies",
+                "1",
+                "2",
+                "--iterations",
+                "1",
+                "--output",
+                output,
+                stdout=StringIO(),
+            )
+            with open(output) as output_file:
+                results = json.load(output_file)
+
+        self.assertEqual([result["companies"] for result in results], [1, 2])
+        for result in results:
+            self.assertEqual(
+                set(result["stages"]), {"cache_key", "template", "build_docx"}
+            )
+            for stage in result["stages"].values():
+                self.assertLessEqual(stage["p50_ms"], stage["p95_ms"])
+            self.assertTrue(result["build_breakdown"])
+        self.assertFalse(Diagnosis.objects.exists())
+        self.assertFalse(Company.objects.exists())
+
+
+class ReportProfilingTests(TestCase):
+    def setUp(self):
+        self.diagnosis, _, self.user = create_diagnosis()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings_override = override_settings(REPORT_CACHE_ROOT=root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = (
+            "/api/v1/diagnosis/generateReport/"
+            f"?company={self.diagnosis.company_id}&diagnosis={self.diagnosis.id}"
+            "&format_to_save=docx&profile=true"
+        )
+
+    def test_spans_count_their_queries(self):
+        profiler = ReportProfiler(enabled=True)
+        with profiler.track("informe"):
+            list(Compliance.objects.all())
+            profiler.lap("consulta")
+            profiler.lap("vacia")
+        self.assertEqual(
+            [(span["name"], span["queries"]) for span in profiler.spans],
+            [("consulta", 1), ("vacia", 0), ("otros", 0)],
+        )
+        self.assertEqual(profiler.queries, 1)
+
+    def test_disabled_profiler_records_nothing(self):
+        profiler = ReportProfiler()
+        with profiler.track("informe"):
+            list(Compliance.objects.all())
+            profiler.lap("consulta")
+        self.assertEqual(profiler.spans, [])
+        self.assertEqual(profiler.queries, 0)
+
+    def test_profile_is_only_returned_to_staff(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("profile", response.data)
+        self.assertFalse(response.has_header("Server-Timing"))
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        spans = [span["name"] for span in response.data["profile"]["spans"]]
+        self.assertIn("llave_cache", spans)
+        self.assertIn(f"{spans[0]};dur=", response["Server-Timing"])
+
+
+class CorporateCompanyTablesTests(TestCase):
+    def setUp(self):
+        self.diagnosis, _, self.user = create_diagnosis()
+        self.vehicle_questions = list(VehicleQuestions.objects.order_by("id"))
+        self.driver_questions = list(DriverQuestion.objects.order_by("id"))
+
+    def add_company(self, number: int, owned: int):
+        company = Company.objects.create(
+            name=f"Filial {number}",
+            nit=f"80000000{number}1",
+            segment=self.diagnosis.company.segment,
+            mission=self.diagnosis.company.mission,
+            size=self.diagnosis.type,
+            dependant="Ana Gomez",
+            dependant_position="Gerente",
+        )
+        counter = Diagnosis_Counter.objects.create(
+            company=company, diagnosis=self.diagnosis, size=self.diagnosis.type
+        )
+        for question in self.vehicle_questions:
+            Fleet.objects.create(
+                diagnosis_counter=counter,
+                vehicle_question=question,
+                quantity_owned=owned,
+                quantity_renting=1,
+            )
+        Driver.objects.create(
+            diagnosis_counter=counter,
+            driver_question=self.driver_questions[0],
+            quantity=owned,
+        )
+        return company
+
+    def company_totals(self):
+        generator = GenerateReport(
+            company=None, diagnosis=self.diagnosis, sequence=None, schedule=None
+        )
+        with CaptureQueriesContext(connection) as captured:
+            totals = generator._corporate_company_totals()
+        return totals, len(captured.captured_queries)
+
+    def test_totals_are_grouped_with_constant_queries(self):
+        self.add_company(1, owned=4)
+        totals, queries = self.company_totals()
+        self.add_company(2, owned=5)
+        more_totals, more_queries = self.company_totals()
+
+        self.assertEqual(more_queries, queries)
+        self.assertEqual(
+            [
+                (
+                    data["company"].name,
+                    data["total_owned"],
+                    data["total_renting"],
+                    data["total_general_vehicles"],
+                    data["total_quantity_driver"],
+                )
+                for data in more_totals
+            ],
+            [
+                (self.diagnosis.company.name, 3, 1, 4, 5),
+                ("Filial 1", 8, 2, 10, 4),
+                ("Filial 2", 10, 2, 12, 5),
+            ],
+        )
+
+    def test_each_company_is_inserted_once(self):
+        for number in range(1, 4):
+            self.add_company(number, owned=number)
+        totals, _ = self.company_totals()
+        document = Document()
+        document.add_paragraph("{{TABLA_DIAGNOSTICO}}")
+        insert_tables_for_companies(
+            document,
+            "{{TABLA_DIAGNOSTICO}}",
+            totals,
+            "2024-10-01",
+            self.vehicle_questions,
+            self.driver_questions,
+        )
+        headings = [table.rows[0].cells[0].text for table in document.tables]
+        self.assertEqual(
+            headings,
+            [
+                f"CARACTERIZACION DE LA EMPRESA - {data['company'].name.upper()}"
+                for data in totals
+            ],
+        )
+        self.assertEqual(len(headings), 4)
+
+
+class ReportlabRendererTests(TestCase):
+    def setUp(self):
+        self.diagnosis, _, self.user = create_diagnosis()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings_override = override_settings(REPORT_CACHE_ROOT=root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def generator(self, pdf_renderer=PDF_RENDERER_REPORTLAB):
+        return GenerateReport(
+            company=self.diagnosis.company,
+            diagnosis=self.diagnosis,
+            sequence=None,
+            schedule=None,
+            pdf_renderer=pdf_renderer,
+        )
+
+    def test_pdfs_are_drawn_without_docx_or_libreoffice(self):
+        with mock.patch(
+            "apps.diagnosis.services.template_registry.get",
+            side_effect=AssertionError("no deberia usar la plantilla"),
+        ), mock.patch(
+            "apps.diagnosis.services.convert_docx_to_pdf",
+            side_effect=AssertionError("no deberia convertir"),
+        ):
+            for kind in (REPORT_KIND_DIAGNOSIS, REPORT_KIND_WORK_PLAN):
+                content = self.generator().report_content(kind, "pdf")
+                self.assertTrue(content.startswith(b"%PDF-"), kind)
+                self.assertIn(b"%%EOF", content[-32:])
+
+    def test_renderer_is_part_of_the_pdf_cache_key(self):
+        reportlab = self.generator()
+        libreoffice = self.generator(PDF_RENDERER_LIBREOFFICE)
+        self.assertNotEqual(
+            reportlab.report_key(REPORT_KIND_DIAGNOSIS, "pdf"),
+            libreoffice.report_key(REPORT_KIND_DIAGNOSIS, "pdf"),
+        )
+        self.assertEqual(
+            reportlab.report_key(REPORT_KIND_DIAGNOSIS, "docx"),
+            libreoffice.report_key(REPORT_KIND_DIAGNOSIS, "docx"),
+        )
+
+    def test_unknown_renderer_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.generator("wkhtmltopdf")
+
+
+class TemplateRegistryTests(SimpleTestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.path = os.path.join(workdir.name, "plantilla.docx")
+        self.write_template("Empresa {{COMPANY_NAME}}")
+        self.registry = TemplateRegistry()
+
+    def write_template(self, text):
+        document = Document()
+        document.add_paragraph("Informe")
+        document.add_paragraph(text)
+        document.add_picture(BytesIO(render_radar_chart((10, 20, 30, 40))))
+        document.save(self.path)
+
+    def texts(self, document):
+        return [paragraph.text for paragraph in document.paragraphs]
+
+    def test_copies_do_not_share_state_with_the_template(self):
+        first = self.registry.get(self.path)
+        first.paragraphs[1].text = "modificado"
+        first.add_paragraph("agregado")
+
+        second = self.registry.get(self.path)
+        self.assertEqual(
+            self.texts(second), ["Informe", "Empresa {{COMPANY_NAME}}", ""]
+        )
+        self.assertIs(
+            second.placeholder_paragraphs["{{COMPANY_NAME}}"][0]._p,
+            second.paragraphs[1]._p,
+        )
+
+        buffer = BytesIO()
+        first.save(buffer)
+        saved = Document(BytesIO(buffer.getvalue()))
+        self.assertEqual(self.texts(saved)[1:], ["modificado", "", "agregado"])
+        self.assertEqual(len(saved.inline_shapes), 1)
+
+    def test_template_reloads_when_its_content_changes(self):
+        checksum = self.registry.checksum(self.path)
+        self.assertEqual(self.registry.checksum(self.path), checksum)
+
+        self.write_template("Nueva {{NIT}}")
+        self.assertNotEqual(self.registry.checksum(self.path), checksum)
+        document = self.registry.get(self.path)
+        self.assertEqual(self.texts(document)[1], "Nueva {{NIT}}")
+        self.assertEqual(list(document.placeholder_paragraphs), ["{{NIT}}"])
+
+
+class PlaceholderIndexTests(SimpleTestCase):
+    def make_document(self):
+        document = Document()
+        document.add_paragraph("Empresa {{COMPANY_NAME}} con NIT {{NIT}}")
+        document.add_paragraph("Sin marcadores")
+        paragraph = document.add_paragraph("Consultor ")
+        paragraph.add_run("{{CONSULTOR_NOMBRE}}")
+        document.add_paragraph("{{NIT}}")
+        return document
+
+    def test_index_is_bound_to_each_copy(self):
+        template = self.make_document()
+        index = PlaceholderIndex(template)
+        self.assertEqual(
+            index.positions,
+            {"{{COMPANY_NAME}}": [0], "{{NIT}}": [0, 3], "{{CONSULTOR_NOMBRE}}": [2]},
+        )
+
+        document = index.bind(self.make_document())
+        # Una tabla insertada antes no mueve los parrafos ya resueltos
+        document.paragraphs[0]._p.addprevious(document.add_table(1, 1)._tbl)
+        paragraph = find_placeholder_paragraph(document, "{{CONSULTOR_NOMBRE}}")
+        self.assertIs(paragraph._p, document.paragraphs[2]._p)
+        self.assertIsNone(find_placeholder_paragraph(document, "{{OTRO}}"))
+
+    def test_placeholders_are_replaced_in_one_pass(self):
+        template = self.make_document()
+        document = PlaceholderIndex(template).bind(self.make_document())
+        replace_placeholders_in_document(
+            document,
+            {
+                "{{COMPANY_NAME}}": "ACME",
+                "{{NIT}}": 123,
+                "{{CONSULTOR_NOMBRE}}": "Ana {{NIT}}",
+                "{{SIN_USO}}": None,
+            },
+        )
+        self.assertEqual(
+            [paragraph.text for paragraph in document.paragraphs],
+            [
+                "Empresa ACME con NIT 123",
+                "Sin marcadores",
+                "Consultor Ana {{NIT}}",
+                "123",
+            ],
+        )
+        self.assertTrue(document.paragraphs[2].runs[1].bold)
+        self.assertFalse(document.paragraphs[0].runs[0].bold)
+
+
+class RowPrototypeTests(SimpleTestCase):
+    def build_row(self, cells, texts=("{0}", "{1}")):
+        merged = cells[1].merge(cells[2])
+        cells[0].text = texts[0]
+        merged.text = texts[1]
+        for cell in (cells[0], merged):
+            align_cell_text(cell, horizontal="left")
+            set_cell_background_color(cell, "D9D9D9")
+            set_cell_text_color(cell, "000000")
+
+    def test_stamped_rows_match_rows_styled_cell_by_cell(self):
+        document = Document()
+        table = document.add_table(rows=1, cols=3)
+        rows = RowPrototype(table, self.build_row)
+        self.assertEqual(len(table.rows), 1)
+
+        first = rows.stamp("Paso 1", 25)
+        second = rows.stamp("Paso 2", "50%")
+        first.cells[0].text = "cambiado"
+        self.assertEqual(
+            [[cell.text for cell in row.cells] for row in table.rows[1:]],
+            [["cambiado", "25", "25"], ["Paso 2", "50%", "50%"]],
+        )
+
+        expected_table = Document().add_table(rows=1, cols=3)
+        expected = expected_table.add_row()
+        self.build_row(expected.cells, ("Paso 2", "50%"))
+        self.assertEqual(second._tr.xml, expected._tr.xml)
+
+
+class RadarChartTests(SimpleTestCase):
+    def cycles(self, *percentages):
+        return [
+            {"cycle": cycle, "cycle_percentage": percentage}
+            for cycle, percentage in zip("PHVA", percentages)
+        ]
+
+    def test_equal_profiles_are_rendered_once(self):
+        render_radar_chart.cache_clear()
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as workdir:
+            # Nada se escribe en el directorio de trabajo
+            os.chdir(workdir)
+            try:
+                png = create_radar_chart(self.cycles(10.001, 20, 30, 40))
+            finally:
+                os.chdir(cwd)
+            self.assertEqual(os.listdir(workdir), [])
+        self.assertTrue(png.startswith(b"\x89PNG"))
+        self.assertEqual(create_radar_chart(self.cycles(10.004, 20, 30, 40)), png)
+        self.assertEqual(render_radar_chart.cache_info().hits, 1)
+        self.assertNotEqual(create_radar_chart(self.cycles(90, 20, 30, 40)), png)
+
+    def test_chart_bytes_replace_the_placeholder(self):
+        document = Document()
+        document.add_paragraph("{{GRAPHIC_RADAR }}")
+        insert_image_after_placeholder(
+            document,
+            "{{GRAPHIC_RADAR }}",
+            create_radar_chart(self.cycles(10, 20, 30, 40)),
+        )
+        self.assertEqual(len(document.inline_shapes), 1)
+        self.assertNotIn(
+            "{{GRAPHIC_RADAR }}", [paragraph.text for paragraph in document.paragraphs]
+        )
+
+
+class BarChartTests(SimpleTestCase):
+    datas_by_cycle = [
+        {"cycle": "P", "steps": [{"step": 1, "percentage": 50}]},
+        {"cycle": "H", "steps": [{"step": 2, "percentage": 12.345}]},
+    ]
+
+    def test_png_is_rendered_in_memory(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            try:
+                png = create_bar_chart(self.datas_by_cycle)
+            finally:
+                os.chdir(cwd)
+            self.assertEqual(os.listdir(workdir), [])
+        self.assertTrue(png.startswith(b"\x89PNG"))
+
+    def test_native_chart_carries_the_step_percentages(self):
+        document = Document()
+        document.add_paragraph("{{GRAPHIC_BAR}}")
+        insert_bar_chart_after_placeholder(
+            document, "{{GRAPHIC_BAR}}", self.datas_by_cycle
+        )
+        buffer = BytesIO()
+        document.save(buffer)
+
+        with zipfile.ZipFile(buffer) as package:
+            chart = package.read("word/charts/chart1.xml").decode()
+            body = package.read("word/document.xml").decode()
+            relationships = package.read("word/_rels/document.xml.rels").decode()
+        self.assertIn('<c:pt idx="1"><c:v>2</c:v></c:pt>', chart)
+        self.assertIn('<c:pt idx="1"><c:v>12.35</c:v></c:pt>', chart)
+        self.assertIn("<c:chart ", body)
+        self.assertNotIn("{{GRAPHIC_BAR}}", body)
+        self.assertIn("charts/chart1.xml", relationships)
+
+
+class RecommendationMapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.requirement = Diagnosis_Requirement.objects.create(
+            name="Paso 1", step=1, cycle="P", basic=True
+        )
+        self.recommendation = WorkPlan_Recomendation.objects.create(
+            name="Designar un lider", requirement=self.requirement
+        )
+
+    def recommendations(self):
+        return work_plan_recommendation_map()[self.requirement.id]["recommendations"]
+
+    def test_map_is_built_once(self):
+        self.assertEqual(self.recommendations(), ["Designar un lider"])
+        with mock.patch(
+            "apps.diagnosis.recommendation_map._build_work_plan_recommendation_map",
+            side_effect=AssertionError("no deberia reconstruirse"),
+        ):
+            self.assertEqual(self.recommendations(), ["Designar un lider"])
+
+    def test_catalog_edits_invalidate_the_map(self):
+        self.assertEqual(self.recommendations(), ["Designar un lider"])
+
+        self.recommendation.name = "Designar un lider del PESV"
+        self.recommendation.save()
+        self.assertEqual(self.recommendations(), ["Designar un lider del PESV"])
+
+        WorkPlan_Recomendation.objects.create(
+            name="Publicar la politica", requirement=self.requirement
+        )
+        self.assertEqual(
+            self.recommendations(),
+            ["Designar un lider del PESV", "Publicar la politica"],
+        )
+
+        self.recommendation.delete()
+        self.assertEqual(self.recommendations(), ["Publicar la politica"])
+
+        self.requirement.name = "Paso 1 actualizado"
+        self.requirement.save()
+        self.assertEqual(
+            work_plan_recommendation_map()[self.requirement.id]["name"],
+            "Paso 1 actualizado",
+        )
+
+
+class StepScoreSummaryTests(TestCase):
+    def setUp(self):
+        self.diagnosis, self.questions, self.user = create_diagnosis()
+
+    def step_score(self, step):
+        return DiagnosisStepScore.objects.get(diagnosis=self.diagnosis, step=step)
+
+    def test_checklist_writes_refresh_the_summary(self):
+        checklist = CheckList.objects.get(question=self.questions[0])
+        checklist.compliance_id = 1
+        checklist.obtained_value = 25
+        with self.captureOnCommitCallbacks(execute=True):
+            checklist.save()
+        step_score = self.step_score(1)
+        self.assertEqual(step_score.obtained_value, 25)
+        self.assertEqual(step_score.count_cumple, 1)
+        self.assertEqual(step_score.count_no_cumple, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            checklist.delete(hard=True)
+        step_score = self.step_score(1)
+        self.assertEqual(step_score.variable_value, 25)
+        self.assertEqual(step_score.count_cumple, 0)
+
+    def test_writes_in_one_transaction_refresh_once(self):
+        with mock.patch.object(
+            ScoringEngine, "refresh", autospec=True, side_effect=ScoringEngine.refresh
+        ) as refresh, self.captureOnCommitCallbacks(execute=True):
+            for checklist in CheckList.objects.filter(diagnosis=self.diagnosis):
+                checklist.compliance_id = 1
+                checklist.save()
+        refresh.assert_called_once()
+        self.assertEqual(list(refresh.call_args.args[1]), [self.diagnosis.id])
+        self.assertEqual(self.step_score(1).count_cumple, 2)
+
+    def test_catalog_edits_refresh_the_summary(self):
+        question = self.questions[0]
+        question.variable_value = 50
+        with self.captureOnCommitCallbacks(execute=True):
+            question.save()
+        self.assertEqual(self.step_score(1).variable_value, 75)
+
+        requirement = question.requirement
+        requirement.step = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            requirement.save()
+        self.assertFalse(
+            DiagnosisStepScore.objects.filter(
+                diagnosis=self.diagnosis, step=1
+            ).exists()
+        )
+        self.assertEqual(self.step_score(5).variable_value, 75)
+
+    def test_reads_do_not_write_the_summary(self):
+        with CaptureQueriesContext(connection) as captured:
+            ScoringEngine().summary(self.diagnosis.id)
+        self.assertTrue(captured.captured_queries)
+        self.assertFalse(
+            any(
+                not query["sql"].lstrip().upper().startswith("SELECT")
+                for query in captured.captured_queries
+            )
+        )
+
+
+class ScoringEngineCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.diagnosis, self.questions, self.user = create_diagnosis()
+
+    def test_engine_memoizes_its_reads(self):
+        scoring = ScoringEngine()
+        cycles = scoring.cycles(self.diagnosis.id)
+        summary = scoring.summary(self.diagnosis.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(scoring.cycles(self.diagnosis.id), cycles)
+            self.assertEqual(scoring.summary(self.diagnosis.id), summary)
+            scoring.percentage(self.diagnosis.id)
+            scoring.compliance_counts(self.diagnosis.id)
+
+    def test_tables_are_shared_until_the_answers_change(self):
+        cycles = ScoringEngine().cycles(self.diagnosis.id)
+        with mock.patch.object(
+            ScoringEngine,
+            "_calculate",
+            side_effect=AssertionError("no deberia recalcularse"),
+        ):
+            self.assertEqual(ScoringEngine().cycles(self.diagnosis.id), cycles)
+
+        checklist = CheckList.objects.get(question=self.questions[0])
+        checklist.compliance_id = 1
+        checklist.obtained_value = 25
+        with self.captureOnCommitCallbacks(execute=True):
+            checklist.save()
+        cycles = ScoringEngine().cycles(self.diagnosis.id)
+        self.assertEqual(cycles[0]["steps"][0]["percentage"], 50.0)
+        self.assertEqual(
+            cycles[0]["steps"][0]["requirements"][0]["questions"][0]["compliance"],
+            "CUMPLE",
+        )
+
+
+class StepScoreAggregateTests(TestCase):
+    def setUp(self):
+        self.diagnosis, self.questions, self.user = create_diagnosis()
+
+    def empty_diagnosis(self):
+        return Diagnosis.objects.create(
+            company=self.diagnosis.company,
+            type=self.diagnosis.type,
+            date_elabored="2024-11-01",
+            consultor=self.user,
+        )
+
+    def test_totals_follow_the_articulation_rule(self):
+        CheckList.objects.filter(question=self.questions[0]).update(
+            compliance_id=3, obtained_value=12.5, is_articuled=False
+        )
+        CheckList.objects.filter(question=self.questions[1]).update(
+            compliance_id=1, obtained_value=25
+        )
+        ScoringEngine().refresh([self.diagnosis.id])
+
+        step_score = DiagnosisStepScore.objects.get(diagnosis=self.diagnosis, step=1)
+        self.assertEqual(
+            (
+                step_score.variable_value,
+                step_score.obtained_value,
+                step_score.articulated_value,
+                step_score.count_cumple,
+                step_score.count_cumple_parcialmente,
+                step_score.count_no_cumple,
+            ),
+            (50, 37.5, 50, 1, 1, 0),
+        )
+        scoring = ScoringEngine()
+        self.assertEqual(
+            scoring.cycle_percentages(self.diagnosis.id),
+            [
+                {"cycle": cycle["cycle"], "cycle_percentage": cycle["cycle_percentage"]}
+                for cycle in scoring.cycles(self.diagnosis.id)
+            ],
+        )
+        self.assertEqual(scoring.percentage(self.diagnosis.id), 18.75)
+
+    def test_refresh_queries_do_not_grow_with_the_batch(self):
+        others = [self.empty_diagnosis() for _ in range(3)]
+        with CaptureQueriesContext(connection) as single:
+            ScoringEngine().refresh([self.diagnosis.id])
+        with CaptureQueriesContext(connection) as batch:
+            ScoringEngine().refresh(
+                [self.diagnosis.id, *(diagnosis.id for diagnosis in others)]
+            )
+        self.assertEqual(len(batch.captured_queries), len(single.captured_queries))
+
+    def test_empty_diagnosis_scores_zero(self):
+        diagnosis = self.empty_diagnosis()
+        scoring = ScoringEngine()
+        scoring.refresh([diagnosis.id])
+        self.assertFalse(DiagnosisStepScore.objects.filter(diagnosis=diagnosis))
+        self.assertEqual(
+            scoring.summary(diagnosis.id), {"general": 0.0, "counts": [], "radar": []}
+        )
+
+
+class PortfolioScoresTests(TestCase):
+    url = "/api/v1/diagnosis/portfolio_scores/"
+
+    def setUp(self):
+        self.diagnosis, self.questions, self.user = create_diagnosis()
+        CheckList.objects.filter(question__in=self.questions[:3]).update(
+            compliance_id=1, obtained_value=25
+        )
+        CheckList.objects.filter(question=self.questions[4]).update(
+            compliance_id=3, obtained_value=12.5, is_articuled=False
+        )
+        company = Company.objects.create(
+            name="Filial",
+            nit="8000000011",
+            segment=Segments.objects.create(name="Carga"),
+            mission=self.diagnosis.company.mission,
+            size=self.diagnosis.type,
+            dependant="Ana Gomez",
+            dependant_position="Gerente",
+        )
+        self.other = Diagnosis.objects.create(
+            company=company,
+            type=self.diagnosis.type,
+            date_elabored="2024-12-01",
+            consultor=self.user,
+        )
+        CheckList.objects.bulk_create(
+            CheckList(
+                question=question,
+                diagnosis=self.other,
+                compliance_id=1,
+                obtained_value=25,
+                is_articuled=True,
+            )
+            for question in self.questions[6:]
+        )
+        self.empty = Diagnosis.objects.create(
+            company=company,
+            type=self.diagnosis.type,
+            date_elabored="2025-01-15",
+            consultor=self.user,
+        )
+        self.diagnosis_ids = [self.diagnosis.id, self.other.id, self.empty.id]
+        ScoringEngine().refresh(self.diagnosis_ids)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def portfolio(self, **data):
+        return self.client.post(self.url, data, format="json")
+
+    def test_vectorized_scores_match_the_step_loop(self):
+        with mock.patch.object(scoring, "VECTORIZED_MIN_DIAGNOSES", 1):
+            vectorized = ScoringEngine().summaries(self.diagnosis_ids)
+            response = self.portfolio(diagnosis_ids=self.diagnosis_ids)
+        with mock.patch.object(scoring, "VECTORIZED_MIN_DIAGNOSES", 100):
+            self.assertEqual(ScoringEngine().summaries(self.diagnosis_ids), vectorized)
+            self.assertEqual(
+                self.portfolio(diagnosis_ids=self.diagnosis_ids).data, response.data
+            )
+
+        self.assertEqual(
+            [
+                (result["diagnosis"], result["percentage"], result["compliance_level"])
+                for result in response.data
+            ],
+            [
+                (self.diagnosis.id, 43.75, "BAJO"),
+                (self.other.id, 100.0, "ALTO"),
+                (self.empty.id, 0.0, "BAJO"),
+            ],
+        )
+        self.assertEqual(
+            response.data[0]["compliance_counts"],
+            [
+                {"compliance_id": 1, "count": 3},
+                {"compliance_id": 2, "count": 4},
+                {"compliance_id": 3, "count": 1},
+            ],
+        )
+        self.assertEqual(
+            response.data[1]["cycles"],
+            [
+                {
+                    "cycle": "A",
+                    "cycle_percentage": 100.0,
+                    "steps": [{"step": 4, "percentage": 100.0}],
+                }
+            ],
+        )
+        self.assertEqual(response.data[2]["cycles"], [])
+
+    def test_filters_are_combined(self):
+        segment = self.other.company.segment_id
+        for data, expected in (
+            ({"segment": segment}, [self.other.id, self.empty.id]),
+            ({"segment": segment, "date_to": "2024-12-31"}, [self.other.id]),
+            ({"date_from": "2024-11-01"}, [self.other.id, self.empty.id]),
+            (
+                {
+                    "diagnosis_ids": [self.diagnosis.id, self.empty.id],
+                    "segment": segment,
+                },
+                [self.empty.id],
+            ),
+            ({"mission": self.diagnosis.company.mission_id}, self.diagnosis_ids),
+        ):
+            response = self.portfolio(**data)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                [result["diagnosis"] for result in response.data], expected, data
+            )
+
+    def test_invalid_requests_are_rejected(self):
+        for data in ({}, {"date_from": "2024-13-01"}, {"date_to": "ayer"}):
+            response = self.portfolio(**data)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+
+
+class SaveAnswersUpsertTests(TestCase):
+    def setUp(self):
+        self.diagnosis, self.questions, self.user = create_diagnosis()
+        self.checklist_requirement = Checklist_Requirement.objects.create(
+            diagnosis=self.diagnosis,
+            requirement=self.questions[0].requirement,
+            compliance_id=2,
+            observation="Pendiente",
+        )
+
+    def save(self, answers, requirement_answers=()):
+        with transaction.atomic():
+            return DiagnosisService.save_answers(
+                self.diagnosis, answers, requirement_answers
+            )
+
+    def test_answers_are_updated_restored_and_inserted(self):
+        updated = CheckList.objects.get(question=self.questions[0])
+        deleted = CheckList.objects.get(question=self.questions[1])
+        deleted.delete()
+        CheckList.objects.filter(question=self.questions[2]).delete(hard=True)
+
+        saved = self.save(
+            [answer(question) for question in self.questions[:3]],
+            [
+                {
+                    "requirement": self.checklist_requirement.id,
+                    "compliance": 1,
+                    "observation": "Listo",
+                }
+            ],
+        )
+
+        self.assertEqual(saved, 3)
+        rows = {
+            checklist.question_id: checklist
+            for checklist in CheckList.objects.filter(diagnosis=self.diagnosis)
+        }
+        self.assertEqual(len(rows), len(self.questions))
+        self.assertEqual(rows[self.questions[0].id].id, updated.id)
+        self.assertEqual(rows[self.questions[1].id].id, deleted.id)
+        self.assertIsNone(rows[self.questions[1].id].deleted_at)
+        for question in self.questions[:3]:
+            self.assertEqual(rows[question.id].compliance_id, 1)
+            self.assertEqual(rows[question.id].obtained_value, 25)
+        self.checklist_requirement.refresh_from_db()
+        self.assertEqual(self.checklist_requirement.compliance_id, 1)
+        self.assertEqual(self.checklist_requirement.observation, "Listo")
+
+    def test_queries_do_not_grow_with_the_answers(self):
+        with CaptureQueriesContext(connection) as few:
+            self.save([answer(self.questions[0])])
+        with CaptureQueriesContext(connection) as many:
+            self.save([answer(question) for question in self.questions])
+        self.assertEqual(len(many.captured_queries), len(few.captured_queries))
+
+    def test_unknown_question_fails_the_save(self):
+        with self.assertRaises(Diagnosis_Questions.DoesNotExist):
+            self.save(
+                [
+                    answer(self.questions[0]),
+                    dict(answer(self.questions[1]), question=999999),
+                ]
+            )
+        self.assertEqual(
+            CheckList.objects.get(question=self.questions[0]).compliance_id, 2
+        )
+
+
+class DiagnosisScoresTests(TestCase):
+    def setUp(self):
+        self.diagnosis, self.questions, self.user = create_diagnosis()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.scores_url = f"/api/v1/diagnosis/scores/?diagnosis={self.diagnosis.id}"
+
+    def save_answers(self, data_version, answers):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.patch(
+                f"/api/v1/diagnosis/save_answers/?diagnosis={self.diagnosis.id}",
+                {"data_version": data_version, "answers": answers},
+                format="json",
+            )
+
+    def assert_scores_match_engine(self):
+        response = self.client.get(self.scores_url)
+        scoring = ScoringEngine()
+        self.assertEqual(response.data["cycles"], scoring.cycles(self.diagnosis.id))
+        radar = self.client.get(
+            f"/api/v1/diagnosis/radarChart/?diagnosis={self.diagnosis.id}"
+        )
+        self.assertEqual(radar.data, response.data["radar"])
+        self.assertEqual(
+            [cycle["cycle_percentage"] for cycle in response.data["radar"]],
+            [cycle["cycle_percentage"] for cycle in scoring.cycles(self.diagnosis.id)],
+        )
+        return response
+
+    def test_save_answers_rejects_stale_data_version(self):
+        response = self.save_answers(0, [answer(self.questions[0])])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["data_version"], 1)
+
+        response = self.save_answers(0, [answer(self.questions[1])])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["data_version"], 1)
+        self.assertEqual(
+            CheckList.objects.get(question=self.questions[1]).compliance_id, 2
+        )
+
+    def test_scores_not_modified_until_answers_change(self):
+        response = self.client.get(self.scores_url)
+        etag = response["ETag"]
+        response = self.client.get(self.scores_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.save_answers(0, [answer(self.questions[0])])
+        response = self.client.get(self.scores_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_scores_etag_changes_with_question_value(self):
+        self.save_answers(0, [answer(self.questions[0])])
+        response = self.client.get(self.scores_url)
+        etag, general = response["ETag"], response.data["general"]
+
+        question = self.questions[0]
+        question.variable_value = 50
+        with self.captureOnCommitCallbacks(execute=True):
+            question.save()
+        response = self.client.get(self.scores_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertNotEqual(response.data["general"], general)
+
+    def test_summary_matches_engine_after_edits(self):
+        self.assert_scores_match_engine()
+        self.save_answers(0, [answer(self.questions[0]), answer(self.questions[2])])
+        self.assert_scores_match_engine()
+
+        requirement = self.questions[2].requirement
+        requirement.cycle = "P"
+        with self.captureOnCommitCallbacks(execute=True):
+            requirement.save()
+        response = self.assert_scores_match_engine()
+        self.assertEqual(
+            [cycle["cycle"] for cycle in response.data["radar"]], ["P", "V", "A"]
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CheckList.objects.get(question=self.questions[1]).delete(hard=True)
+        self.assert_scores_match_engine()
+
+
+@override_settings(AUTOSAVE_WINDOW_SECONDS=1)
+class DiagnosisAutosaveTests(TransactionTestCase):
+    def setUp(self):
+        self.diagnosis, self.questions, self.user = create_diagnosis()
+        token = RefreshToken.for_user(self.user).access_token
+        self.path = f"/ws/diagnosis/{self.diagnosis.id}/autosave/?token={token}"
+
+    async def connect(self):
+        from diagnostico_pesv.asgi import application
+
+        communicator = WebsocketCommunicator(application, self.path)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        ready = await communicator.receive_json_from()
+        self.assertEqual(ready["type"], "autosave_ready")
+        return communicator
+
+    async def test_answers_in_window_are_saved_once(self):
+        communicator = await self.connect()
+        for compliance, obtained_value in [(3, 12.5), (2, 0), (1, 25)]:
+            await communicator.send_json_to(
+                {
+                    "type": "answers",
+                    "answers": [
+                        answer(self.questions[0], compliance, obtained_value)
+                    ],
+                }
+            )
+        saved = await communicator.receive_json_from(timeout=5)
+        self.assertEqual(saved["type"], "autosave_saved")
+        self.assertEqual(saved["saved"], 1)
+        self.assertEqual(saved["data_version"], 1)
+        await communicator.disconnect()
+
+        checklist = await CheckList.objects.aget(question=self.questions[0])
+        self.assertEqual(checklist.compliance_id, 1)
+
+    async def test_invalid_answers_are_rejected(self):
+        communicator = await self.connect()
+        await communicator.send_json_to(
+            {
+                "type": "flush",
+                "answers": [
+                    answer(self.questions[0]),
+                    {"question": self.questions[1].id, "compliance": "1"},
+                    dict(answer(self.questions[1]), question=999999),
+                ],
+            }
+        )
+        error = await communicator.receive_json_from(timeout=5)
+        self.assertEqual(error["type"], "autosave_error")
+        saved = await communicator.receive_json_from(timeout=5)
+        self.assertEqual(saved["saved"], 1)
+        await communicator.disconnect()
+
+    async def test_batch_is_kept_after_database_error(self):
+        communicator = await self.connect()
+        with mock.patch(
+            "apps.diagnosis.consumers.consumer.DiagnosisService.save_answers",
+            side_effect=DatabaseError("sin conexion"),
+        ), self.assertLogs("apps.diagnosis.consumers.consumer", "ERROR"):
+            await communicator.send_json_to(
+                {"type": "flush", "answers": [answer(self.questions[0], 3, 12.5)]}
+            )
+            error = await communicator.receive_json_from(timeout=5)
+        self.assertEqual(error["type"], "autosave_error")
+
+        # El siguiente guardado incluye el lote que fallo
+        await communicator.send_json_to(
+            {"type": "flush", "answers": [answer(self.questions[1])]}
+        )
+        saved = await communicator.receive_json_from(timeout=5)
+        self.assertEqual(saved["saved"], 2)
+        await communicator.disconnect()
+
+        checklist = await CheckList.objects.aget(question=self.questions[0])
+        self.assertEqual(checklist.compliance_id, 3)
@@ -0,0 +1,51 @@
+"""
+Convierte un DOCX a PDF en una instancia de LibreOffice que ya escucha en un
+puerto local.
+
+Corre con el Python de LibreOffice (LIBREOFFICE_PYTHON), el unico que puede
+importar uno; no depende de Django. Ver converters.LibreOfficeInstance.
+
+Uso: python3 uno_bridge.py <puerto> <docx> <pdf>
+"""
+
+import sys
+import uno
+from com.sun.star.beans import PropertyValue
+
+
+def _property(name, value):
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+
+def convert(port: int, docx_path: str, pdf_path: str):
+    local_context = uno.getComponentContext()
+    resolver = local_context.ServiceManager.createInstanceWithContext(
+        "com.sun.star.bridge.UnoUrlResolver", local_context
+    )
+    context = resolver.resolve(
+        f"uno:socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext"
+    )
+    desktop = context.ServiceManager.createInstanceWithContext(
+        "com.sun.star.frame.Desktop", context
+    )
+    document = desktop.loadComponentFromURL(
+        uno.systemPathToFileUrl(docx_path),
+        "_blank",
+        0,
+        (_property("Hidden", True),),
+    )
+    try:
+        document.storeToURL(
+            uno.systemPathToFileUrl(pdf_path),
+            (_property("FilterName", "writer_pdf_Export"),),
+        )
+    finally:
+        document.close(True)
+
+
+if __name__ == "__main__":
+    port, docx_path, pdf_path = sys.argv[1:4]
+    convert(int(port), docx_path, pdf_path)
@@ -2,6 +2,8 @@ import platform
 import traceback
 import re
 import base64
+import hashlib
+import uuid
 import pandas as pd
 import os
 import traceback
@@ -17,7 +19,6 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from apps.diagnosis_requirement.core.models import (
     Diagnosis_Requirement,
-    WorkPlan_Recomendation,
 )
 from apps.diagnosis_requirement.infraestructure.serializers import (
     Recomendation_Serializer,
@@ -28,23 +29,30 @@ from .models import (
     Diagnosis,
     Checklist_Requirement,
     Notification,
+    ReportDelivery,
+    ReportJob,
 )
 from .serializers import (
     Diagnosis_QuestionsSerializer,
     DiagnosisSerializer,
     NotificationSerializer,
+    ReportDeliverySerializer,
 )
 from apps.diagnosis_counter.serializers import FleetSerializer, DriverSerializer
 from apps.company.models import Company, CompanySize
 from apps.diagnosis_counter.models import Fleet, Driver, Diagnosis_Counter
-from utils.functionUtils import blank_to_null
 from django.db import transaction
-from docx import Document
 from io import BytesIO
 from django.conf import settings
 from .helper import *
 from collections import defaultdict
-from .services import DiagnosisService, GenerateReport
+from .services import (
+    DiagnosisService,
+    GenerateReport,
+    REPORT_CONTENT_TYPES,
+    report_extension,
+)
+from .pdf_renderer import PDF_RENDERERS
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import status, viewsets
 from http import HTTPMethod
@@ -60,11 +68,30 @@ from apps.diagnosis_requirement.infraestructure.repositories import (
 from django.db.models import Prefetch, OuterRef, Subquery, Q, Sum, Count
 from apps.sign.models import User, QueryLog
 from utils.constants import ComplianceIds
-from collections import OrderedDict
 from apps.corporate_group.repositories import CorporateGroupRepository
-from django.core.mail import EmailMessage
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
+from celery.result import AsyncResult
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.utils.dateparse import parse_date
+from .profiling import ReportProfiler
+from .converters import ConversionTimeout
+from .report_export import (
+    EXPORT_FORMATS,
+    diagnoses_for_export,
+    stream_reports_zip,
+)
+from .portfolio import portfolio_diagnoses, score_portfolio
+from .scoring import ScoringEngine
+from .tasks import (
+    generate_report_task,
+    send_report_email_task,
+    REPORT_FILENAMES,
+    REPORT_KIND_DIAGNOSIS,
+    REPORT_KIND_WORK_PLAN,
+)
 
 
 def remove_invalid_requirements(diagnosis_id, valid_requirements):
@@ -386,6 +413,9 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                                 checklist.save()
 
                     diagnosis.diagnosis_step = 1
+                    # El cambio de tipo agrega y elimina CheckList; sus senales
+                    # recalculan el resumen de puntajes al confirmar
+                    DiagnosisService.bump_data_version(diagnosis)
 
                 if observation:
                     diagnosis.observation = observation
@@ -802,141 +832,13 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                     company.id
                 )
             with transaction.atomic():
-                questions_to_create = []
-                questions_to_update = []
-
                 if not diagnosis.consultor:
                     diagnosis.consultor = consultor
                     diagnosis.save()
-                for diagnosis_questions in diagnosisDto:
-                    question_id = diagnosis_questions["question"]
-
-                    get_question = GetQuestionById(self.diagnosis_question, question_id)
-                    question = get_question.execute()
-                    get_checklist_by_question_and_diagnosis = (
-                        GetCheckListByQuestionIdAndDiagnosisId(
-                            self.checklist_repository, question.id, diagnosis.id
-                        )
-                    )
-                    existing_checklist_by_question_and_diagnosis = (
-                        get_checklist_by_question_and_diagnosis.execute()
-                    )
-
-                    get_compliance = GetComplianceById(
-                        self.compliance_repository,
-                        diagnosis_questions["compliance"],
-                    )
-                    compliance = get_compliance.execute()
-
-                    newObservation = blank_to_null(diagnosis_questions["observation"])
-                    if newObservation is None:
-                        newObservation = "SIN OBSERVACIONES"
-                    newVerifyDocs = blank_to_null(
-                        diagnosis_questions["verify_document"]
-                    )
-
-                    if existing_checklist_by_question_and_diagnosis:
-                        existing_checklist_by_question_and_diagnosis.compliance = (
-                            compliance
-                        )
-                        existing_checklist_by_question_and_diagnosis.observation = (
-                            newObservation
-                        )
-                        existing_checklist_by_question_and_diagnosis.obtained_value = (
-                            diagnosis_questions["obtained_value"]
-                        )
-                        existing_checklist_by_question_and_diagnosis.is_articuled = (
-                            diagnosis_questions["is_articuled"]
-                        )
-                        existing_checklist_by_question_and_diagnosis.verify_document = (
-                            newVerifyDocs
-                        )
-                        questions_to_update.append(
-                            existing_checklist_by_question_and_diagnosis
-                        )
-
-                    else:
-                        new_Check_list = CheckList(
-                            compliance=compliance,
-                            observation=newObservation,
-                            obtained_value=diagnosis_questions["obtained_value"],
-                            is_articuled=diagnosis_questions["is_articuled"],
-                            verify_document=diagnosis_questions["verify_document"],
-                            diagnosis=diagnosis,
-                            question=question,
-                        )
-                        questions_to_create.append(new_Check_list)
-
-                checklists_to_create = []
-                checklists_to_update = []
-                for diagnosis_requirement in diagnosisRequirementDto:
-                    req_id = diagnosis_requirement["requirement"]
-
-                    get_cheklist_req_by_id_and_diagnosis = (
-                        GetCheckListRequirementByIdAndDiagnosisId(
-                            self.checklist_requirement_repository,
-                            int(req_id),
-                            diagnosis.id,
-                        )
-                    )
-                    existing_cheklist_req_by_id_and_diagnosis = (
-                        get_cheklist_req_by_id_and_diagnosis.execute()
-                    )
-                    get_compliance = GetComplianceById(
-                        self.compliance_repository,
-                        diagnosis_requirement["compliance"],
-                    )
-                    compliance = get_compliance.execute()
-
-                    use_case_get_requirement = GetRequirementById(
-                        self.checklist_requirement_repository, int(req_id)
-                    )
-                    requirement = use_case_get_requirement.execute()
 
-                    if existing_cheklist_req_by_id_and_diagnosis:
-                        existing_cheklist_req_by_id_and_diagnosis.observation = (
-                            diagnosis_requirement["observation"]
-                        )
-                        existing_cheklist_req_by_id_and_diagnosis.compliance = (
-                            compliance
-                        )
-                        checklists_to_update.append(
-                            existing_cheklist_req_by_id_and_diagnosis
-                        )
-                    else:
-                        new_checklist = Checklist_Requirement(
-                            diagnosis=diagnosis,
-                            compliance=compliance,
-                            requirement=requirement,
-                            # Rellenar otros campos según sea necesario
-                        )
-                        checklists_to_create.append(new_checklist)
-
-                # Actualizar los requerimientos
-                if checklists_to_update:
-                    massive_update = CheckListRequirementMassiveUpdate(
-                        self.checklist_requirement_repository, checklists_to_update
-                    )
-                    massive_update.execute()
-
-                # if checklists_to_create:
-                #     massive_create = CheckListRequirementMassiveCreate(
-                #         self.checklist_requirement_repository, checklists_to_create
-                #     )
-                #     massive_create.execute()
-
-                # Actualizar las preguntas
-                if questions_to_update:
-                    massive_update = CheckListMassiveUpdate(
-                        self.checklist_repository, questions_to_update
-                    )
-                    massive_update.execute()
-
-                if questions_to_create:
-                    massive_create = CheckListMassiveCreate(
-                        self.checklist_repository, questions_to_create
-                    )
-                    massive_create.execute()
+                DiagnosisService.save_answers(
+                    diagnosis, diagnosisDto, diagnosisRequirementDto
+                )
 
                 if not diagnosis.diagnosis_step == 2:
                     diagnosis.diagnosis_step = 2
@@ -958,6 +860,72 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @action(detail=False, methods=[HTTPMethod.PATCH])
+    def save_answers(self, request: Request):
+        """
+        Guarda solo las respuestas que cambiaron.
+
+        El cliente envia la version de datos con la que leyo el diagnostico;
+        si otra escritura la cambio antes se responde 409 sin guardar nada.
+        """
+        answers = request.data.get("answers") or []
+        requirement_answers = request.data.get("requirements") or []
+        try:
+            diagnosis_id = int(request.query_params.get("diagnosis"))
+            data_version = int(request.data.get("data_version"))
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "Debe enviar 'diagnosis' y 'data_version' numericos."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not answers and not requirement_answers:
+            return Response(
+                {"error": "Debe enviar 'answers' o 'requirements'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            with transaction.atomic():
+                # Bloquea el diagnostico hasta terminar para comparar la version
+                diagnosis = (
+                    Diagnosis.objects.select_for_update()
+                    .filter(pk=diagnosis_id)
+                    .first()
+                )
+                if diagnosis is None:
+                    return Response(
+                        {"error": "Diagnostico no encontrado."},
+                        status=status.HTTP_404_NOT_FOUND,
+                    )
+                if diagnosis.data_version != data_version:
+                    return Response(
+                        {
+                            "error": "El diagnostico fue modificado por otra "
+                            "persona; recargue las respuestas.",
+                            "data_version": diagnosis.data_version,
+                        },
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                saved = DiagnosisService.save_answers(
+                    diagnosis, answers, requirement_answers
+                )
+        except KeyError as ex:
+            return Response(
+                {"error": f"Falta el campo {ex} en las respuestas."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except (TypeError, ValueError, ObjectDoesNotExist) as ex:
+            return Response({"error": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {
+                "diagnosis": diagnosis.id,
+                "data_version": diagnosis.data_version,
+                "saved": saved,
+            },
+            status=status.HTTP_200_OK,
+        )
+
     @action(detail=False, methods=[HTTPMethod.POST])
     def generateReport(self, request: Request):
         try:
@@ -968,6 +936,9 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
             format_to_save = request.query_params.get(
                 "format_to_save"
             )  # Default to 'word'
+            pdf_renderer = request.query_params.get("renderer")
+            if pdf_renderer not in (None, *PDF_RENDERERS):
+                return self._invalid_pdf_renderer()
             company = None
             if int(company_id) > 0:
                 try:
@@ -984,15 +955,29 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                 diagnosis = get_use_case.get_unfinalized_diagnosis_for_company(
                     company.id
                 )
+            if request.query_params.get("async", "false").lower() == "true":
+                return self._enqueue_report_job(
+                    request,
+                    REPORT_KIND_DIAGNOSIS,
+                    company,
+                    diagnosis,
+                    format_to_save,
+                    schedule=schedule,
+                    sequence=sequence,
+                    pdf_renderer=pdf_renderer,
+                )
+
             generate_report = GenerateReport(
                 company=company,
                 diagnosis=diagnosis,
                 schedule=schedule,
                 sequence=sequence,
+                pdf_renderer=pdf_renderer,
             )
+            profiler = self._report_profiler(request, generate_report)
             encoded_file, file_content = generate_report.generate_report(format_to_save)
 
-            return Response({"file": encoded_file}, status=status.HTTP_200_OK)
+            return self._report_response({"file": encoded_file}, profiler)
         except Exception as ex:
             tb_str = traceback.format_exc()  # Formatear la traza del error
             return Response(
@@ -1016,6 +1001,9 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
             format_to_save = request.query_params.get(
                 "format_to_save"
             )  # Default to 'word'
+            pdf_renderer = request.query_params.get("renderer")
+            if pdf_renderer not in (None, *PDF_RENDERERS):
+                return self._invalid_pdf_renderer()
 
             company = None
 
@@ -1035,100 +1023,180 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                     company.id
                 )
 
-            template_path = os.path.join(
-                settings.MEDIA_ROOT, "templates/PLAN_DE_TRABAJO_BOLIVAR.docx"
-            )
-            doc = Document(template_path)
-            month, year = get_current_month_and_year()
-
-            variables_to_change = {
-                "{{COMPANY_NAME}}": "",
-                "{{COMPANY_NIT}}": "",
-                "{{DATE_ELABORED}}": f"{month.upper()} {year}",
-                "{{CONSULTOR_NAME}}": f"{diagnosis.consultor.first_name.upper()} {diagnosis.consultor.last_name.upper()}",
-                "{{SST_LICENSE}}": (
-                    diagnosis.consultor.licensia_sst
-                    if diagnosis.consultor.licensia_sst is not None
-                    else "SIN LICENCIA"
-                ),
-                "{{NIVEL_PESV}}": diagnosis.type.name.upper(),
-                "{{GENERAL_TABLE}}": "",
-            }
-            if diagnosis.is_for_corporate_group:
-                variables_to_change["{{COMPANY_NAME}}"] = (
-                    diagnosis.corporate_group.name.upper()
-                )
-                variables_to_change["{{COMPANY_NIT}}"] = format_nit(
-                    diagnosis.corporate_group.nit
+            if request.query_params.get("async", "false").lower() == "true":
+                return self._enqueue_report_job(
+                    request,
+                    REPORT_KIND_WORK_PLAN,
+                    company,
+                    diagnosis,
+                    format_to_save,
+                    pdf_renderer=pdf_renderer,
                 )
-            else:
-                variables_to_change["{{COMPANY_NAME}}"] = company.name.upper()
-                variables_to_change["{{COMPANY_NIT}}"] = format_nit(company.nit)
 
-            # Filtrar los Checklist_Requirement que tienen compliance con ID 2
-            checklist_requirements = Checklist_Requirement.objects.filter(
-                compliance__id=2, diagnosis=diagnosis.id
+            generate_report = GenerateReport(
+                company=company,
+                diagnosis=diagnosis,
+                schedule=None,
+                sequence=None,
+                pdf_renderer=pdf_renderer,
+            )
+            profiler = self._report_profiler(request, generate_report)
+            encoded_file, file_content = generate_report.generate_work_plan(
+                format_to_save
             )
 
-            # Obtener los IDs de los requisitos asociados a los checklist_requirements
-            requirement_ids = checklist_requirements.values_list(
-                "requirement_id", flat=True
-            ).distinct()
+            return self._report_response({"file": encoded_file}, profiler)
+        except Exception as ex:
+            tb_str = traceback.format_exc()  # Formatear la traza del error
+            return Response(
+                {"error": str(ex), "traceback": tb_str},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
 
-            requirements = Diagnosis_Requirement.objects.filter(
-                id__in=requirement_ids
-            ).distinct()
+    def _enqueue_report_job(
+        self,
+        request: Request,
+        kind: str,
+        company,
+        diagnosis: Diagnosis,
+        format_to_save: str,
+        **options,
+    ):
+        """
+        Registra el job a nombre del usuario y encola el informe al confirmar,
+        asi nunca corre un task sin su ReportJob.
+        """
+        job_id = str(uuid.uuid4())
+        with transaction.atomic():
+            ReportJob.objects.create(
+                job_id=job_id, kind=kind, diagnosis=diagnosis, requested_by=request.user
+            )
+            transaction.on_commit(
+                lambda: generate_report_task.apply_async(
+                    args=(
+                        kind,
+                        company.id if company else 0,
+                        diagnosis.id,
+                        format_to_save,
+                    ),
+                    kwargs=options,
+                    task_id=job_id,
+                )
+            )
+        return Response({"job": job_id}, status=status.HTTP_202_ACCEPTED)
 
-            # Filtrar los WorkPlan_Recomendation que tienen un requirement que está en checklist_requirements
-            workplan_recommendations = WorkPlan_Recomendation.objects.filter(
-                requirement__in=requirements
+    def _get_report_job(self, request: Request):
+        """
+        Devuelve (job, None) con el AsyncResult del job del usuario, o
+        (None, Response) si falta el parametro o el job no es suyo.
+        """
+        job_id = request.query_params.get("job")
+        if not job_id:
+            return None, Response(
+                {"error": "El parámetro 'job' es requerido."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        # Solo los informes encolados por el usuario; ids de otros tasks no existen
+        if not ReportJob.objects.filter(
+            job_id=job_id, requested_by=request.user
+        ).exists():
+            return None, Response(
+                {"error": "Job no encontrado."},
+                status=status.HTTP_404_NOT_FOUND,
             )
+        return AsyncResult(job_id), None
 
-            # Obtener las observaciones relacionadas con el nombre de WorkPlan_Recomendation
-            observations = (
-                Checklist_Requirement.objects.filter(
-                    requirement__in=workplan_recommendations.values_list(
-                        "requirement_id", flat=True
+    def _report_profiler(self, request: Request, generate_report: GenerateReport):
+        """
+        Activa el perfilado del informe si la peticion trae ?profile=true.
+
+        Solo se atiende para usuarios staff o con REPORT_PROFILING activo.
+        """
+        requested = request.query_params.get("profile", "false").lower() == "true"
+        if not requested or not (settings.REPORT_PROFILING or request.user.is_staff):
+            return None
+        generate_report.profiler = ReportProfiler(enabled=True)
+        return generate_report.profiler
+
+    def _invalid_pdf_renderer(self):
+        return Response(
+            {
+                "error": "Generador de PDF no valido; opciones: "
+                + ", ".join(PDF_RENDERERS)
+                + "."
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    def _report_response(self, data: dict, profiler: ReportProfiler | None):
+        if profiler is None:
+            return Response(data, status=status.HTTP_200_OK)
+        data["profile"] = profiler.as_dict()
+        response = Response(data, status=status.HTTP_200_OK)
+        response["Server-Timing"] = profiler.server_timing()
+        return response
+
+    def _stream_report(self, request: Request, kind: str):
+        """
+        Envia el informe como archivo binario en lugar de base64.
+
+        La llave de cache del informe se usa como ETag, asi un cliente que ya
+        tiene el archivo recibe 304 sin que se vuelva a generar.
+        """
+        try:
+            company_id = request.query_params.get("company", 0)
+            diagnosis_id = int(request.query_params.get("diagnosis", 0))
+            format_to_save = request.query_params.get("format_to_save")
+            pdf_renderer = request.query_params.get("renderer")
+            if pdf_renderer not in (None, *PDF_RENDERERS):
+                return self._invalid_pdf_renderer()
+
+            company = None
+            if int(company_id) > 0:
+                try:
+                    company = self.company_service.get_company(company_id)
+                except Company.DoesNotExist:
+                    return Response(
+                        {"error": "Empresa no encontrada."},
+                        status=status.HTTP_404_NOT_FOUND,
                     )
+            get_use_case = GetUseCases(self.diagnosis_repository)
+            if diagnosis_id > 0:
+                diagnosis = get_use_case.get_by_id(diagnosis_id)
+            else:
+                diagnosis = get_use_case.get_unfinalized_diagnosis_for_company(
+                    company.id
                 )
-                .select_related("requirement")
-                .values(
-                    "requirement__cycle",
-                    "requirement__name",
-                    "requirement__workplan_recomendation__name",
-                )
-                .distinct()  # Eliminar los duplicados
-            )
 
-            # Agrupar las observaciones por ciclo
-            grouped_observations = OrderedDict()
-            for obs in observations:
-                cycle = obs["requirement__cycle"]
-                if cycle not in grouped_observations:
-                    grouped_observations[cycle] = []
-                grouped_observations[cycle].append(
-                    {
-                        "requirement_name": obs["requirement__name"],
-                        "recommendation_name": obs[
-                            "requirement__workplan_recomendation__name"
-                        ],
-                    }
-                )
-            insert_table_work_plan(doc, "{{GENERAL_TABLE}}", grouped_observations)
-            replace_placeholders_in_document(doc, variables_to_change)
-
-            buffer = BytesIO()
-            doc.save(buffer)
-            buffer.seek(0)
-            word_file_content = buffer.getvalue()
-            if format_to_save == "pdf":
-                pdf_file_content, pdf_byte  = convert_docx_to_pdf_base64(word_file_content)
-                encoded_file = pdf_file_content
-            else:  # Default to Word
-                file_content = word_file_content
-                encoded_file = base64.b64encode(file_content).decode("utf-8")
-
-            return Response({"file": encoded_file}, status=status.HTTP_200_OK)
+            with_schedule = kind == REPORT_KIND_DIAGNOSIS
+            generate_report = GenerateReport(
+                company=company,
+                diagnosis=diagnosis,
+                schedule=request.query_params.get("schedule") if with_schedule else None,
+                sequence=request.query_params.get("sequence") if with_schedule else None,
+                pdf_renderer=pdf_renderer,
+            )
+            profiler = self._report_profiler(request, generate_report)
+            cache_key = generate_report.report_key(kind, format_to_save)
+            etag = quote_etag(cache_key)
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                not_modified["ETag"] = etag
+                not_modified["Cache-Control"] = "private, no-cache"
+                return not_modified
+
+            extension = report_extension(format_to_save)
+            response = FileResponse(
+                generate_report.open_report(kind, format_to_save, cache_key),
+                as_attachment=True,
+                filename=f"{REPORT_FILENAMES[kind]}.{extension}",
+                content_type=REPORT_CONTENT_TYPES[extension],
+            )
+            response["ETag"] = etag
+            response["Cache-Control"] = "private, no-cache"
+            if profiler is not None:
+                response["Server-Timing"] = profiler.server_timing()
+            return response
         except Exception as ex:
             tb_str = traceback.format_exc()  # Formatear la traza del error
             return Response(
@@ -1136,6 +1204,115 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @action(detail=False)
+    def downloadReport(self, request: Request):
+        return self._stream_report(request, REPORT_KIND_DIAGNOSIS)
+
+    @action(detail=False)
+    def downloadWorkPlan(self, request: Request):
+        return self._stream_report(request, REPORT_KIND_WORK_PLAN)
+
+    @action(detail=False, methods=[HTTPMethod.POST])
+    def exportReports(self, request: Request):
+        diagnosis_ids = request.data.get("diagnosis_ids") or []
+        corporate_group_id = request.data.get("corporate_group")
+        format_to_save = request.data.get("format_to_save", "docx")
+        kind = request.data.get("kind", REPORT_KIND_DIAGNOSIS)
+        pdf_renderer = request.data.get("renderer")
+        if kind not in REPORT_FILENAMES:
+            return Response(
+                {"error": "Tipo de informe no valido."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if pdf_renderer not in (None, *PDF_RENDERERS):
+            return self._invalid_pdf_renderer()
+        if format_to_save not in EXPORT_FORMATS:
+            return Response(
+                {
+                    "error": "Formato no valido; use uno de "
+                    f"{', '.join(EXPORT_FORMATS)}."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not diagnosis_ids and not corporate_group_id:
+            return Response(
+                {"error": "Debe enviar 'diagnosis_ids' o 'corporate_group'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            if not isinstance(diagnosis_ids, list):
+                raise TypeError
+            diagnosis_ids = [int(diagnosis_id) for diagnosis_id in diagnosis_ids]
+            if corporate_group_id:
+                corporate_group_id = int(corporate_group_id)
+        except (TypeError, ValueError):
+            return Response(
+                {
+                    "error": "'diagnosis_ids' debe ser una lista de numeros y "
+                    "'corporate_group' un numero."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        diagnoses = diagnoses_for_export(diagnosis_ids, corporate_group_id)
+        if not diagnoses:
+            return Response(
+                {"error": "No se encontraron diagnósticos para exportar."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        stream = stream_reports_zip(
+            diagnoses, format_to_save, kind, pdf_renderer=pdf_renderer
+        )
+        try:
+            # Toma el cupo de exportacion antes de enviar los encabezados
+            next(stream)
+        except ConversionTimeout:
+            return Response(
+                {"error": "Hay demasiadas exportaciones en curso; intente mas tarde."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        response = StreamingHttpResponse(stream, content_type="application/zip")
+        response["Content-Disposition"] = (
+            f'attachment; filename="{REPORT_FILENAMES[kind]}.zip"'
+        )
+        return response
+
+    @action(detail=False)
+    def report_job(self, request: Request):
+        job, error = self._get_report_job(request)
+        if error:
+            return error
+        data = {"job": job.id, "status": job.status, "ready": job.successful()}
+        if job.failed():
+            data["error"] = str(job.result)
+        return Response(data, status=status.HTTP_200_OK)
+
+    @action(detail=False)
+    def download_report_job(self, request: Request):
+        job, error = self._get_report_job(request)
+        if error:
+            return error
+        if not job.successful():
+            return Response(
+                {"job": job.id, "status": job.status},
+                status=status.HTTP_409_CONFLICT,
+            )
+        result = job.result
+        if not isinstance(result, dict) or not os.path.exists(
+            result.get("path") or ""
+        ):
+            return Response(
+                {"error": "El archivo del informe ya no esta disponible."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return FileResponse(
+            open(result["path"], "rb"),
+            as_attachment=True,
+            filename=result["filename"],
+            content_type=result["content_type"],
+        )
+
     @action(detail=False)
     def radarChart(self, request: Request):
         company_id = request.query_params.get("company_id")
@@ -1154,14 +1331,7 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                 )
             diagnosis = get_use_case.get_unfinalized_diagnosis_for_company(company.id)
 
-        datas_by_cycle = DiagnosisService.calculate_completion_percentage(diagnosis.id)
-        radar_data = [
-            {
-                "cycle": data["cycle"],
-                "cycle_percentage": round(data["cycle_percentage"], 2),
-            }
-            for data in datas_by_cycle
-        ]
+        radar_data = ScoringEngine().summary(diagnosis.id)["radar"]
         return Response(radar_data, status=status.HTTP_200_OK)
 
     @action(detail=False)
@@ -1182,7 +1352,7 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                 )
             diagnosis = get_use_case.get_unfinalized_diagnosis_for_company(company.id)
 
-        datas_by_cycle = DiagnosisService.calculate_completion_percentage(diagnosis.id)
+        datas_by_cycle = ScoringEngine().cycles(diagnosis.id)
         return Response(datas_by_cycle, status=status.HTTP_200_OK)
 
     @action(detail=False)
@@ -1203,23 +1373,100 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                 )
             diagnosis = get_use_case.get_unfinalized_diagnosis_for_company(company.id)
 
-        percentage_success = DiagnosisService.calculate_completion_percentage_data(
-            diagnosis.id
+        summary = ScoringEngine().summary(diagnosis.id)
+        return Response(
+            {"counts": summary["counts"], "general": summary["general"]},
+            status=status.HTTP_200_OK,
         )
 
-        compliance_counts = (
-            CheckList.objects.filter(diagnosis=diagnosis.id)
-            .values("compliance_id")  # Agrupa por compliance_id
-            .annotate(
-                count=Count("id")
-            )  # Cuenta la cantidad de registros en cada grupo
-            .order_by("compliance_id")  # Ordena por compliance_id
-        )
+    @action(detail=False)
+    def scores(self, request: Request):
+        """
+        Radar, tablas por ciclo, porcentaje general y conteo por cumplimiento
+        en una sola respuesta.
 
-        return Response(
-            {"counts": compliance_counts, "general": percentage_success},
+        El ETag sale de la version de datos del diagnostico y de la version
+        de puntajes (respuestas, preguntas, requisitos y resumen), asi un
+        cliente que consulta de nuevo sin cambios recibe 304 sin recalcular
+        nada, y cualquier cambio que mueva un puntaje cambia el ETag.
+        """
+        company_id = request.query_params.get("company_id")
+        diagnosis_id = int(request.query_params.get("diagnosis", 0))
+
+        get_use_case = GetUseCases(self.diagnosis_repository)
+        try:
+            if diagnosis_id > 0:
+                diagnosis = get_use_case.get_by_id(diagnosis_id)
+            else:
+                company = self.company_service.get_company(company_id)
+                diagnosis = get_use_case.get_unfinalized_diagnosis_for_company(
+                    company.id
+                )
+        except (Company.DoesNotExist, Diagnosis.DoesNotExist):
+            diagnosis = None
+        if diagnosis is None:
+            return Response(
+                {"error": "Diagnostico no encontrado."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        scoring = ScoringEngine()
+        version = hashlib.sha1(scoring.version(diagnosis.id).encode()).hexdigest()
+        etag = quote_etag(f"scores-{diagnosis.id}-{diagnosis.data_version}-{version}")
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified["ETag"] = etag
+            not_modified["Cache-Control"] = "private, no-cache"
+            return not_modified
+
+        summary = scoring.summary(diagnosis.id)
+        response = Response(
+            {
+                "diagnosis": diagnosis.id,
+                "data_version": diagnosis.data_version,
+                "radar": summary["radar"],
+                "cycles": scoring.cycles(diagnosis.id),
+                "general": summary["general"],
+                "counts": summary["counts"],
+            },
             status=status.HTTP_200_OK,
         )
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+    @action(detail=False, methods=[HTTPMethod.POST])
+    def portfolio_scores(self, request: Request):
+        diagnosis_ids = request.data.get("diagnosis_ids") or []
+        filters = {
+            "arl_id": request.data.get("arl"),
+            "segment_id": request.data.get("segment"),
+            "mission_id": request.data.get("mission"),
+        }
+        dates = {}
+        for field in ("date_from", "date_to"):
+            value = request.data.get(field)
+            if value:
+                try:
+                    dates[field] = parse_date(value)
+                except ValueError:
+                    dates[field] = None
+                if dates[field] is None:
+                    return Response(
+                        {"error": f"'{field}' debe tener el formato AAAA-MM-DD."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+        if not diagnosis_ids and not any(filters.values()) and not dates:
+            return Response(
+                {
+                    "error": "Debe enviar 'diagnosis_ids' o algun filtro "
+                    "('arl', 'segment', 'mission', 'date_from', 'date_to')."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        diagnoses = portfolio_diagnoses(diagnosis_ids, **filters, **dates)
+        return Response(score_portfolio(diagnoses), status=status.HTTP_200_OK)
 
     @action(detail=False)
     def count_diagnosis_by_consultor(self, request: Request):
@@ -1377,31 +1624,45 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                 f"Buenos dias se adjunta informe de diagnostico Pesv para la empresa: {diagnosis.company.name.upper()}, con NIT: {diagnosis.company.nit}"
             )
 
-        generate_report = GenerateReport(
-            company=company,
+        # El PDF se genera y se envia en celery; la peticion solo encola el envio
+        delivery = ReportDelivery.objects.create(
             diagnosis=diagnosis,
+            company=company,
+            requested_by=request.user if request.user.is_authenticated else None,
+            email_to=email_to,
+            subject=variable_for_email["subject"],
+            body=variable_for_email["body"],
             schedule=schedule,
             sequence=sequence,
         )
-        encoded_file, file_content = generate_report.generate_report("pdf")
-
-        email = EmailMessage(
-            subject=variable_for_email["subject"],
-            body=variable_for_email["body"],
-            from_email="soporte@consultoriaycapacitacionhseq.com",
-            to=[email_to],
+        job = send_report_email_task.delay(delivery.id)
+        delivery.task_id = job.id
+        delivery.save(update_fields=["task_id", "updated_at"])
+        delivery.refresh_from_db()
+        return Response(
+            ReportDeliverySerializer(delivery).data, status=status.HTTP_202_ACCEPTED
         )
-        email.attach("Diagnostico_PESV.pdf", file_content, "application/pdf")
-        try:
-            email.send()
+
+    @action(detail=False)
+    def report_delivery(self, request: Request):
+        delivery_id = request.query_params.get("delivery")
+        if not delivery_id:
             return Response(
-                {"message": "Correo enviado con éxito"}, status=status.HTTP_200_OK
+                {"error": "El parámetro 'delivery' es requerido."},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-        except Exception as e:
+        # Solo los envios pedidos por el usuario; los de otros no existen
+        try:
+            delivery = ReportDelivery.objects.get(
+                pk=delivery_id, requested_by=request.user
+            )
+        except (ReportDelivery.DoesNotExist, ValueError):
             return Response(
-                {"error": str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                {"error": "El envio no existe."}, status=status.HTTP_404_NOT_FOUND
             )
+        return Response(
+            ReportDeliverySerializer(delivery).data, status=status.HTTP_200_OK
+        )
 
     @action(detail=False)
     def find_notifications_by_user(self, request: Request):
@@ -8,18 +8,22 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
 
 import os
-import django
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 from django.core.asgi import get_asgi_application
-from . import routing
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "diagnostico_pesv.settings")
-django.setup()
+# Configura Django antes de importar las rutas: los consumers importan modelos
+django_asgi_app = get_asgi_application()
+
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from . import routing  # noqa: E402
+from .middleware import JWTQueryAuthMiddleware  # noqa: E402
 
 application = ProtocolTypeRouter(
     {
-        "http": get_asgi_application(),
-        "websocket": AuthMiddlewareStack(URLRouter(routing.ws_urlpatterns)),
+        "http": django_asgi_app,
+        "websocket": AuthMiddlewareStack(
+            JWTQueryAuthMiddleware(URLRouter(routing.ws_urlpatterns))
+        ),
     }
 )
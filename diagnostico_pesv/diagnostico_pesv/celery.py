@@ -1,6 +1,8 @@
 from __future__ import absolute_import, unicode_literals
 import os
+import threading
 from celery import Celery
+from celery.signals import worker_process_init
 from django.conf import settings
 
 # Establece el módulo de configuración de Django
@@ -11,12 +13,26 @@ app = Celery("diagnostico_pesv")
 
 # Carga la configuración de Celery desde Django
 app.config_from_object("django.conf:settings", namespace="CELERY")
-app.conf.beat_schedule = {}
+app.conf.beat_schedule = {
+    "purge-report-jobs": {
+        "task": "apps.diagnosis.tasks.purge_report_jobs",
+        "schedule": 3600.0,
+    },
+}
 
 # Descubre tareas en aplicaciones de Django
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 
 
+@worker_process_init.connect
+def start_converter_pool(**kwargs):
+    # Cada proceso del worker inicia en segundo plano las instancias de
+    # LibreOffice que falten; worker_process_init tiene un limite de tiempo
+    from apps.diagnosis.converters import warm_converter_pool
+
+    threading.Thread(target=warm_converter_pool, daemon=True).start()
+
+
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     print(f"Request: {self.request!r}")
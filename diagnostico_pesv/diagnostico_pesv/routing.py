@@ -1,6 +1,13 @@
 from django.urls import re_path
-from apps.diagnosis.consumers.consumer import DiagnosisConsumer
+from apps.diagnosis.consumers.consumer import (
+    DiagnosisConsumer,
+    DiagnosisAutosaveConsumer,
+)
 
 ws_urlpatterns = [
     re_path(r"ws/diagnosis/$", DiagnosisConsumer.as_asgi()),
+    re_path(
+        r"ws/diagnosis/(?P<diagnosis_id>\d+)/autosave/$",
+        DiagnosisAutosaveConsumer.as_asgi(),
+    ),
 ]
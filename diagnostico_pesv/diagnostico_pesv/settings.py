@@ -14,6 +14,7 @@ from pathlib import Path
 from dotenv import load_dotenv
 from datetime import timedelta
 import os
+import tempfile
 from corsheaders.defaults import default_methods
 from corsheaders.defaults import default_headers
 
@@ -222,6 +223,11 @@ LOGGING = {
             "level": "ERROR",
             "propagate": True,
         },
+        "apps.diagnosis.profiling": {
+            "handlers": ["console", "file"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
 
@@ -245,6 +251,82 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "UTC"
 CELERY_RESULT_BACKEND = "django-db"
+CELERY_TASK_TRACK_STARTED = True
+
+# Archivos generados por los jobs asincronos de informes
+REPORT_JOBS_ROOT = os.path.join(MEDIA_ROOT, "report_jobs")
+REPORT_JOB_TTL_HOURS = int(os.getenv("REPORT_JOB_TTL_HOURS", 24))
+
+# Envio de informes por correo: reintentos con espera exponencial (segundos)
+REPORT_EMAIL_MAX_RETRIES = int(os.getenv("REPORT_EMAIL_MAX_RETRIES", 5))
+REPORT_EMAIL_RETRY_BACKOFF = int(os.getenv("REPORT_EMAIL_RETRY_BACKOFF", 30))
+REPORT_EMAIL_RETRY_BACKOFF_MAX = int(os.getenv("REPORT_EMAIL_RETRY_BACKOFF_MAX", 900))
+
+# Cache de informes generados (0 desactiva la cache)
+REPORT_CACHE_ROOT = os.path.join(MEDIA_ROOT, "report_cache")
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# Grafica de barras del informe: "" (sin grafica), "png" o "native" (grafico de Word)
+REPORT_BAR_CHART = os.getenv("REPORT_BAR_CHART", "")
+
+# Procesos que generan informes en paralelo en la exportacion masiva (zip)
+REPORT_EXPORT_WORKERS = int(os.getenv("REPORT_EXPORT_WORKERS", os.cpu_count() or 1))
+# Exportaciones simultaneas entre todos los procesos del servidor; cada una usa
+# hasta REPORT_EXPORT_WORKERS procesos
+REPORT_EXPORT_CONCURRENCY = int(os.getenv("REPORT_EXPORT_CONCURRENCY", 1))
+REPORT_EXPORT_WAIT_TIMEOUT = int(os.getenv("REPORT_EXPORT_WAIT_TIMEOUT", 30))
+REPORT_EXPORT_LOCK_DIR = os.getenv(
+    "REPORT_EXPORT_LOCK_DIR",
+    os.path.join(tempfile.gettempdir(), "diagnostico_pesv_export"),
+)
+
+# Mide tiempos y consultas por etapa de cada informe y los registra en el log
+REPORT_PROFILING = os.getenv("REPORT_PROFILING", "false").lower() == "true"
+
+# Generador de los PDF: "libreoffice" (convierte el DOCX) o "reportlab" (directo)
+REPORT_PDF_RENDERER = os.getenv("REPORT_PDF_RENDERER", "libreoffice")
+
+# Pool de LibreOffice para la conversion de DOCX a PDF: una instancia por cupo
+# de PDF_CONVERSION_CONCURRENCY, compartida por todos los procesos del servidor
+LIBREOFFICE_BINARY = os.getenv("LIBREOFFICE_BINARY", "libreoffice")
+LIBREOFFICE_POOL = os.getenv("LIBREOFFICE_POOL", "true").lower() == "true"
+# Python con el modulo uno (paquete python3-uno); suele ser el del sistema
+LIBREOFFICE_PYTHON = os.getenv("LIBREOFFICE_PYTHON", "/usr/bin/python3")
+# La instancia del cupo N escucha en LIBREOFFICE_BASE_PORT + N
+LIBREOFFICE_BASE_PORT = int(os.getenv("LIBREOFFICE_BASE_PORT", 2002))
+LIBREOFFICE_JOB_TIMEOUT = int(os.getenv("LIBREOFFICE_JOB_TIMEOUT", 120))
+LIBREOFFICE_START_TIMEOUT = int(os.getenv("LIBREOFFICE_START_TIMEOUT", 30))
+
+# Conversiones a PDF simultaneas entre todos los procesos del servidor
+PDF_CONVERSION_CONCURRENCY = int(os.getenv("PDF_CONVERSION_CONCURRENCY", 2))
+PDF_CONVERSION_WAIT_TIMEOUT = int(os.getenv("PDF_CONVERSION_WAIT_TIMEOUT", 300))
+PDF_CONVERSION_LOCK_DIR = os.getenv(
+    "PDF_CONVERSION_LOCK_DIR",
+    os.path.join(tempfile.gettempdir(), "diagnostico_pesv_pdf"),
+)
+
+# Cache compartida entre procesos si hay Redis; si no, memoria de cada proceso
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        }
+    }
+
+# Vigencia del mapa requisito -> recomendaciones del plan de trabajo; la llave
+# cambia al editar los catalogos, el tiempo solo libera las versiones viejas
+WORK_PLAN_RECOMMENDATIONS_CACHE_TIMEOUT = int(
+    os.getenv("WORK_PLAN_RECOMMENDATIONS_CACHE_TIMEOUT", 3600)
+)
+
+# Vigencia de los puntajes calculados de cada diagnostico; la llave cambia al
+# modificar las respuestas, el tiempo solo libera las entradas viejas
+DIAGNOSIS_SCORES_CACHE_TIMEOUT = int(os.getenv("DIAGNOSIS_SCORES_CACHE_TIMEOUT", 3600))
+
+# Segundos que el autoguardado por websocket agrupa respuestas antes de escribir
+AUTOSAVE_WINDOW_SECONDS = int(os.getenv("AUTOSAVE_WINDOW_SECONDS", 2))
 
 CHANNEL_LAYERS = {
     "default": {
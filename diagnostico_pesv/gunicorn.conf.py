@@ -0,0 +1,9 @@
+import threading
+
+
+def post_worker_init(worker):
+    # Con la aplicacion ya cargada, inicia el pool de LibreOffice en segundo
+    # plano para no demorar al worker
+    from apps.diagnosis.converters import warm_converter_pool
+
+    threading.Thread(target=warm_converter_pool, daemon=True).start()